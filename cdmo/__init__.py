@@ -0,0 +1,24 @@
+"""
+Shared tooling for the Multiple Couriers Problem backends (CP, SMT and MIP).
+
+The names below are imported on first use, so `import cdmo` (and worker
+processes that only need one backend) stay cheap: NumPy and a solver stack
+are loaded when a backend's runner is first called, not when it is looked
+up. The solver scripts (cp1/try.py, smt_final/main.py, test/main.py) still
+import their solver at startup.
+"""
+
+_LAZY = {
+    "Instance": "cdmo.instances",
+    "load_instance": "cdmo.instances",
+    "instance_path": "cdmo.instances",
+    "solve": "cdmo.backends",
+    "register_backend": "cdmo.backends",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        return getattr(importlib.import_module(_LAZY[name]), name)
+    raise AttributeError(f"module 'cdmo' has no attribute '{name}'")
@@ -0,0 +1,3 @@
+from cdmo.cli import main
+
+main()
@@ -0,0 +1,461 @@
+"""
+Uniform entry points for the CP, SMT and MIP backends.
+
+Every runner takes an Instance (see cdmo/instances.py) and returns the usual
+result dict ("time", "optimal", "obj", "sol") plus a "stats" dict with at
+least "build_time", "solve_time" and "first_solution_time" (seconds since
+the runner started). NumPy, the cdmo helpers that need it and the solver
+stacks are imported only when a runner is used, so importing this module
+and looking up a backend stay cheap.
+"""
+
+import importlib
+import importlib.util
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CP_MODELS = {
+    "firstfail_indmin": "cp1/model/firstfail_indmin.mzn",
+    "firstfail_indmin_sb": "cp1/model/firstfail_indmin_sb.mzn",
+    "domwdeg_indrandom_sb": "cp1/model/domwdeg_indrandom_sb.mzn",
+    "domwdeg_indrandom": "cp1/model/domwdeg_indrandom.mzn",
+    "firstfail_indmin_bp": "cp1/model/firstfail_indmin_bp.mzn",
+    "firstfail_indmin_bp_sb": "cp1/model/firstfail_indmin_bp_sb.mzn",
+}
+
+CBC_SOLUTION_RE = re.compile(r"Integer solution of (\S+) found.*\(([\d.]+) seconds\)")
+CBC_BOUND_RE = re.compile(r"best possible (\S+) \(([\d.]+) seconds\)")
+
+
+def load_script(relpath, name):
+    """Import a repo script by path (cp1/try.py and test/ are not packages)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT_DIR, relpath))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class _FirstSolution:
+    """on_solution callback that remembers when the first solution arrived."""
+
+    def __init__(self, callback=None):
+        self.time = None
+        self.callback = callback
+
+    def __call__(self, elapsed, obj):
+        if self.time is None:
+            self.time = round(elapsed, 3)
+        if self.callback is not None:
+            self.callback(elapsed, obj)
+
+
+def parse_cbc_log(log_text):
+    """Return [(seconds, objective)] for every integer solution in a CBC log."""
+    return [(float(match.group(2)), float(match.group(1)))
+            for match in CBC_SOLUTION_RE.finditer(log_text)]
+
+
+def parse_cbc_bounds(log_text):
+    """Return [(seconds, best possible)] for every progress line of a CBC log."""
+    return [(float(match.group(2)), float(match.group(1)))
+            for match in CBC_BOUND_RE.finditer(log_text)]
+
+
+def run_cp(instance, solver="gecode", model="firstfail_indmin_sb", implied=False, timeout=300, on_solution=None,
+           allowed=None, shared=None, seed=None):
+    from cdmo.estimate import check_fits
+    from cdmo.instances import write_dzn
+    check_fits("cp", int(instance.num_couriers), int(instance.num_load), allowed=allowed,
+               symmetry=model.endswith("_sb"), implied=implied)
+    cp = load_script("cp1/try.py", "cp_try")
+    first = _FirstSolution(on_solution)
+    with tempfile.TemporaryDirectory() as tmp:
+        dzn_file = os.path.join(tmp, "instance.dzn")
+        write_dzn(instance, dzn_file)
+        model_path = os.path.join(ROOT_DIR, CP_MODELS[model])
+        extra = cp.model_extras(model_path, instance, implied)
+        if shared is None:
+            result = cp.solve_minizinc(solver, model_path, None, dzn_file=dzn_file, timeout=timeout,
+                                       on_solution=first, allowed=allowed, extra=extra, seed=seed)
+        else:
+            result = _run_cp_shared(cp, solver, model_path, dzn_file, timeout, first, allowed, extra, shared,
+                                    seed=seed)
+    result.setdefault("stats", {})["first_solution_time"] = first.time
+    return result
+
+
+def _run_cp_shared(cp, solver, model_path, dzn_file, timeout, on_solution, allowed, extra, shared, seed=None):
+    """
+    MiniZinc in a race (cdmo/race.py): whenever another backend finds a better
+    objective k the solver is stopped and restarted with "z < k".
+    """
+    start_time = time.time()
+    best = None
+    cut = None
+    while True:
+        remaining = timeout - (time.time() - start_time)
+        if remaining < 1 or shared.stopped():
+            break
+        k = shared.bound()
+        if k is not None and (cut is None or k < cut):
+            cut = k
+        round_cut = cut
+        result = cp.solve_minizinc(
+            solver, model_path, None, dzn_file=dzn_file, timeout=remaining, allowed=allowed, seed=seed,
+            on_solution=lambda elapsed, obj: on_solution(time.time() - start_time, obj),
+            extra=(extra or "") + (f"\nconstraint z < {round_cut};\n" if round_cut is not None else ""),
+            stop=lambda: shared.stopped() or ((b := shared.bound()) is not None and (round_cut is None or b < round_cut)))
+        if best is None or (result["obj"] is not None and (best["obj"] is None or result["obj"] < best["obj"])):
+            best = result
+        if result.get("status") != "STOPPED":
+            if result.get("status") == "UNSATISFIABLE" and round_cut is not None:
+                best.setdefault("stats", {})["best_bound"] = round_cut
+            break
+
+    if best is None:
+        best = {"time": 0, "optimal": False, "obj": None, "sol": [], "stats": {}}
+    best["time"] = int(time.time() - start_time)
+    return best
+
+
+def run_smt(instance, model="2d", symmetry=False, implied=False, timeout=300, on_solution=None, allowed=None,
+            shared=None, profile="default"):
+    from cdmo.estimate import choose_smt_encoding
+    from cdmo.instances import to_lists
+    from smt_final.profiles import resolve_profile
+    model = choose_smt_encoding(int(instance.num_couriers), int(instance.num_load), model, allowed=allowed,
+                                symmetry=symmetry, implied=implied)
+    if model == "2d":
+        from smt_final.smt1 import run_model_2d as run_model
+    else:
+        from smt_final.smt3 import run_model_3d as run_model
+    m, n, l, s, D = to_lists(instance)
+    first = _FirstSolution(on_solution)
+    result = run_model(m, n, l, s, D, n, symmetry, "bench",
+                       timeout=timeout, save=False, on_solution=first, allowed=allowed, implied=implied,
+                       shared=shared, profile=resolve_profile(profile, model, n))
+    result["stats"]["first_solution_time"] = first.time
+    return result
+
+
+def run_mip(instance, solver="PULP_CBC_CMD", symmetry=False, implied=False, timeout=300, on_solution=None,
+            allowed=None, shared=None, on_bound=None):
+    import pulp
+    from cdmo.estimate import check_fits
+    from cdmo.instances import to_lists
+    from cdmo.stats import from_cbc, read_log
+    mip = load_script("test/solver_model.py", "mip_solver_model")
+    m, n, l, s, D = to_lists(instance)
+    check_fits("mip", m, n, allowed=allowed, symmetry=symmetry, implied=implied)
+
+    start_time = time.time()
+    model, y, path_increment, d_max = mip.build_model(m, n, D, l, s, allowed=allowed, symmetry=symmetry,
+                                                      implied=implied)
+    build_time = time.time() - start_time
+    if shared is not None:
+        return _run_mip_shared(mip, model, path_increment, d_max, n, m, solver, timeout, on_solution, allowed,
+                               shared, start_time, build_time, on_bound=on_bound)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "cbc.log")
+        model.solve(pulp.getSolver(solver, timeLimit=timeout, msg=0, logPath=log_path))
+        log_text = read_log(log_path)
+    solve_time = time.time() - start_time - build_time
+
+    first = _FirstSolution(on_solution)
+    for seconds, obj in parse_cbc_log(log_text):
+        first(build_time + seconds, obj)
+    if on_bound is not None:
+        for seconds, bound in parse_cbc_bounds(log_text):
+            on_bound(build_time + seconds, bound)
+
+    stats = from_cbc(log_text, model, build_time=round(build_time, 3), solve_time=round(solve_time, 3))
+    stats["first_solution_time"] = first.time
+    feasible = model.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
+    routes = mip.solution_to_routes(mip.extract_solution(n, range(m), path_increment), n) if feasible else []
+    return {
+        "time": int(time.time() - start_time),
+        "optimal": model.sol_status == pulp.LpSolutionOptimal and allowed is None,
+        "obj": int(round(d_max.value())) if feasible else None,
+        "sol": routes,
+        "stats": stats,
+    }
+
+
+def _run_mip_shared(mip, model, path_increment, d_max, n, m, solver, timeout, on_solution, allowed, shared,
+                    start_time, build_time, first_round=10, on_bound=None):
+    """
+    CBC in a race (cdmo/race.py). A running CBC cannot take a new cutoff, so
+    it runs in rounds of doubling length, each warm-started from the
+    incumbent and cut off at "d_max <= k - 1" for the best objective k found
+    by any backend so far.
+    """
+    import pulp
+    from cdmo.stats import from_cbc, read_log
+    first = _FirstSolution(on_solution)
+    best = {"time": 0, "optimal": False, "obj": None, "sol": [], "stats": {}}
+    cut = None
+    infeasible_below = None
+    round_length = first_round
+    log_text = ""
+    while not shared.stopped():
+        remaining = timeout - (time.time() - start_time - build_time)
+        if remaining < 1:
+            break
+        k = shared.bound()
+        if k is not None and (cut is None or k < cut):
+            cut = k
+            if "race_cutoff" in model.constraints:
+                del model.constraints["race_cutoff"]
+            model += (d_max <= cut - 1, "race_cutoff")
+
+        round_start = time.time() - start_time
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "cbc.log")
+            model.solve(pulp.getSolver(solver, timeLimit=min(round_length, remaining), msg=0, logPath=log_path,
+                                       warmStart=True))
+            log_text = read_log(log_path)
+        round_length *= 2
+        for seconds, obj in parse_cbc_log(log_text):
+            first(round_start + seconds, obj)
+        if on_bound is not None:
+            # Under the cutoff CBC only bounds the solutions below it.
+            for seconds, bound in parse_cbc_bounds(log_text):
+                on_bound(round_start + seconds, bound if cut is None else min(bound, cut))
+
+        if model.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+            obj = int(round(d_max.value()))
+            if best["obj"] is None or obj < best["obj"]:
+                best.update(obj=obj, sol=mip.solution_to_routes(mip.extract_solution(n, range(m), path_increment), n))
+        # PuLP also reports a round stopped on time as LpStatusOptimal; only sol_status tells a proof apart.
+        if model.sol_status == pulp.LpSolutionOptimal:
+            best["optimal"] = allowed is None
+            break
+        if model.status == pulp.LpStatusInfeasible:
+            infeasible_below = cut
+            break
+
+    stats = from_cbc(log_text, model, build_time=round(build_time, 3),
+                     solve_time=round(time.time() - start_time - build_time, 3))
+    # Solutions above the cutoff were not searched, so CBC's bound only holds up to it.
+    if cut is not None and stats["best_bound"] is not None:
+        stats["best_bound"] = min(stats["best_bound"], cut)
+    if infeasible_below is not None:
+        stats["best_bound"] = infeasible_below
+    stats["first_solution_time"] = first.time
+    best["stats"] = stats
+    best["time"] = int(time.time() - start_time)
+    return best
+
+
+def run_decomposed(instance, workers=None, timeout=300, on_solution=None, allowed=None, on_bound=None):
+    from cdmo.decompose import solve_decomposed
+    # The master has no arc variables, so a candidate graph does not apply.
+    first = _FirstSolution(on_solution)
+    result = solve_decomposed(instance, timeout=timeout, workers=workers, on_solution=first, on_bound=on_bound)
+    result["stats"]["first_solution_time"] = first.time
+    return result
+
+
+def run_colgen(instance, timeout=300, on_solution=None, allowed=None, on_bound=None):
+    from cdmo.colgen import solve_colgen
+    # Routes are priced on the full graph, so a candidate graph does not apply.
+    first = _FirstSolution(on_solution)
+    result = solve_colgen(instance, timeout=timeout, on_solution=first, on_bound=on_bound)
+    result["stats"]["first_solution_time"] = first.time
+    return result
+
+
+# Backend plugins: name -> "module:function". The module is imported only
+# when the backend is selected, so nothing pays for z3, minizinc and pulp
+# together. Other backends can be added with register_backend().
+BACKENDS = {
+    "cp": "cdmo.backends:run_cp",
+    "smt": "cdmo.backends:run_smt",
+    "mip": "cdmo.backends:run_mip",
+    "decomp": "cdmo.backends:run_decomposed",
+    "colgen": "cdmo.backends:run_colgen",
+    "portfolio": "cdmo.portfolio:run_portfolio",
+}
+
+
+def register_backend(name, target):
+    """Make a runner (a callable or "module:function") available under name in backend specs."""
+    BACKENDS[name] = target
+
+
+def get_backend(name):
+    """The runner of a registered backend, importing its module on first use."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from {list(BACKENDS)}.")
+    target = BACKENDS[name]
+    if isinstance(target, str):
+        module_name, function_name = target.split(":")
+        target = BACKENDS[name] = getattr(importlib.import_module(module_name), function_name)
+    return target
+
+
+def solve(instance, backend="cp", timeout=300, knn=None, reduce=False, telemetry=None, **kwargs):
+    """
+    Python API: solve an Instance, a .dat path or an instance number with a
+    backend spec (see parse_config()), e.g. solve(7, "smt:2d:sb", timeout=60).
+    knn restricts the routing models to a k-nearest-neighbour graph; reduce
+    merges co-located items first (cdmo/reduce.py); telemetry is a JSONL file
+    the convergence trace is appended to (cdmo/telemetry.py), labelled with
+    the file name or, for an Instance, a hash of its data.
+    """
+    label = None
+    if not hasattr(instance, "distance"):
+        from cdmo.instances import instance_path, load_instance
+        path = instance_path(instance) if str(instance).isdigit() else instance
+        label = os.path.basename(path)
+        instance = load_instance(path)
+    name, runner, options = parse_config(backend)
+    if telemetry is not None:
+        import inspect
+        from cdmo.telemetry import traced
+        if label is None:
+            # The summary compares runs per instance, so unnamed instances are told apart by their data.
+            from cdmo.ledger import instance_digest
+            label = instance_digest(instance)[:16]
+        return traced(solve, instance, telemetry, timeout=timeout, meta={"backend": backend, "instance": label},
+                      takes_bound="on_bound" in inspect.signature(runner).parameters,
+                      backend=backend, knn=knn, reduce=reduce, **kwargs)
+    options.update(kwargs)
+    if reduce:
+        from cdmo.reduce import run_reduced
+        return run_reduced(runner, instance, timeout=timeout, knn=knn, **options)
+    if knn is not None:
+        return run_sparse(runner, instance, knn, timeout=timeout, **options)
+    return runner(instance, timeout=timeout, **options)
+
+
+def run_sparse(runner, instance, k, timeout=300, full_fallback=False, routes=None, **kwargs):
+    """
+    Solve on the k-nearest-neighbour candidate graph (cdmo/candidates.py).
+    With full_fallback the remaining time is spent on the full graph, which is
+    the only way to get an optimality proof; the better of both runs is kept.
+    """
+    from cdmo.candidates import candidate_arcs, density
+    start_time = time.time()
+    allowed = candidate_arcs(instance.distance, k, routes=routes)
+    result = runner(instance, timeout=timeout, allowed=allowed, **kwargs)
+    result.setdefault("stats", {}).update({"candidate_k": k, "arc_density": round(density(allowed), 4)})
+
+    remaining = timeout - (time.time() - start_time)
+    if full_fallback and remaining >= 1:
+        full = runner(instance, timeout=remaining, **kwargs)
+        better = full["obj"] is not None and (result["obj"] is None or full["obj"] <= result["obj"])
+        if full["optimal"] or better:
+            full["time"] = int(time.time() - start_time)
+            full["stats"].update({"candidate_k": None, "sparse_obj": result["obj"]})
+            return full
+    return result
+
+
+def parse_config(spec):
+    """
+    Turn a backend spec into (name, runner, kwargs):
+        cp[:solver[:model[:implied][:seed=N]]]  e.g. cp:gecode:domwdeg_indrandom_sb:seed=7
+        smt[:2d|3d[:sb][:implied][:profile]]  e.g. smt:3d:sb:symba (see smt_final/profiles.py)
+        mip[:solver[:sb][:implied]]       e.g. mip:PULP_CBC_CMD:sb:implied
+        decomp[:workers]                  e.g. decomp:4
+        colgen                            set-partitioning MIP by column generation (cdmo/colgen.py)
+        portfolio[:key=value...]          seeded copies of a randomized CP model (cdmo/portfolio.py)
+        <plugin>[:key=value...]           any backend added with register_backend()
+    """
+    parts = spec.split(":")
+    kind = parts[0]
+    if kind == "cp":
+        kwargs = {"solver": parts[1] if len(parts) > 1 else "gecode",
+                  "model": parts[2] if len(parts) > 2 else "firstfail_indmin_sb",
+                  "implied": "implied" in parts[3:]}
+        seeds = [part.split("=", 1)[1] for part in parts[3:] if part.startswith("seed=")]
+        if seeds:
+            kwargs["seed"] = int(seeds[0])
+    elif kind == "smt":
+        profiles = [part for part in parts[2:] if part not in ("sb", "implied")]
+        kwargs = {"model": parts[1] if len(parts) > 1 else "2d",
+                  "symmetry": "sb" in parts[2:],
+                  "implied": "implied" in parts[2:],
+                  "profile": profiles[0] if profiles else "default"}
+    elif kind == "mip":
+        kwargs = {"solver": parts[1] if len(parts) > 1 else "PULP_CBC_CMD",
+                  "symmetry": "sb" in parts[2:],
+                  "implied": "implied" in parts[2:]}
+    elif kind == "decomp":
+        kwargs = {"workers": int(parts[1]) if len(parts) > 1 else None}
+    else:
+        kwargs = dict(part.split("=", 1) for part in parts[1:])
+    return spec, get_backend(kind), kwargs
+
+
+def _child(spec, instance_file, timeout, queue):
+    import resource
+    from cdmo.instances import load_instance
+    from cdmo.telemetry import telemetry_file, traced
+    name, runner, kwargs = parse_config(spec)
+    start_time = time.time()
+    last_solution = []
+    telemetry = telemetry_file()
+    try:
+        if telemetry is not None:
+            # Convergence trace of every isolated run (cdmo/telemetry.py).
+            result = traced(runner, load_instance(instance_file), telemetry, timeout=timeout,
+                            on_solution=lambda elapsed, obj: last_solution.append(elapsed),
+                            meta={"backend": name, "instance": os.path.basename(instance_file)}, **kwargs)
+        else:
+            result = runner(load_instance(instance_file), timeout=timeout,
+                            on_solution=lambda elapsed, obj: last_solution.append(elapsed), **kwargs)
+    except Exception as e:
+        result = {"time": 0, "optimal": False, "obj": None, "sol": [], "error": repr(e)}
+    result["wall_time"] = round(time.time() - start_time, 3)
+    # When the incumbent last improved; tells cdmo/schedule.py if a run was still making progress.
+    result["last_solution_time"] = round(last_solution[-1], 3) if last_solution else None
+    # ru_maxrss is in KiB on Linux; MiniZinc solvers run as child processes.
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    result["peak_rss_mb"] = round(rss / 1024, 1)
+    queue.put(result)
+
+
+def run_isolated(spec, instance_file, timeout, grace=30):
+    """
+    Run one backend config in a fresh process so its peak memory is its own.
+    The process is killed if it overruns timeout + grace (e.g. stuck building);
+    if it dies on its own (a crash, the OOM killer) its exit code is reported.
+    """
+    import multiprocessing
+    import queue as queue_module
+
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_child, args=(spec, instance_file, timeout, queue))
+    start_time = time.time()
+    deadline = start_time + timeout + grace
+    process.start()
+    result, error = None, None
+    while result is None:
+        alive = process.is_alive()
+        try:
+            # A child that already exited has flushed its result, if it put one.
+            result = queue.get(timeout=1 if alive else 0.1)
+        except queue_module.Empty:
+            if not alive:
+                error = f"worker exited with code {process.exitcode} without a result"
+            elif time.time() > deadline:
+                process.kill()
+                error = "killed after exceeding the time limit"
+            else:
+                continue
+            result = {"time": timeout, "optimal": False, "obj": None, "sol": [], "error": error,
+                      "wall_time": round(time.time() - start_time, 3)}
+    process.join()
+    return result
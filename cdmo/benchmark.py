@@ -0,0 +1,255 @@
+"""
+Repeatable benchmark with regression tracking against a stored baseline.
+
+    # record a baseline (5 repetitions of every instance/config pair)
+    python3 -m cdmo.benchmark run --instances 1-10 --configs cp,smt:2d,smt:3d,mip \
+        --repeat 5 --timeout 60 --out bench/baseline.json
+
+    # after a change: run the same matrix and compare
+    python3 -m cdmo.benchmark run --instances 1-10 --configs cp,smt:2d,smt:3d,mip \
+        --repeat 5 --timeout 60 --out bench/new.json --compare bench/baseline.json
+
+    # or compare two stored runs
+    python3 -m cdmo.benchmark compare bench/baseline.json bench/new.json
+
+Timings are compared with a two-sided permutation test on the means (exact
+for small samples), so no distribution is assumed. A cell is reported as a
+regression when it is significantly slower (p < --alpha) by more than
+--threshold, or when its objective gets worse / it stops proving optimality.
+The compare step exits with status 1 if any regression is found.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from cdmo.backends import ROOT_DIR, run_isolated
+from cdmo.instances import instance_path
+
+TIME_METRICS = ["wall_time", "build_time", "solve_time", "peak_rss_mb"]
+TRACKED_FILES = [
+    "cp1/model/firstfail_indmin.mzn",
+    "cp1/model/firstfail_indmin_sb.mzn",
+    "cp1/model/domwdeg_indrandom.mzn",
+    "cp1/model/domwdeg_indrandom_sb.mzn",
+    "cp1/model/firstfail_indmin_bp.mzn",
+    "cp1/model/firstfail_indmin_bp_sb.mzn",
+    "cp1/try.py",
+    "smt_final/smt1.py",
+    "smt_final/smt3.py",
+    "test/solver_model.py",
+]
+
+
+def parse_instances(text):
+    """'1-5,9' -> [1, 2, 3, 4, 5, 9]"""
+    numbers = []
+    for part in text.split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            numbers.extend(range(int(low), int(high) + 1))
+        elif part:
+            numbers.append(int(part))
+    return numbers
+
+
+def _file_hash(relpath):
+    try:
+        with open(os.path.join(ROOT_DIR, relpath), "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except OSError:
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment():
+    """What the numbers depend on besides the code: machine, versions, file hashes."""
+    return {
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "files": {path: _file_hash(path) for path in TRACKED_FILES},
+    }
+
+
+def run_matrix(instances, configs, repeat, timeout):
+    """Run every (instance, config) pair <repeat> times; returns the cells dict."""
+    cells = {}
+    for number in instances:
+        for spec in configs:
+            key = f"inst{number:02d}|{spec}"
+            samples = []
+            for r in range(repeat):
+                print(f"[{key}] run {r + 1}/{repeat}")
+                result = run_isolated(spec, instance_path(number), timeout)
+                stats = result.get("stats", {})
+                samples.append({
+                    "wall_time": result.get("wall_time"),
+                    "build_time": stats.get("build_time"),
+                    "solve_time": stats.get("solve_time"),
+                    "peak_rss_mb": result.get("peak_rss_mb"),
+                    "obj": result.get("obj"),
+                    "optimal": result.get("optimal", False),
+                    "error": result.get("error"),
+                })
+            cells[key] = samples
+    return cells
+
+
+def permutation_test(a, b, max_permutations=20000, seed=0):
+    """Two-sided p-value for mean(a) != mean(b)."""
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    pooled = np.concatenate([a, b])
+    observed = abs(a.mean() - b.mean())
+    n = len(a)
+    total = len(pooled)
+
+    n_combinations = 1
+    for k in range(n):
+        n_combinations = n_combinations * (total - k) // (k + 1)
+
+    if n_combinations <= max_permutations:
+        splits = (np.array(c) for c in itertools.combinations(range(total), n))
+    else:
+        rng = np.random.default_rng(seed)
+        splits = (rng.permutation(total)[:n] for _ in range(max_permutations))
+
+    extreme = 0
+    count = 0
+    for idx in splits:
+        mask = np.zeros(total, dtype=bool)
+        mask[idx] = True
+        if abs(pooled[mask].mean() - pooled[~mask].mean()) >= observed - 1e-12:
+            extreme += 1
+        count += 1
+    return extreme / count
+
+
+def _values(samples, metric):
+    return [s[metric] for s in samples if s.get(metric) is not None]
+
+
+def compare(baseline, current, alpha=0.05, threshold=0.05):
+    """Return (report rows, number of regressions)."""
+    rows = []
+    regressions = 0
+    for key in sorted(set(baseline["cells"]) & set(current["cells"])):
+        old, new = baseline["cells"][key], current["cells"][key]
+
+        for metric in TIME_METRICS:
+            a, b = _values(old, metric), _values(new, metric)
+            if len(a) < 2 or len(b) < 2:
+                continue
+            old_median, new_median = float(np.median(a)), float(np.median(b))
+            change = (new_median - old_median) / old_median if old_median > 0 else 0.0
+            p_value = permutation_test(a, b)
+            verdict = "same"
+            if p_value < alpha and abs(change) > threshold:
+                verdict = "slower" if change > 0 else "faster"
+            if verdict == "slower":
+                regressions += 1
+            rows.append((key, metric, old_median, new_median, change, p_value, verdict))
+
+        a, b = _values(old, "obj"), _values(new, "obj")
+        if a and b:
+            old_obj, new_obj = min(a), min(b)
+            verdict = "worse" if new_obj > old_obj else ("better" if new_obj < old_obj else "same")
+            if verdict == "worse":
+                regressions += 1
+            rows.append((key, "best obj", old_obj, new_obj,
+                         (new_obj - old_obj) / old_obj if old_obj else 0.0, None, verdict))
+        elif a and not b:
+            regressions += 1
+            rows.append((key, "best obj", min(a), None, None, None, "lost"))
+
+        if any(s["optimal"] for s in old) and not any(s["optimal"] for s in new):
+            regressions += 1
+            rows.append((key, "optimal", 1, 0, None, None, "lost"))
+    return rows, regressions
+
+
+def print_comparison(rows, regressions, baseline, current):
+    if baseline["environment"].get("machine") != current["environment"].get("machine") or \
+       baseline["environment"].get("cpu_count") != current["environment"].get("cpu_count"):
+        print("Warning: baseline was recorded on a different machine; timings may not be comparable.")
+    changed = [path for path, digest in current["environment"]["files"].items()
+               if baseline["environment"]["files"].get(path) != digest]
+    if changed:
+        print(f"Changed model files since baseline: {', '.join(changed)}")
+
+    print(f"{'instance|config':<40} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8} {'p':>6}  verdict")
+    for key, metric, old, new, change, p_value, verdict in rows:
+        fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+        print(f"{key:<40} {metric:<12} {fmt(old, '10.2f'):>10} {fmt(new, '10.2f'):>10} "
+              f"{fmt(change, '+8.1%'):>8} {fmt(p_value, '6.3f'):>6}  {verdict}")
+    print(f"\n{regressions} regression(s) found.")
+
+
+def _load(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark harness with baseline regression tracking.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the instance/config matrix.")
+    run.add_argument("--instances", type=parse_instances, default=parse_instances("1-10"))
+    run.add_argument("--configs", type=lambda s: s.split(","), default=["cp", "smt:2d", "smt:3d", "mip"])
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--timeout", type=int, default=60)
+    run.add_argument("--out", type=str, default="bench/run.json")
+    run.add_argument("--compare", type=str, help="Baseline file to compare against.")
+
+    cmp = sub.add_parser("compare", help="Compare two stored runs.")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+
+    for p in (run, cmp):
+        p.add_argument("--alpha", type=float, default=0.05, help="Significance level.")
+        p.add_argument("--threshold", type=float, default=0.05, help="Minimum relative change to report.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        current = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "matrix": {"instances": args.instances, "configs": args.configs,
+                       "repeat": args.repeat, "timeout": args.timeout},
+            "cells": run_matrix(args.instances, args.configs, args.repeat, args.timeout),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=4)
+        print(f"Benchmark saved to {args.out}")
+        if not args.compare:
+            return
+        baseline = _load(args.compare)
+    else:
+        baseline, current = _load(args.baseline), _load(args.current)
+
+    rows, regressions = compare(baseline, current, alpha=args.alpha, threshold=args.threshold)
+    print_comparison(rows, regressions, baseline, current)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+k-nearest-neighbour candidate arc graph.
+
+All models allow every one of the (n+1)^2 arcs, but good routes almost never
+use long ones. candidate_arcs() keeps, for every item, its k nearest
+successors and its k nearest predecessors, plus every depot arc, and returns
+a boolean (n+1)x(n+1) matrix `allowed` (allowed[u][v] -> arc u->v may be
+used). The backends only create arc variables / allowed successors where
+allowed is True.
+
+Restricting arcs is a heuristic: it can cut off the optimum (or, with a very
+small k and tight capacities, every solution). Widening with a known
+solution guarantees that solution stays feasible; the backends can also
+re-solve on the full graph to prove optimality (see cdmo/backends.py).
+"""
+
+import json
+import os
+
+import numpy as np
+
+RESULT_DIRS = ["res/CP", "res/SMT", "res/MIP"]
+
+
+def candidate_arcs(distance, k, depot=None, routes=None):
+    """
+    Parameters:
+        distance: (n+1)x(n+1) distance matrix (lists or array).
+        k (int): Nearest successors / predecessors kept per item.
+        depot (int): Depot node index (default: the last node, as in the .dat files).
+        routes (list of lists): Optional known solution (1-based items, as in "sol")
+            whose arcs must stay allowed.
+
+    Returns:
+        np.ndarray of bool, allowed[u][v] for every arc u->v.
+    """
+    D = np.asarray(distance, dtype=np.int64)
+    size = D.shape[0]
+    depot = size - 1 if depot is None else depot
+    items = np.array([v for v in range(size) if v != depot])
+    k = max(1, min(k, len(items) - 1))
+
+    allowed = np.zeros((size, size), dtype=bool)
+    if len(items) > 1:
+        sub = D[np.ix_(items, items)].astype(float)
+        np.fill_diagonal(sub, np.inf)
+        # k nearest successors of each item (row-wise) and predecessors (column-wise)
+        succ = np.argpartition(sub, k - 1, axis=1)[:, :k]
+        pred = np.argpartition(sub, k - 1, axis=0)[:k, :]
+        rows = np.repeat(np.arange(len(items)), k)
+        allowed[items[rows], items[succ.ravel()]] = True
+        allowed[items[pred.T.ravel()], items[rows]] = True
+
+    allowed[depot, :] = True
+    allowed[:, depot] = True
+    np.fill_diagonal(allowed, False)
+    # Couriers pad their routes with the depot (CP models), so depot->depot stays.
+    allowed[depot, depot] = True
+
+    if routes:
+        for u, v in route_arcs(routes, depot):
+            allowed[u, v] = True
+    return allowed
+
+
+def route_arcs(routes, depot):
+    """0-based arcs (u, v) of routes given as 1-based item lists (the "sol" format)."""
+    arcs = []
+    for route in routes:
+        nodes = [depot] + [item - 1 for item in route] + [depot]
+        arcs.extend(zip(nodes[:-1], nodes[1:]))
+    return arcs
+
+
+def covers(allowed, routes):
+    depot = allowed.shape[0] - 1
+    return all(allowed[u, v] for u, v in route_arcs(routes, depot))
+
+
+def widen_until_covered(distance, k, routes, max_k=None):
+    """Smallest k' >= k whose kNN graph already contains every arc of <routes>."""
+    size = np.asarray(distance).shape[0]
+    max_k = max_k or size - 2
+    while k < max_k and not covers(candidate_arcs(distance, k), routes):
+        k += 1
+    return k, candidate_arcs(distance, k)
+
+
+def known_routes(instance_number, result_dirs=RESULT_DIRS):
+    """Best stored solution for an instance across res/*, or None."""
+    best = None
+    for directory in result_dirs:
+        path = os.path.join(directory, f"{int(instance_number)}.json")
+        try:
+            with open(path, "r") as f:
+                results = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        for result in results.values():
+            sol, obj = result.get("sol"), result.get("obj")
+            if isinstance(sol, list) and sol and obj and (best is None or obj < best[0]):
+                best = (obj, sol)
+    return best[1] if best else None
+
+
+def density(allowed):
+    """Fraction of the (n+1)^2 arcs that are kept."""
+    return float(allowed.sum()) / allowed.size
@@ -0,0 +1,85 @@
+"""
+Single command line for every backend and tool.
+
+    python3 -m cdmo solve 7 --backend smt:2d:sb --timeout 60
+    python3 -m cdmo solve Instances/inst13.dat --backend cp:chuffed:firstfail_indmin_sb --knn 10
+    python3 -m cdmo backends
+    python3 -m cdmo race Instances/inst13.dat --timeout 300      # any tool below, same arguments
+
+Only the selected backend's solver stack is imported (see BACKENDS in
+cdmo/backends.py), and tools are imported only when their command runs.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+
+# command -> module whose main() takes the remaining arguments
+TOOLS = {
+    "benchmark": "cdmo.benchmark",
+    "colgen": "cdmo.colgen",
+    "decompose": "cdmo.decompose",
+    "estimate": "cdmo.estimate",
+    "flatzinc": "cdmo.flatzinc",
+    "generate": "cdmo.generator",
+    "portfolio": "cdmo.portfolio",
+    "race": "cdmo.race",
+    "reduce": "cdmo.reduce",
+    "reoptimise": "cdmo.reoptimise",
+    "scaling": "cdmo.scaling",
+    "schedule": "cdmo.schedule",
+    "service": "cdmo.service",
+    "telemetry": "cdmo.telemetry",
+    "tune-z3": "smt_final.profiles",
+}
+
+
+def solve_command(argv):
+    from cdmo.backends import solve
+
+    parser = argparse.ArgumentParser(prog="cdmo solve", description="Solve one instance with one backend.")
+    parser.add_argument("instance", help="Instance number (e.g. 7) or path to a .dat file.")
+    parser.add_argument("--backend", type=str, default="cp",
+                        help="Backend spec, e.g. cp:chuffed:firstfail_indmin_sb, smt:3d:sb, mip:PULP_CBC_CMD:sb.")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--knn", type=int, help="Only allow arcs to each item's K nearest neighbours.")
+    parser.add_argument("--reduce", action="store_true", help="Merge co-located items before solving.")
+    parser.add_argument("--telemetry", type=str, help="Append the incumbent/bound trace to this JSONL file.")
+    parser.add_argument("--out", type=str, help="Optional JSON file for the result.")
+    args = parser.parse_args(argv)
+
+    result = solve(args.instance, args.backend, timeout=args.timeout, knn=args.knn, reduce=args.reduce,
+                   telemetry=args.telemetry)
+    print(json.dumps(result, indent=3, default=str))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=4, default=str)
+
+
+def backends_command(argv):
+    from cdmo.backends import BACKENDS, parse_config
+
+    for name, target in BACKENDS.items():
+        print(f"{name:<8} {target if isinstance(target, str) else target.__module__ + ':' + target.__name__}")
+    print("\nSpecs:" + parse_config.__doc__.split("kwargs):", 1)[1].rstrip())
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = ["solve", "backends"] + sorted(TOOLS)
+    if not argv or argv[0] in ("-h", "--help") or argv[0] not in commands:
+        print("usage: python3 -m cdmo <command> [arguments]\n\ncommands: " + ", ".join(commands))
+        sys.exit(0 if argv and argv[0] in ("-h", "--help") else 1)
+
+    command, rest = argv[0], argv[1:]
+    if command == "solve":
+        solve_command(rest)
+    elif command == "backends":
+        backends_command(rest)
+    else:
+        module = importlib.import_module(TOOLS[command])
+        sys.argv = [f"cdmo {command}"] + rest
+        module.main()
@@ -0,0 +1,342 @@
+"""
+Set-partitioning MIP over courier routes, solved by column generation.
+
+The arc-based MIPs (test/solver_model.py) only bound route lengths through
+MTZ big-M rows, so their LP relaxation is close to zero and CBC proves
+little. Here a column is a whole route r (items in visiting order, with its
+length c_r and load) and the master picks one route per courier:
+
+    min z
+    s.t. sum_{k, r containing j} lambda[k][r] = 1    every item j        (dual pi_j)
+         sum_r lambda[k][r] = 1                       every courier k     (dual mu_k)
+         z - sum_r c_r * lambda[k][r] >= 0            every courier k     (dual sigma_k)
+
+where courier k only gets the routes within its capacity.
+
+Price-and-branch:
+    1. A greedy solution (repair() of cdmo/reoptimise.py on empty routes,
+       then polished) makes the restricted master feasible.
+    2. The LP relaxation is solved with CBC and new routes are priced per
+       courier, with reduced cost sigma_k * c_r - sum_{j in r} pi_j - mu_k.
+       An add/drop heuristic runs first; only when it finds nothing is the
+       exact pricing problem solved (a capacitated prize-collecting TSP as a
+       small PuLP model with subtour cuts added lazily, as in cdmo/tsp.py).
+    3. After an exact pricing round, sum_j pi_j + sum_k mu_k + sum_k (least
+       reduced cost of k) is a lower bound on the optimum (Lagrangian bound).
+       It holds for any multipliers with sigma >= 0 and sum_k sigma_k <= 1,
+       so it does not rely on CBC's duals being complementary to the LP
+       solution; if sum_k sigma_k > 1 the bound loses
+       (sum_k sigma_k - 1) * incumbent, since z never exceeds the incumbent.
+    4. The master is solved once as a MIP over all generated columns,
+       warm-started from the incumbent, and the result is polished.
+
+    python3 -m cdmo.colgen Instances/inst07.dat --timeout 300
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from cdmo.instances import load_instance
+from cdmo.polish import improve_order, polish_routes, route_lengths
+from cdmo.reoptimise import Change, repair
+from cdmo.stats import empty_stats
+from cdmo.tsp import cycles, tour_length
+
+LP_SHARE = 0.7            # share of the time for column generation, the rest goes to the integer master
+PRICING_TIME_LIMIT = 10   # seconds per exact pricing problem
+EPS = 1e-6
+
+
+class ColumnPool:
+    """Generated routes as 0-based nodes in visiting order, one per item set (the shortest seen)."""
+
+    def __init__(self, distance, load_size):
+        self.D = np.asarray(distance, dtype=np.int64)
+        self.size = np.asarray(load_size, dtype=np.int64)
+        self.routes, self.lengths, self.loads = [], [], []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.routes)
+
+    def add(self, order):
+        """Add a route; returns True if it is new or shorter than the stored one."""
+        order = [int(node) for node in order]
+        key = frozenset(order)
+        length = tour_length(self.D, order)
+        if key in self.index:
+            r = self.index[key]
+            if length >= self.lengths[r]:
+                return False
+            self.routes[r], self.lengths[r] = order, length
+            return True
+        self.index[key] = len(self.routes)
+        self.routes.append(order)
+        self.lengths.append(length)
+        self.loads.append(int(self.size[order].sum()))
+        return True
+
+    def usable(self, capacity):
+        return [r for r, load in enumerate(self.loads) if load <= capacity]
+
+
+def initial_routes(instance):
+    """Greedy feasible routes: every item inserted where it lengthens a route least, then polished."""
+    m, n = int(instance.num_couriers), int(instance.num_load)
+    change = Change(instance, {}, {k: k for k in range(m)}, list(range(1, n + 1)), set())
+    routes, _ = repair([[] for _ in range(m)], change)
+    routes, _ = polish_routes(routes, instance.distance, instance.load_size, instance.courier_capacity)
+    return routes
+
+
+def solve_master(pool, capacity, n, relax=True, time_limit=None, incumbent=None):
+    """
+    Build and solve the (restricted) master over the pool.
+
+    Returns:
+        tuple: (model, lam, usable) with lam[k, r] the variable of route r for courier k.
+    """
+    import pulp
+
+    m = len(capacity)
+    usable = [pool.usable(capacity[k]) for k in range(m)]
+    model = pulp.LpProblem("Route_Master", pulp.LpMinimize)
+    z = pulp.LpVariable("z", lowBound=0)
+    model += z
+    lam = {(k, r): pulp.LpVariable(f"lambda_{k}_{r}", lowBound=0, upBound=1,
+                                   cat=pulp.LpContinuous if relax else pulp.LpBinary)
+           for k in range(m) for r in usable[k]}
+
+    covering = [[] for _ in range(n)]
+    for (k, r), var in lam.items():
+        for j in pool.routes[r]:
+            covering[j].append(var)
+    for j in range(n):
+        model += (pulp.lpSum(covering[j]) == 1, f"cover_{j}")
+    for k in range(m):
+        model += (pulp.lpSum(lam[k, r] for r in usable[k]) == 1, f"courier_{k}")
+        model += (z - pulp.lpSum(pool.lengths[r] * lam[k, r] for r in usable[k]) >= 0, f"length_{k}")
+
+    if incumbent is not None:
+        for (k, r), var in lam.items():
+            var.setInitialValue(1 if pool.index.get(frozenset(incumbent[k])) == r else 0)
+    options = {"msg": 0, "warmStart": incumbent is not None}
+    if time_limit is not None:
+        options["timeLimit"] = max(1, int(time_limit))
+    model.solve(pulp.PULP_CBC_CMD(**options))
+    return model, lam, usable
+
+
+def price_heuristic(D, size, capacity, pi, mu, sigma, starts):
+    """
+    Add/drop local search on the reduced cost from each start route.
+    Returns the routes (0-based nodes) with negative reduced cost.
+    """
+    depot = D.shape[0] - 1
+    found = {}
+    for start in starts:
+        route = list(start)
+        while True:
+            path = np.array([depot] + route + [depot], dtype=np.int64)
+            load = int(size[route].sum()) if route else 0
+            visited = set(route)
+            free = np.array([j for j in range(depot) if j not in visited and load + size[j] <= capacity
+                             and pi[j] > EPS], dtype=np.int64)
+            if len(free):
+                detour = (D[path[:-1][None, :], free[:, None]] + D[free[:, None], path[1:][None, :]]
+                          - D[path[:-1], path[1:]][None, :])
+                q = detour.argmin(axis=1)
+                gain = pi[free] - sigma * detour[np.arange(len(free)), q]
+                best = int(gain.argmax())
+                if gain[best] > EPS:
+                    route.insert(int(q[best]), int(free[best]))
+                    continue
+            if len(route) > 1:
+                prev, node, succ = path[:-2], path[1:-1], path[2:]
+                gain = sigma * (D[prev, node] + D[node, succ] - D[prev, succ]) - pi[node]
+                best = int(gain.argmax())
+                if gain[best] > EPS:
+                    route.pop(best)
+                    continue
+            break
+        if not route:
+            continue
+        route = improve_order(D, route, time_limit=0.05)
+        reduced = sigma * tour_length(D, route) - pi[route].sum() - mu
+        if reduced < -EPS:
+            found[frozenset(route)] = route
+    return list(found.values())
+
+
+def price_exact(D, size, capacity, pi, mu, sigma, time_limit=PRICING_TIME_LIMIT):
+    """
+    Route of least reduced cost for one courier.
+
+    Returns:
+        tuple: (order, reduced cost, exact); (None, None, False) if the time ran out.
+    """
+    import pulp
+
+    deadline = time.time() + time_limit
+    depot = D.shape[0] - 1
+    nodes = range(depot + 1)
+    model = pulp.LpProblem("pricing", pulp.LpMinimize)
+    x = {(u, v): pulp.LpVariable(f"x_{u}_{v}", cat=pulp.LpBinary) for u in nodes for v in nodes if u != v}
+    y = [pulp.LpVariable(f"y_{j}", cat=pulp.LpBinary) for j in range(depot)]
+    model += (float(sigma) * pulp.lpSum(int(D[u, v]) * var for (u, v), var in x.items())
+              - pulp.lpSum(float(pi[j]) * y[j] for j in range(depot)) - float(mu))
+    for j in range(depot):
+        model += pulp.lpSum(x[u, j] for u in nodes if u != j) == y[j]
+        model += pulp.lpSum(x[j, v] for v in nodes if v != j) == y[j]
+    model += pulp.lpSum(x[depot, v] for v in range(depot)) == 1
+    model += pulp.lpSum(x[u, depot] for u in range(depot)) == 1
+    model += pulp.lpSum(int(size[j]) * y[j] for j in range(depot)) <= int(capacity)
+
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None, None, False
+        model.solve(pulp.PULP_CBC_CMD(msg=0, timeLimit=max(1, int(remaining))))
+        # PuLP also reports a solve stopped on time as LpStatusOptimal; its cost is then not the minimum.
+        if model.sol_status != pulp.LpSolutionOptimal:
+            return None, None, False
+        loops = cycles([arc for arc, var in x.items() if var.value() > 0.5])
+        subtours = [loop for loop in loops if depot not in loop]
+        if not subtours:
+            loop = next(loop for loop in loops if depot in loop)
+            start = loop.index(depot)
+            return loop[start + 1:] + loop[:start], pulp.value(model.objective), True
+        # Generalized subtour cuts: a visited set S is entered from outside at least once.
+        for loop in subtours:
+            inside = pulp.lpSum(x[u, v] for u in loop for v in loop if u != v)
+            for i in loop:
+                model += inside <= pulp.lpSum(y[j] for j in loop if j != i)
+
+
+def solve_colgen(instance, timeout=300, lp_share=LP_SHARE, pricing_time_limit=PRICING_TIME_LIMIT, on_solution=None,
+                 on_bound=None):
+    """
+    Price-and-branch on an Instance.
+
+    Parameters:
+        instance (Instance): See cdmo/instances.py.
+        timeout (float): Overall time limit in seconds.
+        lp_share (float): Share of the time for column generation.
+        pricing_time_limit (float): Seconds per exact pricing problem.
+        on_solution (callable): Called as on_solution(seconds, obj) for every improvement.
+        on_bound (callable): Called as on_bound(seconds, bound) for every Lagrangian bound.
+
+    Returns:
+        dict: The usual result dict plus "iterations"; stats has the number of
+        columns, the last LP value and the proven lower bound ("best_bound").
+    """
+    import pulp
+
+    start_time = time.time()
+    m, n = int(instance.num_couriers), int(instance.num_load)
+    D = np.asarray(instance.distance, dtype=np.int64)
+    size = np.asarray(instance.load_size, dtype=np.int64)
+    capacity = [int(c) for c in instance.courier_capacity]
+
+    best_sol = initial_routes(instance)
+    best_obj = max(route_lengths(best_sol, D))
+    if on_solution is not None:
+        on_solution(time.time() - start_time, best_obj)
+    pool = ColumnPool(D, size)
+    for route in best_sol:
+        pool.add([item - 1 for item in route])
+
+    stats = empty_stats()
+    stats["build_time"] = round(time.time() - start_time, 3)
+    stats["solutions"] = 1
+    lower_bound, lp_value, iterations = 0, None, 0
+    cg_deadline = start_time + lp_share * timeout
+
+    while time.time() < cg_deadline:
+        iterations += 1
+        model, lam, usable = solve_master(pool, capacity, n, relax=True)
+        if model.status != pulp.LpStatusOptimal:
+            break
+        lp_value = pulp.value(model.objective)
+        pi = np.array([model.constraints[f"cover_{j}"].pi or 0.0 for j in range(n)])
+        mu = [model.constraints[f"courier_{k}"].pi or 0.0 for k in range(m)]
+        sigma = [max(0.0, model.constraints[f"length_{k}"].pi or 0.0) for k in range(m)]
+
+        added = 0
+        for k in range(m):
+            starts = [pool.routes[r] for r in usable[k] if (lam[k, r].value() or 0) > EPS] + [[]]
+            for order in price_heuristic(D, size, capacity[k], pi, mu[k], sigma[k], starts):
+                added += pool.add(order)
+        if added:
+            print(f"Iteration {iterations}: LP {lp_value:.2f}, {added} heuristic columns, {len(pool)} in total")
+            continue
+
+        reduced = []
+        for k in range(m):
+            remaining = cg_deadline - time.time()
+            if remaining < 1:
+                break
+            order, cost, exact = price_exact(D, size, capacity[k], pi, mu[k], sigma[k],
+                                             min(pricing_time_limit, remaining))
+            if not exact:
+                break
+            reduced.append(cost)
+            if cost < -EPS:
+                added += pool.add(order)
+        if len(reduced) == m:
+            lagrangian = pi.sum() + sum(mu) + sum(reduced) + min(0.0, 1.0 - sum(sigma)) * best_obj
+            lower_bound = max(lower_bound, int(np.ceil(lagrangian - EPS)))
+            if on_bound is not None:
+                on_bound(time.time() - start_time, lower_bound)
+        print(f"Iteration {iterations}: LP {lp_value:.2f}, {added} exact columns, bound {lower_bound}")
+        if not added or best_obj <= lower_bound:
+            break
+
+    remaining = timeout - (time.time() - start_time)
+    if remaining >= 1 and best_obj > lower_bound:
+        incumbent = [[item - 1 for item in route] for route in best_sol]
+        model, lam, usable = solve_master(pool, capacity, n, relax=False, time_limit=remaining, incumbent=incumbent)
+        if model.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+            routes = [next([item + 1 for item in pool.routes[r]] for r in usable[k] if (lam[k, r].value() or 0) > 0.5)
+                      for k in range(m)]
+            routes, obj = polish_routes(routes, D, size, capacity)
+            if obj < best_obj:
+                best_obj, best_sol = obj, routes
+                stats["solutions"] += 1
+                if on_solution is not None:
+                    on_solution(time.time() - start_time, obj)
+
+    stats["solve_time"] = round(time.time() - start_time - stats["build_time"], 3)
+    stats["variables"] = len(pool)
+    stats["constraints"] = n + 2 * m
+    stats["best_bound"] = lower_bound or None
+    stats["lp_value"] = round(lp_value, 3) if lp_value is not None else None
+    return {
+        "time": int(time.time() - start_time),
+        "optimal": best_obj <= lower_bound,
+        "obj": best_obj,
+        "sol": best_sol,
+        "stats": stats,
+        "iterations": iterations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Set-partitioning MIP with column generation.")
+    parser.add_argument("instance", help="Path to a .dat instance.")
+    parser.add_argument("--timeout", type=int, default=300)
+    parser.add_argument("--lp-share", type=float, default=LP_SHARE,
+                        help="Share of the time for column generation before the integer master.")
+    parser.add_argument("--pricing-time-limit", type=float, default=PRICING_TIME_LIMIT)
+    args = parser.parse_args()
+
+    result = solve_colgen(load_instance(args.instance), timeout=args.timeout, lp_share=args.lp_share,
+                          pricing_time_limit=args.pricing_time_limit)
+    print(json.dumps(result, indent=3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Cluster-first, route-second decomposition.
+
+The monolithic models decide assignment and routing at once, which does not
+scale. Here the two are split:
+
+    1. Master (PuLP/CBC): x[c][j] = courier c delivers item j, exactly the
+       assignment variables of the SMT 2d model. Capacities and "at least one
+       item per courier" are kept; route lengths are replaced by the estimate
+           z >= depot_term + sum_j w_j * x[c][j]
+       where w_j is the mean of item j's cheapest incoming and outgoing arc
+       (every visited node is entered and left once, so this never
+       overestimates a tour), and z >= D[o][j] + D[j][o] for every assigned j.
+    2. Every courier's items are routed on their own (cdmo/tsp.py), in a
+       process pool.
+    3. Feedback: if a courier's real tour T(S) exceeds the estimate, the cut
+           z >= T(S) * (sum_{j in S} x[c][j] - |S| + 1)      for every courier c
+       is added and the master is solved again. With the triangle inequality
+       any superset of S costs at least T(S), so the cut stays valid and the
+       master objective is a lower bound; once the best tour matches it the
+       solution is optimal.
+
+Usage:
+    python3 -m cdmo.decompose Instances/inst07.dat --timeout 300 --workers 4
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cdmo.instances import load_instance
+from cdmo.polish import polish_routes
+from cdmo.stats import empty_stats
+from cdmo.tsp import solve_tour
+
+TOUR_TIME_LIMIT = 10
+
+
+def triangle_inequality(distance):
+    """True if D[i][j] <= D[i][k] + D[k][j] for all i, j, k."""
+    D = np.asarray(distance, dtype=np.int64)
+    return all((D <= D[:, [k]] + D[[k], :]).all() for k in range(D.shape[0]))
+
+
+def arc_weights(distance):
+    """Per-node lower bound on its share of any tour: mean of the cheapest in and out arc."""
+    D = np.asarray(distance, dtype=float)
+    np.fill_diagonal(D, np.inf)
+    return (D.min(axis=0) + D.min(axis=1)) / 2
+
+
+def build_master(instance):
+    """Assignment model with estimated route costs. Returns (model, x, z)."""
+    import pulp
+
+    m, n = instance.num_couriers, instance.num_load
+    D = instance.distance
+    origin = n
+    w = arc_weights(D)
+
+    model = pulp.LpProblem("Cluster_Assignment", pulp.LpMinimize)
+    x = [[pulp.LpVariable(f"x_{i}_{j}", cat=pulp.LpBinary) for j in range(n)] for i in range(m)]
+    z = pulp.LpVariable("z", lowBound=0)
+    model += z
+
+    # 1. Each item is assigned exactly once
+    for j in range(n):
+        model += pulp.lpSum(x[i][j] for i in range(m)) == 1
+
+    for i in range(m):
+        # 2. Capacity constraints
+        model += pulp.lpSum(int(instance.load_size[j]) * x[i][j] for j in range(n)) <= int(instance.courier_capacity[i])
+        # 3. At least one item per courier
+        model += pulp.lpSum(x[i][j] for j in range(n)) >= 1
+        # 4. Estimated route length
+        model += z >= float(w[origin]) + pulp.lpSum(float(w[j]) * x[i][j] for j in range(n))
+        # 5. A courier at least travels to its farthest item and back
+        for j in range(n):
+            model += z >= int(D[origin, j] + D[j, origin]) * x[i][j]
+
+    return model, x, z
+
+
+def add_feedback_cut(model, x, z, items, length):
+    """Every courier that gets all of <items> travels at least <length>."""
+    import pulp
+
+    for row in x:
+        model += z >= length * (pulp.lpSum(row[j] for j in items) - len(items) + 1)
+
+
+def _route(args):
+    sub_distance, time_limit = args
+    return solve_tour(sub_distance, time_limit)
+
+
+def route_clusters(distance, clusters, executor=None, time_limit=TOUR_TIME_LIMIT):
+    """
+    Route every cluster of 0-based items. Returns [(route, length, exact)] with
+    routes as 0-based item lists in visiting order.
+    """
+    D = np.asarray(distance)
+    depot = D.shape[0] - 1
+    tasks = []
+    for items in clusters:
+        nodes = list(items) + [depot]
+        tasks.append((D[np.ix_(nodes, nodes)], time_limit))
+    mapped = executor.map(_route, tasks) if executor is not None else map(_route, tasks)
+    return [([items[k] for k in order], length, exact)
+            for items, (order, length, exact) in zip(clusters, mapped)]
+
+
+def solve_decomposed(instance, timeout=300, workers=None, max_iterations=100,
+                     tour_time_limit=TOUR_TIME_LIMIT, on_solution=None, on_bound=None):
+    """
+    Run the decomposition loop on an Instance.
+
+    Parameters:
+        instance (Instance): See cdmo/instances.py.
+        timeout (float): Overall time limit in seconds.
+        workers (int): Processes for the routing step (None: one per CPU, 1: no pool).
+        max_iterations (int): Master solves at most.
+        on_solution (callable): Called as on_solution(seconds, obj) for every improvement.
+        on_bound (callable): Called as on_bound(seconds, bound) for every master lower bound.
+
+    Returns:
+        dict: The usual result dict plus "iterations"; "optimal" is only set
+        when the best tour meets the master's lower bound.
+    """
+    import pulp
+
+    start_time = time.time()
+    m, n = instance.num_couriers, instance.num_load
+    exact_bound = triangle_inequality(instance.distance)
+    model, x, z = build_master(instance)
+    build_time = time.time() - start_time
+
+    stats = empty_stats()
+    stats["build_time"] = round(build_time, 3)
+    stats["variables"] = len(model.variables())
+    stats["solutions"] = 0
+    best_obj, best_sol, lower_bound = None, [], 0
+    tours = {}  # frozenset of items -> (route, length, exact)
+    iterations = 0
+
+    executor = ProcessPoolExecutor(workers) if workers != 1 else None
+    try:
+        while iterations < max_iterations:
+            remaining = timeout - (time.time() - start_time)
+            if remaining < 1:
+                break
+            iterations += 1
+            model.solve(pulp.PULP_CBC_CMD(msg=0, timeLimit=int(remaining)))
+            if model.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+                break
+            master_optimal = model.sol_status == pulp.LpSolutionOptimal
+
+            clusters = [[j for j in range(n) if x[i][j].value() > 0.5] for i in range(m)]
+            todo = [items for items in clusters if frozenset(items) not in tours]
+            limit = min(tour_time_limit, max(1, timeout - (time.time() - start_time)))
+            for items, tour in zip(todo, route_clusters(instance.distance, todo, executor, limit)):
+                tours[frozenset(items)] = tour
+            routed = [tours[frozenset(items)] for items in clusters]
+
+            obj = max(length for _, length, _ in routed)
+            # The master only sees estimates; local search between couriers often helps the incumbent.
+            sol, polished = polish_routes([[j + 1 for j in route] for route, _, _ in routed], instance.distance,
+                                          instance.load_size, instance.courier_capacity)
+            if best_obj is None or polished < best_obj:
+                best_obj, best_sol = polished, sol
+                stats["solutions"] += 1
+                if on_solution is not None:
+                    on_solution(time.time() - start_time, polished)
+            print(f"Iteration {iterations}: estimate {z.value():.1f}, real {obj}, best {best_obj}")
+
+            # A cut from a heuristic tour may overestimate, after that z is no longer a bound.
+            exact_bound = exact_bound and all(exact for _, _, exact in routed)
+            if master_optimal and exact_bound:
+                lower_bound = max(lower_bound, int(np.ceil(z.value() - 1e-6)))
+                if on_bound is not None:
+                    on_bound(time.time() - start_time, lower_bound)
+                if best_obj <= lower_bound:
+                    break
+
+            # Feedback cuts for every cluster whose tour is longer than the estimate
+            cut = False
+            for items, (_, length, _) in zip(clusters, routed):
+                if length > z.value() + 1e-6:
+                    add_feedback_cut(model, x, z, items, length)
+                    cut = True
+            if not cut:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    stats["solve_time"] = round(time.time() - start_time - build_time, 3)
+    stats["constraints"] = len(model.constraints)
+    stats["best_bound"] = lower_bound or None
+    return {
+        "time": int(time.time() - start_time),
+        "optimal": best_obj is not None and best_obj <= lower_bound,
+        "obj": best_obj,
+        "sol": best_sol,
+        "stats": stats,
+        "iterations": iterations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster-first, route-second decomposition.")
+    parser.add_argument("instance", help="Path to a .dat instance.")
+    parser.add_argument("--timeout", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=None, help="Routing processes (default: one per CPU).")
+    parser.add_argument("--max-iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    result = solve_decomposed(load_instance(args.instance), timeout=args.timeout,
+                              workers=args.workers, max_iterations=args.max_iterations)
+    print(json.dumps(result, indent=3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Model size estimates before anything is built.
+
+From (m, n) and the options, each backend's encoding gets closed-form
+counts of variables, constraints and terms (AST nodes / coefficients), and
+a predicted build memory from a per-term cost. The entry points use them to
+switch to an encoding that fits (SMT 3D -> 2D) or to refuse up front with a
+clear message, instead of running out of memory halfway through the build.
+
+    python3 -m cdmo.estimate Instances/inst21.dat
+
+The memory limit is half the physical RAM unless CDMO_MEMORY_LIMIT_MB is
+set. The per-term costs are rough; compare with peak_rss_mb from
+cdmo/scaling.py when recalibrating.
+"""
+
+import os
+import sys
+
+# Approximate bytes per term while building: Z3 ASTs (+ Optimize's copy),
+# PuLP expression dict entries, FlatZinc table entries in MiniZinc.
+BYTES_PER_TERM = {"smt:2d": 400, "smt:3d": 400, "mip": 250, "cp": 24}
+BASE_MEMORY_MB = 80  # interpreter + solver libraries
+
+
+class ModelTooLarge(Exception):
+    """The requested model would not fit in the memory limit."""
+
+
+def _arcs(n, allowed):
+    """(all arcs, arcs between items) of the routing graph without self-loops."""
+    if allowed is None:
+        return (n + 1) * n, n * (n - 1)
+    total = sum(1 for u in range(n + 1) for v in range(n + 1) if u != v and allowed[u][v])
+    items = sum(1 for u in range(n) for v in range(n) if u != v and allowed[u][v])
+    return total, items
+
+
+def smt_2d(m, n, allowed=None, symmetry=False, implied=False):
+    A, Ai = _arcs(n, allowed)
+    variables = m * n + m * A + m * n + m + 1
+    constraints = n + m + 2 * m * n + m + 2 * m + m + m + 2 * m * n + m * Ai + 2
+    terms = 2 * m * n + 4 * m * A + 6 * m * n + 4 * m * n + 3 * m * A + 6 * m * Ai + 4 * m * n
+    return _extras(variables, constraints, terms, m, n, symmetry, implied)
+
+
+def smt_3d(m, n, allowed=None, symmetry=False, implied=False):
+    A, Ai = _arcs(n, allowed)
+    variables = m * n * n + m * A + m * n + m + 1
+    constraints = (n + m + m * n + m * (n - 1) + m + m * (n - 1) * Ai + m * n + m * n * n + 2 * m
+                   + 2 * m * n + m * Ai + 2)
+    terms = (2 * m * n * n * 3 + 4 * m * n * n + m * n * n + 5 * m * (n - 1) * Ai
+             + m * n * n * (2 * n + 5) + 3 * m * A + 6 * m * Ai)
+    if allowed is not None:
+        constraints += m * (n - 1) * n
+        terms += m * (n - 1) * (n + A - Ai)
+    return _extras(variables, constraints, terms, m, n, symmetry, implied)
+
+
+def mip(m, n, allowed=None, symmetry=False, implied=False):
+    A, Ai = _arcs(n, allowed)
+    variables = m * A + m * (n + 1) + 1
+    constraints = m + m * ((n + 1) + 2 * A) + m + n + m * (2 * Ai + (n + 1) + 2)
+    # The "incoming" constraints repeat the predecessors of every arc: O(m n^3) terms.
+    terms = m * A + m * A * (2 * n + 1) + m * A + m * A + 6 * m * Ai + m * A
+    return _extras(variables, constraints, terms, m, n, symmetry, implied)
+
+
+def cp(m, n, allowed=None, symmetry=False, implied=False):
+    variables = m * (n + 2) + 2 * m + 3
+    constraints = m * (n + 1) + n * m * n + m + 2 * m + m * n * n + m + 2
+    # Each distance lookup is an element constraint over the (n+1)^2 table.
+    terms = m * (n + 1) * (n + 1) ** 2 + 3 * m * n * n + m * n
+    if allowed is not None:
+        constraints += m * (n + 1)
+        terms += m * (n + 1) * (n + 1) ** 2
+    return _extras(variables, constraints, terms, m, n, symmetry, implied)
+
+
+def _extras(variables, constraints, terms, m, n, symmetry, implied):
+    # cdmo/symmetry.py and cdmo/implied.py add at most O(m n) small constraints.
+    if symmetry:
+        constraints += m + n
+        terms += 2 * m * n
+    if implied:
+        constraints += 3 * m + m * n
+        terms += 3 * m * n
+    return {"variables": variables, "constraints": constraints, "terms": terms}
+
+
+ESTIMATORS = {"smt:2d": smt_2d, "smt:3d": smt_3d, "mip": mip, "cp": cp}
+
+
+def estimate(encoding, m, n, **options):
+    """
+    Parameters:
+        encoding (str): "smt:2d", "smt:3d", "mip" or "cp".
+        m, n (int): Couriers and items.
+        options: allowed (candidate-arc matrix), symmetry, implied.
+
+    Returns:
+        dict: variables, constraints, terms and memory_mb.
+    """
+    counts = ESTIMATORS[encoding](m, n, **options)
+    counts["memory_mb"] = round(BASE_MEMORY_MB + counts["terms"] * BYTES_PER_TERM[encoding] / 2 ** 20, 1)
+    return counts
+
+
+def memory_limit_mb():
+    if os.environ.get("CDMO_MEMORY_LIMIT_MB"):
+        return float(os.environ["CDMO_MEMORY_LIMIT_MB"])
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2 ** 20 / 2
+    except (ValueError, OSError, AttributeError):
+        return float("inf")
+
+
+def _refusal(encoding, m, n, counts, limit):
+    return (f"{encoding} model for m={m}, n={n} needs about {counts['memory_mb']:.0f} MB "
+            f"({counts['variables']} variables, {counts['constraints']} constraints, {counts['terms']} terms), "
+            f"over the {limit:.0f} MB limit (set CDMO_MEMORY_LIMIT_MB to change it).")
+
+
+def check_fits(encoding, m, n, limit=None, **options):
+    """Raise ModelTooLarge if the encoding would not fit; otherwise return its estimate."""
+    limit = memory_limit_mb() if limit is None else limit
+    counts = estimate(encoding, m, n, **options)
+    if counts["memory_mb"] > limit:
+        raise ModelTooLarge(_refusal(encoding, m, n, counts, limit))
+    return counts
+
+
+def choose_smt_encoding(m, n, requested="3d", limit=None, **options):
+    """
+    The requested SMT encoding ("2d"/"3d") if it fits, else the other one.
+
+    Returns:
+        str: "2d" or "3d".
+    """
+    limit = memory_limit_mb() if limit is None else limit
+    order = [requested] + [model for model in ("2d", "3d") if model != requested]
+    for model in order:
+        if estimate(f"smt:{model}", m, n, **options)["memory_mb"] <= limit:
+            if model != requested:
+                print(f"SMT {requested.upper()} model for m={m}, n={n} would not fit in {limit:.0f} MB; "
+                      f"using the {model.upper()} encoding instead.")
+            return model
+    raise ModelTooLarge(_refusal(f"smt:{requested}", m, n, estimate(f"smt:{requested}", m, n, **options), limit)
+                        + " The other SMT encoding does not fit either.")
+
+
+def main():
+    from cdmo.instances import load_instance
+
+    limit = memory_limit_mb()
+    print(f"Memory limit: {limit:.0f} MB")
+    print(f"{'instance':<24} {'encoding':<8} {'variables':>12} {'constraints':>12} {'terms':>14} {'MB':>10}")
+    for path in sys.argv[1:]:
+        instance = load_instance(path)
+        m, n = int(instance.num_couriers), int(instance.num_load)
+        for encoding in ESTIMATORS:
+            counts = estimate(encoding, m, n)
+            print(f"{os.path.basename(path):<24} {encoding:<8} {counts['variables']:>12} "
+                  f"{counts['constraints']:>12} {counts['terms']:>14} {counts['memory_mb']:>10.1f}"
+                  + ("  too large" if counts["memory_mb"] > limit else ""))
+
+
+if __name__ == "__main__":
+    main()
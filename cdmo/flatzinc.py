@@ -0,0 +1,264 @@
+"""
+On-disk FlatZinc cache for the MiniZinc path.
+
+Flattening a cp1 model for a large instance costs a noticeable share of a
+run and used to be repeated for every run. Here the model is compiled once
+per (model text, instance data, solver) with `minizinc -c`, and the .fzn
+and .ozn files are kept in .cache/flatzinc/ under a hash of those three:
+
+    - the model text includes the added strings (symmetry breaking,
+      implied constraints, candidate arcs), the data includes the .dzn file
+      and any extra data; the solver part is its id and version, since
+      flattening links the solver's own globals library;
+    - later runs start the solver on the cached .fzn directly
+      (`minizinc --ozn-file ... model.fzn`), reading solutions and
+      statistics from --json-stream;
+    - entries are touched on every hit and the least recently used ones are
+      deleted once the cache is larger than CDMO_FZN_CACHE_MB (default 2048).
+
+The flattening time of this run goes to stats["flatten_time"] (0 on a hit);
+the time the cached entry once took is kept as "cached_flatten_time".
+Set CDMO_FZN_CACHE=0 to always flatten through minizinc-python instead.
+
+    python3 -m cdmo.flatzinc            # list the cache
+    python3 -m cdmo.flatzinc --clear
+"""
+
+import argparse
+import collections
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from cdmo.backends import ROOT_DIR
+
+CACHE_DIR = os.path.join(ROOT_DIR, ".cache", "flatzinc")
+DEFAULT_CACHE_MB = 2048
+MINIZINC = os.environ.get("MINIZINC", "minizinc")
+TIME_STATS = ("flatTime", "solveTime", "initTime", "time")
+
+
+def enabled():
+    return os.environ.get("CDMO_FZN_CACHE", "1") != "0" and shutil.which(MINIZINC) is not None
+
+
+def cache_limit_mb():
+    return float(os.environ.get("CDMO_FZN_CACHE_MB", DEFAULT_CACHE_MB))
+
+
+def _solver_id(solver_name):
+    from cdmo.ledger import solver_version
+    return solver_version("minizinc", solver_name)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def cache_key(solver_name, model_path, extra=None, dzn_file=None, data=None):
+    """Hash of everything the FlatZinc depends on."""
+    digest = hashlib.sha256()
+    for part in (_solver_id(solver_name).encode(), _read(model_path), (extra or "").encode(),
+                 _read(dzn_file) if dzn_file else b"", (data or "").encode()):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+def _entry(key, cache_dir):
+    return {suffix: os.path.join(cache_dir, f"{key}.{suffix}") for suffix in ("fzn", "ozn", "json")}
+
+
+def _entries(cache_dir):
+    """{key: (size in bytes, last use)} of the complete entries."""
+    entries = {}
+    if not os.path.isdir(cache_dir):
+        return entries
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        key = name[:-len(".json")]
+        paths = _entry(key, cache_dir)
+        try:
+            entries[key] = (sum(os.path.getsize(path) for path in paths.values()),
+                            os.path.getmtime(paths["json"]))
+        except OSError:
+            continue
+    return entries
+
+
+def evict(cache_dir=CACHE_DIR, limit_mb=None):
+    """Delete least recently used entries until the cache fits in limit_mb. Returns the number deleted."""
+    limit = (cache_limit_mb() if limit_mb is None else limit_mb) * 2 ** 20
+    entries = _entries(cache_dir)
+    total = sum(size for size, _ in entries.values())
+    deleted = 0
+    for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= limit:
+            break
+        # Metadata first: an entry without it is never used again.
+        for suffix in ("json", "fzn", "ozn"):
+            try:
+                os.remove(_entry(key, cache_dir)[suffix])
+            except OSError:
+                pass
+        total -= size
+        deleted += 1
+    return deleted
+
+
+def compile_cached(solver_name, model_path, extra=None, dzn_file=None, data=None, cache_dir=CACHE_DIR,
+                   timeout=None):
+    """
+    The cached (or freshly compiled) FlatZinc for this model, data and solver.
+
+    Returns:
+        dict: fzn, ozn (paths), hit (bool), flatten_time (seconds spent now)
+        and cached_flatten_time (seconds the first compilation took).
+    Raises:
+        RuntimeError if `minizinc -c` fails (the caller falls back to minizinc-python).
+    """
+    key = cache_key(solver_name, model_path, extra, dzn_file, data)
+    paths = _entry(key, cache_dir)
+    if os.path.exists(paths["json"]):
+        try:
+            with open(paths["json"], "r") as f:
+                meta = json.load(f)
+            os.utime(paths["json"])
+            return {"fzn": paths["fzn"], "ozn": paths["ozn"], "hit": True, "flatten_time": 0.0,
+                    "cached_flatten_time": meta.get("flatten_time")}
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    start_time = time.time()
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        files = [model_path]
+        for name, text in (("extra.mzn", extra), ("extra.dzn", data)):
+            if text:
+                files.append(os.path.join(tmp, name))
+                with open(files[-1], "w") as f:
+                    f.write(text)
+        if dzn_file:
+            files.append(dzn_file)
+        fzn, ozn = os.path.join(tmp, "model.fzn"), os.path.join(tmp, "model.ozn")
+        # Same output settings minizinc-python uses, so solutions come back as JSON.
+        command = [MINIZINC, "-c", "--solver", solver_name, "--output-mode", "json", "--output-objective",
+                   "--fzn", fzn, "--ozn", ozn] + files
+        process = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        if process.returncode != 0 or not os.path.exists(fzn):
+            raise RuntimeError(f"minizinc -c failed: {process.stderr.strip()[-2000:]}")
+        flatten_time = round(time.time() - start_time, 3)
+        os.replace(fzn, paths["fzn"])
+        os.replace(ozn, paths["ozn"])
+        with open(paths["json"], "w") as f:
+            json.dump({"solver": _solver_id(solver_name), "model": os.path.relpath(model_path, ROOT_DIR),
+                       "dzn": dzn_file, "flatten_time": flatten_time,
+                       "created": datetime.datetime.now().isoformat(timespec="seconds")}, f)
+    evict(cache_dir)
+    return {"fzn": paths["fzn"], "ozn": paths["ozn"], "hit": False, "flatten_time": flatten_time,
+            "cached_flatten_time": flatten_time}
+
+
+def _statistics(raw):
+    """--json-stream reports times in seconds; from_minizinc() expects numbers in ms or timedeltas."""
+    return {key: datetime.timedelta(seconds=value) if key in TIME_STATS and isinstance(value, (int, float))
+            else value for key, value in raw.items()}
+
+
+def _solution(output):
+    if "json" in output:
+        return output["json"]
+    text = output.get("default") or output.get("raw") or ""
+    return json.loads(text) if text.strip() else {}
+
+
+def solve_cached(solver_name, compiled, timeout, start_time=None, on_solution=None, stop=None, seed=None):
+    """
+    Run the solver on a cached FlatZinc (the seed does not change the FlatZinc).
+
+    Returns:
+        tuple: (status name, last solution dict or None, statistics, stopped) where
+        the solution has the output variables and "_objective".
+    """
+    start_time = time.time() if start_time is None else start_time
+    command = [MINIZINC, "--solver", solver_name, "--json-stream", "--intermediate", "--statistics",
+               "--time-limit", str(int(timeout * 1000))]
+    if seed is not None:
+        command += ["--random-seed", str(seed)]
+    command += ["--ozn-file", compiled["ozn"], compiled["fzn"]]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    status, solution, statistics, stopped, errors = "UNKNOWN", None, {}, False, []
+    # Drained all along: a solver that fills the stderr pipe would block before its next solution.
+    stderr_tail = collections.deque(maxlen=20)
+    drain = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    drain.start()
+
+    def watch():
+        nonlocal stopped
+        while process.poll() is None:
+            if stop():
+                stopped = True
+                process.kill()
+                return
+            time.sleep(0.2)
+
+    if stop is not None:
+        threading.Thread(target=watch, daemon=True).start()
+
+    for line in process.stdout:
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        kind = message.get("type")
+        if kind == "solution":
+            solution = _solution(message.get("output", {}))
+            status = "SATISFIED"
+            if on_solution is not None:
+                on_solution(time.time() - start_time, solution.get("_objective"))
+        elif kind == "statistics":
+            statistics.update(_statistics(message.get("statistics", {})))
+        elif kind == "status":
+            status = message.get("status", status)
+        elif kind == "error":
+            errors.append(message.get("message", line.strip()))
+    process.wait()
+    drain.join(timeout=1)
+    if process.returncode and not errors:
+        errors.append("".join(stderr_tail).strip()[-2000:] or f"exit code {process.returncode}")
+    if errors and solution is None and not stopped:
+        raise RuntimeError("MiniZinc error: " + "; ".join(errors))
+    return status, solution, statistics, stopped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the FlatZinc cache.")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached entry.")
+    parser.add_argument("--evict", action="store_true", help="Apply the size limit now.")
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        print(f"Cleared {CACHE_DIR}")
+        return
+    if args.evict:
+        print(f"Deleted {evict()} entries")
+    entries = _entries(CACHE_DIR)
+    for key, (size, used) in sorted(entries.items(), key=lambda item: -item[1][1]):
+        with open(_entry(key, CACHE_DIR)["json"], "r") as f:
+            meta = json.load(f)
+        print(f"{key[:12]}  {size / 2 ** 20:8.1f} MB  flatten {meta.get('flatten_time', 0):7.2f} s  "
+              f"{datetime.datetime.fromtimestamp(used):%Y-%m-%d %H:%M}  {meta.get('model')}  {meta.get('dzn')}")
+    total = sum(size for size, _ in entries.values())
+    print(f"{len(entries)} entries, {total / 2 ** 20:.1f} MB of {cache_limit_mb():.0f} MB in {CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
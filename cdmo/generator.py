@@ -0,0 +1,117 @@
+"""
+Seeded generator for synthetic instances in the Instances/*.dat format.
+
+    python3 -m cdmo.generator --n 500 --m 30 --seed 1 --out Instances/generated/g500.dat
+
+Items and the depot (last node) are random points on a grid; distances are
+Manhattan distances, so they satisfy the triangle inequality. With
+--asymmetry > 0 every node also gets a random "height" h (scaled by the
+asymmetry and rounded per node, so the heights are integers) and climbing
+costs extra (D[i][j] += max(0, h[j] - h[i])), which keeps the triangle
+inequality but makes D[i][j] != D[j][i].
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from cdmo.instances import Instance, write_dat
+
+
+def _distances(rng, nodes, grid, asymmetry):
+    points = rng.integers(0, grid, size=(nodes, 2))
+    D = np.abs(points[:, None, :] - points[None, :, :]).sum(axis=2)
+    if asymmetry > 0:
+        # Round the heights, not the climbs: rounding each climb can break the triangle inequality.
+        height = np.rint(asymmetry * rng.integers(0, grid, size=nodes)).astype(np.int64)
+        D = D + np.maximum(0, height[None, :] - height[:, None])
+    np.fill_diagonal(D, 0)
+    return D.astype(np.int32)
+
+
+def _sizes(rng, n, mean_size, size_spread):
+    low = max(1, int(round(mean_size * (1 - size_spread))))
+    high = max(low, int(round(mean_size * (1 + size_spread))))
+    return rng.integers(low, high + 1, size=n)
+
+
+def _capacities(rng, m, sizes, tightness):
+    """
+    Split sum(sizes) / tightness among m couriers (+-25% each), then make sure
+    first-fit-decreasing can place every item while giving each courier one.
+    """
+    total = sizes.sum() / tightness
+    shares = rng.uniform(0.75, 1.25, size=m)
+    capacity = np.maximum(np.floor(total * shares / shares.sum()), sizes.max()).astype(np.int64)
+
+    while True:
+        load = np.zeros(m, dtype=np.int64)
+        order = np.argsort(-sizes)
+        # Seed every courier with one of the largest items, then first-fit the rest.
+        for courier, item in enumerate(order[:m]):
+            load[courier] += sizes[item]
+        placed = True
+        for item in order[m:]:
+            fits = np.flatnonzero(load + sizes[item] <= capacity)
+            if len(fits) == 0:
+                placed = False
+                break
+            load[fits[0]] += sizes[item]
+        if placed and (load <= capacity).all():
+            return capacity
+        capacity = capacity + max(1, int(sizes.mean()))
+
+
+def generate_instance(n, m, seed=0, tightness=0.8, size_spread=0.5, mean_size=20,
+                      asymmetry=0.0, grid=None):
+    """
+    Generates a feasible random instance.
+
+    Parameters:
+        n (int): Number of items (n >= m, every courier must carry one item).
+        m (int): Number of couriers.
+        seed (int): Random seed; the same arguments always give the same instance.
+        tightness (float): Total size / total capacity, in (0, 1].
+        size_spread (float): Item sizes are drawn from mean_size * [1 - spread, 1 + spread].
+        mean_size (int): Average item size.
+        asymmetry (float): 0 for symmetric metric distances, > 0 for asymmetric ones.
+        grid (int): Side of the square the points are drawn from (default scales with n).
+
+    Returns:
+        Instance: the generated instance (arrays are int32).
+    """
+    if n < m:
+        raise ValueError(f"Need at least as many items as couriers (n={n}, m={m}).")
+    if not 0 < tightness <= 1:
+        raise ValueError(f"tightness must be in (0, 1], got {tightness}.")
+
+    rng = np.random.default_rng(seed)
+    if grid is None:
+        grid = max(20, int(10 * np.sqrt(n)))
+    sizes = _sizes(rng, n, mean_size, size_spread)
+    capacity = _capacities(rng, m, sizes, tightness)
+    distance = _distances(rng, n + 1, grid, asymmetry)
+    return Instance(m, n, capacity.astype(np.int32), sizes.astype(np.int32), distance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic courier instance.")
+    parser.add_argument("--n", type=int, required=True, help="Number of items.")
+    parser.add_argument("--m", type=int, required=True, help="Number of couriers.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tightness", type=float, default=0.8, help="Total size / total capacity.")
+    parser.add_argument("--size-spread", type=float, default=0.5)
+    parser.add_argument("--asymmetry", type=float, default=0.0, help="0 = metric and symmetric.")
+    parser.add_argument("--out", type=str, required=True, help="Output .dat file.")
+    args = parser.parse_args()
+
+    instance = generate_instance(args.n, args.m, seed=args.seed, tightness=args.tightness,
+                                 size_spread=args.size_spread, asymmetry=args.asymmetry)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    write_dat(instance, args.out)
+    print(f"Instance written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Implied (redundant) constraints derived from the instance data.
+
+None of these change the set of solutions, they only let the solvers prune
+earlier, mostly on tight-capacity instances:
+
+    - max_items[c]: a courier carries at most as many items as the smallest
+      sizes that fit in its capacity;
+    - min_items[c]: whatever the other couriers cannot carry (at least 1,
+      every courier delivers something);
+    - eligible[c][j]: item j fits courier c at all (s_j <= l_c); an item with
+      one eligible courier is forced onto it;
+    - min_load[c]: with slack = sum(l) - sum(s), courier c carries at least
+      l_c - slack;
+    - round_trip[j] = SP[o][j] + SP[j][o] over shortest paths: a courier
+      delivering j travels at least that far, and every courier at least its
+      cheapest eligible one. The direct D[o][j] + D[j][o] would only be a
+      bound under the triangle inequality, which the asymmetric generated
+      instances can miss by a unit of rounding.
+
+As in cdmo/symmetry.py, the backends pass assigned(c, j) ("courier c delivers
+0-based item j") and distance(c) in their own terms.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+Implied = namedtuple("Implied", ["max_items", "min_items", "eligible", "forced", "slack",
+                                 "min_load", "round_trip", "min_distance"])
+
+
+def derive(courier_capacity, load_size, distance, depot=None):
+    """
+    Compute every implied bound for one instance.
+
+    Returns:
+        Implied: numpy arrays indexed by courier / 0-based item, forced maps
+        item -> its only eligible courier.
+    """
+    capacity = np.asarray(courier_capacity, dtype=np.int64)
+    size = np.asarray(load_size, dtype=np.int64)
+    D = np.asarray(distance, dtype=np.int64)
+    depot = D.shape[0] - 1 if depot is None else depot
+    items = np.array([v for v in range(D.shape[0]) if v != depot])
+    m, n = len(capacity), len(size)
+
+    cumulative = np.cumsum(np.sort(size))
+    max_items = np.minimum(np.searchsorted(cumulative, capacity, side="right"), n - (m - 1))
+    min_items = np.maximum(1, n - (max_items.sum() - max_items))
+
+    eligible = size[None, :] <= capacity[:, None]
+    forced = {int(j): int(np.argmax(eligible[:, j])) for j in range(n) if eligible[:, j].sum() == 1}
+
+    slack = int(capacity.sum() - size.sum())
+    min_load = np.maximum(0, capacity - slack)
+
+    SP = D.copy()
+    for k in range(SP.shape[0]):
+        np.minimum(SP, SP[:, [k]] + SP[[k], :], out=SP)
+    round_trip = SP[depot, items] + SP[items, depot]
+    masked = np.where(eligible, round_trip[None, :], np.iinfo(np.int64).max)
+    min_distance = masked.min(axis=1)
+
+    return Implied(max_items, min_items, eligible, forced, slack, min_load, round_trip, min_distance)
+
+
+def z3_constraints(assigned, distance, m, n, courier_capacity, load_size, D_matrix):
+    """Z3 version; assigned(c, j) is a Bool, distance(c) an arithmetic term."""
+    from z3 import Implies, Not, PbGe, PbLe
+
+    implied = derive(courier_capacity, load_size, D_matrix)
+    constraints = []
+    for c in range(m):
+        constraints.append(PbLe([(assigned(c, j), 1) for j in range(n)], int(implied.max_items[c])))
+        constraints.append(PbGe([(assigned(c, j), 1) for j in range(n)], int(implied.min_items[c])))
+        if implied.min_load[c] > 0:
+            constraints.append(PbGe([(assigned(c, j), int(load_size[j])) for j in range(n)],
+                                    int(implied.min_load[c])))
+        constraints.append(distance(c) >= int(implied.min_distance[c]))
+        for j in range(n):
+            if not implied.eligible[c, j]:
+                constraints.append(Not(assigned(c, j)))
+            else:
+                constraints.append(Implies(assigned(c, j), distance(c) >= int(implied.round_trip[j])))
+    for j, c in implied.forced.items():
+        constraints.append(assigned(c, j))
+    return constraints
+
+
+def pulp_constraints(model, assigned, distance, m, n, courier_capacity, load_size, D_matrix):
+    """PuLP version; assigned(c, j) is a 0/1 linear expression, distance(c) linear."""
+    import pulp
+
+    implied = derive(courier_capacity, load_size, D_matrix)
+    for c in range(m):
+        count = pulp.lpSum(assigned(c, j) for j in range(n))
+        model += count <= int(implied.max_items[c])
+        model += count >= int(implied.min_items[c])
+        if implied.min_load[c] > 0:
+            model += pulp.lpSum(int(load_size[j]) * assigned(c, j) for j in range(n)) >= int(implied.min_load[c])
+        model += distance(c) >= int(implied.min_distance[c])
+        for j in range(n):
+            if not implied.eligible[c, j]:
+                model += assigned(c, j) == 0
+            else:
+                model += distance(c) >= int(implied.round_trip[j]) * assigned(c, j)
+    for j, c in implied.forced.items():
+        model += assigned(c, j) == 1
+
+
+def _mzn_array(values):
+    return "[" + ", ".join(str(int(v)) for v in values) + "]"
+
+
+def minizinc_constraints(courier_capacity, load_size, distance):
+    """
+    MiniZinc version for the cp1 models (load_assigned rows padded with the
+    depot num_load+1 once a courier is done). Returns a string for
+    Model.add_string().
+    """
+    implied = derive(courier_capacity, load_size, distance)
+    m, n = implied.eligible.shape
+    lines = [
+        f"array[1..num_couriers] of int: implied_max_items = {_mzn_array(implied.max_items)};",
+        f"array[1..num_couriers] of int: implied_min_items = {_mzn_array(implied.min_items)};",
+        f"array[1..num_couriers] of int: implied_min_load = {_mzn_array(implied.min_load)};",
+        f"array[1..num_load+1] of int: implied_round_trip = {_mzn_array(list(implied.round_trip) + [0])};",
+        # items occupy positions 2..items+1, the rest is depot padding
+        "constraint forall(courier in 1..num_couriers)(",
+        "    forall(pos in implied_max_items[courier]+2..num_load+1)(load_assigned[courier, pos] = num_load+1) /\\",
+        "    load_assigned[courier, implied_min_items[courier]+1] != num_load+1 /\\",
+        "    weights[courier] >= implied_min_load[courier] /\\",
+        "    total_distance[courier] >= max(pos in 2..num_load+1)(implied_round_trip[load_assigned[courier, pos]])",
+        ");",
+    ]
+    for c in range(m):
+        for j in range(n):
+            if not implied.eligible[c, j]:
+                lines.append(f"constraint forall(pos in 2..num_load+1)(load_assigned[{c + 1}, pos] != {j + 1});")
+    for j, c in implied.forced.items():
+        lines.append(f"constraint exists(pos in 2..num_load+1)(load_assigned[{c + 1}, pos] = {j + 1});")
+    return "\n".join(lines) + "\n"
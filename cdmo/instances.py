@@ -0,0 +1,214 @@
+"""
+Single instance loader for the .dat files in Instances/.
+
+Each .dat file is parsed once and compiled into a binary cache next to it
+(in a .cache/ folder): the distance matrix is stored as an int32 .npy file
+and the header (couriers, items, capacities, sizes) in a small int64 .npy
+file. Later loads memory-map the distance matrix instead of parsing text,
+so large generated instances start in milliseconds and share pages between
+processes.
+"""
+
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+# Bump when the cache layout changes so stale caches get recompiled.
+CACHE_VERSION = 1
+CACHE_DIR_NAME = ".cache"
+INSTANCE_DIR = "Instances"
+
+Instance = namedtuple(
+    "Instance",
+    ["num_couriers", "num_load", "courier_capacity", "load_size", "distance"]
+)
+
+
+def instance_path(instance_number, directory=INSTANCE_DIR):
+    """Return the path of instance <instance_number> (e.g. 7 -> Instances/inst07.dat)."""
+    return os.path.join(directory, f"inst{int(instance_number):02d}.dat")
+
+
+def parse_dat(filename):
+    """
+    Parses a .dat file into an Instance of NumPy arrays.
+
+    Parameters:
+        filename (str): The path to the .dat file.
+
+    Returns:
+        Instance: capacities, sizes and distances as int32 arrays.
+    """
+    with open(filename, 'r') as file:
+        return parse_dat_text(file.read(), filename)
+
+
+def parse_dat_text(text, filename="<text>"):
+    """Same as parse_dat() for the contents of a .dat file (e.g. a request payload)."""
+    tokens = text.split()
+
+    if len(tokens) < 4:
+        raise ValueError("The file does not contain enough lines to parse the required variables.")
+
+    try:
+        values = np.array(tokens, dtype=np.int64)
+    except ValueError as e:
+        raise ValueError(f"Error parsing '{filename}': {e}")
+
+    m, n = int(values[0]), int(values[1])
+    expected = 2 + m + n + (n + 1) * (n + 1)
+    if len(values) != expected:
+        raise ValueError(
+            f"'{filename}' has {len(values)} values, expected {expected} for m={m}, n={n}."
+        )
+
+    limits = np.iinfo(np.int32)
+    if values.size and (values.min() < limits.min or values.max() > limits.max):
+        raise ValueError(f"'{filename}' has values outside the int32 range [{limits.min}, {limits.max}].")
+
+    courier_capacity = values[2:2 + m].astype(np.int32)
+    load_size = values[2 + m:2 + m + n].astype(np.int32)
+    distance = values[2 + m + n:].astype(np.int32).reshape(n + 1, n + 1)
+    return Instance(m, n, courier_capacity, load_size, distance)
+
+
+def _cache_paths(filename, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return (os.path.join(cache_dir, f"{stem}.meta.npy"),
+            os.path.join(cache_dir, f"{stem}.dist.npy"))
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+
+def _save_atomic(path, array):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def compile_instance(filename, cache_dir=None):
+    """
+    Parses <filename> and writes its binary cache.
+
+    Returns:
+        tuple: (meta_path, dist_path) of the written cache files.
+    """
+    instance = parse_dat(filename)
+    meta_path, dist_path = _cache_paths(filename, cache_dir)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+    size, mtime_ns = _stamp(filename)
+    meta = np.concatenate([
+        np.array([CACHE_VERSION, size, mtime_ns, instance.num_couriers, instance.num_load], dtype=np.int64),
+        instance.courier_capacity.astype(np.int64),
+        instance.load_size.astype(np.int64),
+    ])
+    # Distances first: a present meta file means the cache is complete.
+    _save_atomic(dist_path, np.ascontiguousarray(instance.distance, dtype=np.int32))
+    _save_atomic(meta_path, meta)
+    return meta_path, dist_path
+
+
+def _read_cache(filename, meta_path, dist_path):
+    """Return the cached Instance, or None if the cache is missing or stale."""
+    if not (os.path.exists(meta_path) and os.path.exists(dist_path)):
+        return None
+    try:
+        meta = np.load(meta_path)
+        size, mtime_ns = _stamp(filename)
+        if meta[0] != CACHE_VERSION or meta[1] != size or meta[2] != mtime_ns:
+            return None
+        m, n = int(meta[3]), int(meta[4])
+        distance = np.load(dist_path, mmap_mode='r')
+    except (OSError, ValueError, IndexError):
+        return None
+    if distance.shape != (n + 1, n + 1) or len(meta) != 5 + m + n:
+        return None
+    return Instance(
+        m, n,
+        meta[5:5 + m].astype(np.int32),
+        meta[5 + m:].astype(np.int32),
+        distance,
+    )
+
+
+def load_instance(filename, cache_dir=None, use_cache=True):
+    """
+    Loads an instance, compiling its binary cache on first use.
+
+    Parameters:
+        filename (str): The path to the .dat file.
+        cache_dir (str): Where to keep the cache (default: <dir of file>/.cache).
+        use_cache (bool): If False, parse the text file and skip the cache.
+
+    Returns:
+        Instance: (num_couriers, num_load, courier_capacity, load_size, distance)
+        where the arrays are int32 and `distance` is a read-only memory map.
+    """
+    if not use_cache:
+        return parse_dat(filename)
+
+    meta_path, dist_path = _cache_paths(filename, cache_dir)
+    instance = _read_cache(filename, meta_path, dist_path)
+    if instance is None:
+        try:
+            compile_instance(filename, cache_dir)
+        except OSError:
+            # Read-only checkout: fall back to parsing every time.
+            return parse_dat(filename)
+        instance = _read_cache(filename, meta_path, dist_path)
+    return instance
+
+
+def to_lists(instance):
+    """Return the instance as plain Python ints/lists (for Z3 and PuLP expressions)."""
+    return (
+        int(instance.num_couriers),
+        int(instance.num_load),
+        np.asarray(instance.courier_capacity).tolist(),
+        np.asarray(instance.load_size).tolist(),
+        np.asarray(instance.distance).tolist(),
+    )
+
+
+def write_dat(instance, filename):
+    """Write an Instance in the .dat format used by Instances/."""
+    m, n, l, s, D = to_lists(instance)
+    with open(filename, 'w') as f:
+        f.write(f"{m}\n{n}\n")
+        f.write(" ".join(map(str, l)) + "\n")
+        f.write(" ".join(map(str, s)) + "\n")
+        for row in D:
+            f.write(" ".join(map(str, row)) + "\n")
+
+
+def write_dzn(instance, filename):
+    """Write an Instance as MiniZinc data (same layout as converted_instances/)."""
+    m, n, l, s, D = to_lists(instance)
+    with open(filename, 'w') as f:
+        f.write(f"num_couriers = {m};\n")
+        f.write(f"num_load = {n};\n")
+        f.write(f"courier_capacity = {l};\n")
+        f.write(f"load_size = {s};\n")
+        f.write("distance = [| ")
+        for i, row in enumerate(D):
+            f.write(", ".join(map(str, row)))
+            if i < len(D) - 1:
+                f.write(",\n  | ")
+            else:
+                f.write(" |];\n")
+
+
+if __name__ == "__main__":
+    # python3 -m cdmo.instances Instances/*.dat  -> (re)compile caches
+    for path in sys.argv[1:]:
+        meta_path, dist_path = compile_instance(path)
+        print(f"Compiled {path} -> {dist_path}")
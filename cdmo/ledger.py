@@ -0,0 +1,139 @@
+"""
+Result reuse and resumable sweeps.
+
+Every run is identified by a fingerprint of what its result depends on:
+the instance content (not the file name), the model files, the solver
+version and the options (timeout, symmetry, ...). Finished runs are
+appended to res/ledger.jsonl together with their result.
+
+Before solving, the runners ask the ledger:
+    - a result proven optimal under the same fingerprint is reused;
+    - with resume=True any finished run is reused, so an interrupted sweep
+      continues where it stopped;
+    - with force=True the ledger is only written, never read.
+
+Changing the model, the instance, the solver or an option changes the
+fingerprint, so only those configurations are solved again.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from cdmo.backends import ROOT_DIR
+
+LEDGER_FILE = os.path.join(ROOT_DIR, "res", "ledger.jsonl")
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def instance_digest(instance):
+    """Hash of the instance data itself; reformatting the .dat file does not change it."""
+    digest = hashlib.sha256()
+    digest.update(np.array([instance.num_couriers, instance.num_load], dtype=np.int64).tobytes())
+    for array in (instance.courier_capacity, instance.load_size, instance.distance):
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def allowed_digest(allowed):
+    """Hash of a candidate-arc matrix (cdmo/candidates.py), or None for the full graph.
+
+    The k-NN graph is widened with the routes stored under res/, so the same
+    k can give a different graph once a better solution has been saved.
+    """
+    if allowed is None:
+        return None
+    return _sha256(np.ascontiguousarray(allowed, dtype=bool).tobytes())
+
+
+def file_digest(relpath):
+    with open(os.path.join(ROOT_DIR, relpath), "rb") as f:
+        return _sha256(f.read())
+
+
+def solver_version(kind, name=None):
+    """Version string of the solver stack behind a backend ("minizinc", "z3" or "pulp")."""
+    try:
+        if kind == "minizinc":
+            import minizinc
+            solver = minizinc.Solver.lookup(name)
+            return f"minizinc {minizinc.default_driver.parsed_version} {solver.id} {solver.version}"
+        if kind == "z3":
+            import z3
+            return f"z3 {z3.get_version_string()}"
+        if kind == "pulp":
+            import pulp
+            return f"pulp {pulp.__version__} {name}"
+    except Exception:
+        pass
+    return f"{kind} {name} unknown"
+
+
+def fingerprint(instance, model_files, solver, options):
+    """
+    Parameters:
+        instance (Instance): See cdmo/instances.py.
+        model_files (list of str): Repo-relative files the model is built from.
+        solver (str): solver_version() of the backend.
+        options (dict): Everything else the result depends on (JSON-serialisable).
+
+    Returns:
+        str: hex digest.
+    """
+    key = {
+        "instance": instance_digest(instance),
+        "model": {path: file_digest(path) for path in sorted(model_files)},
+        "solver": solver,
+        "options": options,
+    }
+    return _sha256(json.dumps(key, sort_keys=True, default=str).encode())
+
+
+class Ledger:
+    """Append-only log of finished runs, read once when created."""
+
+    def __init__(self, path=LEDGER_FILE, resume=False, force=False):
+        self.path = path
+        self.resume = resume
+        self.force = force
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted write
+                    previous = self.entries.get(entry["fingerprint"])
+                    # keep an optimal result over a later non-optimal one
+                    if previous is None or not previous["result"].get("optimal"):
+                        self.entries[entry["fingerprint"]] = entry
+
+    def lookup(self, fp):
+        """The stored result to reuse for this fingerprint, or None to solve."""
+        if self.force:
+            return None
+        entry = self.entries.get(fp)
+        if entry is None or "error" in entry["result"]:
+            return None
+        if entry["result"].get("optimal") or self.resume:
+            return entry["result"]
+        return None
+
+    def record(self, fp, result, **info):
+        entry = {"fingerprint": fp, "finished": datetime.datetime.now().isoformat(timespec="seconds"),
+                 **info, "result": result}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        previous = self.entries.get(fp)
+        if previous is None or not previous["result"].get("optimal"):
+            self.entries[fp] = entry
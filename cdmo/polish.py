@@ -0,0 +1,243 @@
+"""
+Post-solve route polishing.
+
+Timed-out runs often return routes that are easy to improve (e.g. items
+visited in index order). polish_routes() runs cheap local search on the
+"sol" lists before they are saved:
+
+    - 2-opt and or-opt (segments of 1-3 items) inside every route,
+    - relocate / swap of items between the bottleneck route and the others,
+    - finally the exact visiting order for routes of up to HELD_KARP_MAX items.
+
+All move deltas are evaluated for every position at once with NumPy. Moves
+never break capacities or leave a courier without items, intra-route moves
+must shorten their route and inter-route moves must shorten the longer of
+the two routes involved, so the max distance never goes up. The polished
+routes are only kept when the max distance actually drops.
+"""
+
+import time
+
+import numpy as np
+
+from cdmo.tsp import HELD_KARP_MAX, held_karp
+
+POLISH_TIME_LIMIT = 1.0
+
+
+def _nodes(route, depot):
+    """1-based item list -> 0-based node array with the depot at both ends."""
+    return np.array([depot] + [item - 1 for item in route] + [depot], dtype=np.int64)
+
+
+def route_length(D, nodes):
+    return int(D[nodes[:-1], nodes[1:]].sum())
+
+
+def route_lengths(routes, distance):
+    D = np.asarray(distance)
+    depot = D.shape[0] - 1
+    return [route_length(D, _nodes(route, depot)) for route in routes]
+
+
+def _best_two_opt(D, p):
+    """Best segment reversal p[i..j]; returns (delta, i, j). Exact for asymmetric D."""
+    L = len(p) - 2
+    if L < 2:
+        return 0, None, None
+    fwd = np.concatenate([[0], np.cumsum(D[p[:-1], p[1:]])])
+    bwd = np.concatenate([[0], np.cumsum(D[p[1:], p[:-1]])])
+    i, j = np.meshgrid(np.arange(1, L + 1), np.arange(1, L + 1), indexing="ij")
+    delta = (D[p[i - 1], p[j]] + D[p[i], p[j + 1]] + (bwd[j] - bwd[i])
+             - D[p[i - 1], p[i]] - D[p[j], p[j + 1]] - (fwd[j] - fwd[i]))
+    delta = np.where(i < j, delta, 0)
+    flat = int(np.argmin(delta))
+    return int(delta.flat[flat]), int(i.flat[flat]), int(j.flat[flat])
+
+
+def _best_or_opt(D, p, max_len=3):
+    """Best move of a segment p[i..i+k-1] to another edge of the same route."""
+    L = len(p) - 2
+    best = (0, None, None, None)
+    for k in range(1, min(max_len, L - 1) + 1):
+        starts = np.arange(1, L - k + 2)
+        ends = starts + k - 1
+        removal = D[p[starts - 1], p[ends + 1]] - D[p[starts - 1], p[starts]] - D[p[ends], p[ends + 1]]
+        q = np.arange(0, L + 1)
+        # insert between p[q] and p[q+1]
+        insertion = (D[p[q][None, :], p[starts][:, None]] + D[p[ends][:, None], p[q + 1][None, :]]
+                     - D[p[q], p[q + 1]][None, :])
+        touching = (q[None, :] >= starts[:, None] - 1) & (q[None, :] <= ends[:, None])
+        delta = np.where(touching, 0, removal[:, None] + insertion)
+        flat = int(np.argmin(delta))
+        if delta.flat[flat] < best[0]:
+            a, b = np.unravel_index(flat, delta.shape)
+            best = (int(delta.flat[flat]), int(starts[a]), k, int(q[b]))
+    return best
+
+
+def _apply_or_opt(p, i, k, q):
+    segment = list(p[i:i + k])
+    rest = list(p[:i]) + list(p[i + k:])
+    # q indexes the original route; shift it if it was after the removed segment
+    position = q + 1 if q < i else q + 1 - k
+    return np.array(rest[:position] + segment + rest[position:], dtype=np.int64)
+
+
+def _improve_route(D, p, deadline):
+    """2-opt + or-opt until no improving move is left."""
+    while time.time() < deadline:
+        delta, i, j = _best_two_opt(D, p)
+        if delta < 0:
+            p = np.concatenate([p[:i], p[i:j + 1][::-1], p[j + 1:]])
+            continue
+        delta, i, k, q = _best_or_opt(D, p)
+        if delta < 0:
+            p = _apply_or_opt(p, i, k, q)
+            continue
+        break
+    return p
+
+
+def improve_order(distance, order, time_limit=POLISH_TIME_LIMIT):
+    """2-opt / or-opt on one visiting order (0-based rows of distance, depot last)."""
+    D = np.asarray(distance, dtype=np.int64)
+    depot = D.shape[0] - 1
+    p = np.array([depot] + list(order) + [depot], dtype=np.int64)
+    return [int(node) for node in _improve_route(D, p, time.time() + time_limit)[1:-1]]
+
+
+def reoptimise_order(D, p):
+    """Replace a route's visiting order by the exact one when it is small enough."""
+    items = p[1:-1]
+    if len(items) < 3 or len(items) > HELD_KARP_MAX:
+        return p
+    nodes = np.concatenate([items, p[:1]])
+    order, length = held_karp(D[np.ix_(nodes, nodes)])
+    if length >= route_length(D, p):
+        return p
+    return np.concatenate([p[:1], items[order], p[:1]])
+
+
+def _removal_gain(D, p):
+    """New length change if item at each position 1..L is removed."""
+    inner = np.arange(1, len(p) - 1)
+    return D[p[inner - 1], p[inner + 1]] - D[p[inner - 1], p[inner]] - D[p[inner], p[inner + 1]]
+
+
+def _best_inter_move(D, routes, lengths, loads, capacity, size, a):
+    """
+    Best relocate or swap between bottleneck route a and any other route.
+    Returns (new max of the two routes, kind, b, i, j) or None.
+    """
+    pa = routes[a]
+    La = len(pa) - 2
+    best = None
+    rem_a = _removal_gain(D, pa)
+    items_a = pa[1:-1]
+    for b in range(len(routes)):
+        if b == a:
+            continue
+        pb = routes[b]
+        Lb = len(pb) - 2
+        current = max(lengths[a], lengths[b])
+
+        # relocate item a[i] into edge (pb[q], pb[q+1]); keep one item on a
+        if La >= 2:
+            q = np.arange(0, Lb + 1)
+            ins = (D[pb[q][None, :], items_a[:, None]] + D[items_a[:, None], pb[q + 1][None, :]]
+                   - D[pb[q], pb[q + 1]][None, :])
+            new_a = lengths[a] + rem_a[:, None]
+            new_b = lengths[b] + ins
+            worst = np.maximum(new_a, new_b)
+            fits = (loads[b] + size[items_a] <= capacity[b])[:, None]
+            worst = np.where(fits, worst, np.iinfo(np.int64).max)
+            flat = int(np.argmin(worst))
+            if worst.flat[flat] < current and (best is None or worst.flat[flat] < best[0]):
+                i, j = np.unravel_index(flat, worst.shape)
+                best = (int(worst.flat[flat]), "relocate", b, int(i) + 1, int(q[j]))
+
+        # swap a[i] <-> b[j]
+        items_b = pb[1:-1]
+        ia = np.arange(1, La + 1)
+        ib = np.arange(1, Lb + 1)
+        prev_a, next_a = pa[ia - 1][:, None], pa[ia + 1][:, None]
+        prev_b, next_b = pb[ib - 1][None, :], pb[ib + 1][None, :]
+        xa, xb = items_a[:, None], items_b[None, :]
+        new_a = lengths[a] - D[prev_a, xa] - D[xa, next_a] + D[prev_a, xb] + D[xb, next_a]
+        new_b = lengths[b] - D[prev_b, xb] - D[xb, next_b] + D[prev_b, xa] + D[xa, next_b]
+        worst = np.maximum(new_a, new_b)
+        diff = size[xb] - size[xa]
+        fits = (loads[a] + diff <= capacity[a]) & (loads[b] - diff <= capacity[b])
+        worst = np.where(fits, worst, np.iinfo(np.int64).max)
+        flat = int(np.argmin(worst))
+        if worst.flat[flat] < current and (best is None or worst.flat[flat] < best[0]):
+            i, j = np.unravel_index(flat, worst.shape)
+            best = (int(worst.flat[flat]), "swap", b, int(i) + 1, int(j) + 1)
+    return best
+
+
+def polish_routes(routes, distance, load_size, courier_capacity, time_limit=POLISH_TIME_LIMIT):
+    """
+    Local search on a feasible solution.
+
+    Parameters:
+        routes (list of lists): 1-based item lists per courier (the "sol" format).
+        distance, load_size, courier_capacity: instance data (lists or arrays).
+        time_limit (float): Seconds to spend at most.
+
+    Returns:
+        tuple: (routes, obj) -- the original routes if nothing lowered the max distance.
+    """
+    deadline = time.time() + time_limit
+    D = np.asarray(distance, dtype=np.int64)
+    depot = D.shape[0] - 1
+    size = np.concatenate([np.asarray(load_size, dtype=np.int64), [0]])
+    capacity = np.asarray(courier_capacity, dtype=np.int64)
+
+    paths = [_nodes(route, depot) for route in routes]
+    original_obj = max(route_length(D, p) for p in paths)
+
+    paths = [_improve_route(D, p, deadline) for p in paths]
+    while time.time() < deadline:
+        lengths = [route_length(D, p) for p in paths]
+        loads = [int(size[p].sum()) for p in paths]
+        a = int(np.argmax(lengths))
+        move = _best_inter_move(D, paths, lengths, loads, capacity, size, a)
+        if move is None:
+            break
+        _, kind, b, i, j = move
+        pa, pb = list(paths[a]), list(paths[b])
+        if kind == "relocate":
+            item = pa.pop(i)
+            pb.insert(j + 1, item)
+        else:
+            pa[i], pb[j] = pb[j], pa[i]
+        paths[a] = _improve_route(D, np.array(pa, dtype=np.int64), deadline)
+        paths[b] = _improve_route(D, np.array(pb, dtype=np.int64), deadline)
+
+    # Small routes get their optimal visiting order (Held-Karp, cdmo/tsp.py).
+    paths = [reoptimise_order(D, p) for p in paths]
+    obj = max(route_length(D, p) for p in paths)
+    if obj >= original_obj:
+        return routes, original_obj
+    return [[int(node) + 1 for node in p[1:-1]] for p in paths], obj
+
+
+def polish_result(result, distance, load_size, courier_capacity, time_limit=POLISH_TIME_LIMIT):
+    """
+    Polish a result dict in place before it is saved. Optimal and empty
+    results are left alone; the time spent is recorded in stats.
+    """
+    sol = result.get("sol")
+    if result.get("optimal") or not isinstance(sol, list) or not sol or not all(sol):
+        return result
+    start_time = time.time()
+    routes, obj = polish_routes(sol, distance, load_size, courier_capacity, time_limit)
+    stats = result.setdefault("stats", {})
+    stats["polish_time"] = round(time.time() - start_time, 3)
+    if result.get("obj") is None or obj < result["obj"]:
+        stats["unpolished_obj"] = result.get("obj")
+        result["obj"] = obj
+        result["sol"] = routes
+    return result
@@ -0,0 +1,176 @@
+"""
+Multi-seed portfolio for the randomized CP models.
+
+domwdeg_indrandom and domwdeg_indrandom_sb branch with indomain_random, so
+one run's result depends on its seed. The portfolio runs N copies of the
+same model with seeds base, base+1, ... in parallel, one process each (by
+default one per CPU):
+
+    - every copy reports its improving objectives, and the best one so far
+      goes to on_solution;
+    - as soon as one copy proves optimality the others are stopped (the
+      MiniZinc solver is cancelled, see solve_minizinc(stop=...));
+    - the result is the best copy's, with its seed in "seed" and
+      stats["seed"], so `cp:<solver>:<model>:seed=<seed>` reproduces it.
+
+The copies do not share incumbents: restarting MiniZinc with "z < k" would
+throw away the search of every other copy (cdmo/race.py does that across
+backends). The seed does not change the FlatZinc, so with the FlatZinc cache
+(cdmo/flatzinc.py) the copies share one cached .fzn once it exists; on a cold
+cache every copy flattens the model itself, concurrently, and later runs on
+the instance start from the cached entry.
+
+    python3 -m cdmo.portfolio Instances/inst13.dat --model domwdeg_indrandom_sb --copies 8 --timeout 300
+    python3 -m cdmo solve 13 --backend portfolio:solver=gecode:model=domwdeg_indrandom_sb:copies=8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import time
+
+from cdmo.backends import run_cp
+
+RANDOM_MODELS = ("domwdeg_indrandom", "domwdeg_indrandom_sb")
+
+
+class _Stop:
+    """Shared hook for run_cp: no incumbent from the other copies, only the stop flag."""
+
+    def __init__(self, done):
+        self.done = done
+
+    def bound(self):
+        return None
+
+    def stopped(self):
+        return self.done.is_set()
+
+
+def _copy(index, seed, instance, solver, model, implied, timeout, allowed, done, events):
+    start_time = time.time()
+    try:
+        result = run_cp(instance, solver=solver, model=model, implied=implied, timeout=timeout, allowed=allowed,
+                        seed=seed, shared=_Stop(done),
+                        on_solution=lambda elapsed, obj: events.put(("solution", index, elapsed, obj)))
+    except Exception as e:
+        result = {"time": 0, "optimal": False, "obj": None, "sol": [], "error": repr(e)}
+    result["wall_time"] = round(time.time() - start_time, 3)
+    events.put(("result", index, None, result))
+
+
+def portfolio(instance, solver="gecode", model="domwdeg_indrandom_sb", copies=None, base_seed=1, timeout=300,
+              implied=False, allowed=None, on_solution=None, grace=30):
+    """
+    Parameters:
+        instance (Instance): See cdmo/instances.py.
+        solver (str): MiniZinc solver.
+        model (str): A CP model from cdmo/backends.CP_MODELS, normally one of RANDOM_MODELS.
+        copies (int): Number of seeded copies (None: one per CPU).
+        base_seed (int): The copies use base_seed, base_seed + 1, ...
+        timeout (float): Seconds for every copy.
+        on_solution (callable): Called as on_solution(seconds, obj) when any copy improves the best objective.
+        grace (float): Extra seconds before copies that do not stop are killed.
+
+    Returns:
+        dict: The best copy's result plus "seed" and a summary of every copy.
+    """
+    if model not in RANDOM_MODELS:
+        print(f"Warning: {model} does not branch randomly, the copies may all search the same way.")
+    copies = copies or os.cpu_count() or 1
+    seeds = [base_seed + i for i in range(copies)]
+
+    start_time = time.time()
+    done = multiprocessing.Event()
+    events = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_copy, args=(i, seed, instance, solver, model, implied, timeout,
+                                                             allowed, done, events))
+                 for i, seed in enumerate(seeds)]
+    for process in processes:
+        process.start()
+
+    results = {}
+    best_obj = None
+    deadline = start_time + timeout + grace
+    while len(results) < len(seeds):
+        try:
+            kind, index, elapsed, payload = events.get(timeout=max(0.1, deadline - time.time()))
+        except queue_module.Empty:
+            break
+        if kind == "solution":
+            if payload is not None and (best_obj is None or payload < best_obj):
+                best_obj = payload
+                if on_solution is not None:
+                    on_solution(time.time() - start_time, payload)
+            continue
+        results[index] = payload
+        if payload.get("optimal") and not done.is_set():
+            done.set()
+            deadline = min(deadline, time.time() + grace)
+    done.set()
+    for process in processes:
+        process.join(timeout=1)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    # Best objective first, a proof before a timeout, then the lowest seed.
+    finished = [i for i, result in results.items() if result.get("obj") is not None]
+    winner = min(finished, key=lambda i: (results[i]["obj"], not results[i].get("optimal"), i), default=None)
+    result = dict(results[winner]) if winner is not None else \
+        {"optimal": False, "obj": None, "sol": [], "stats": {}}
+    result.pop("status", None)
+    result["time"] = int(time.time() - start_time)
+    result["seed"] = seeds[winner] if winner is not None else None
+    result["copies"] = {
+        seeds[i]: {key: results.get(i, {"error": "did not finish"}).get(key)
+                   for key in ("obj", "optimal", "wall_time", "error")}
+        for i in range(len(seeds))
+    }
+    return result
+
+
+def run_portfolio(instance, solver="gecode", model="domwdeg_indrandom_sb", copies=None, base_seed=1, implied=False,
+                  timeout=300, on_solution=None, allowed=None):
+    """Backend runner; the options come from a spec like portfolio:model=domwdeg_indrandom:copies=8."""
+    first = {}
+
+    def record(elapsed, obj):
+        first.setdefault("time", round(elapsed, 3))
+        if on_solution is not None:
+            on_solution(elapsed, obj)
+
+    result = portfolio(instance, solver=solver, model=model, copies=int(copies) if copies else None,
+                       base_seed=int(base_seed), timeout=timeout, implied=implied in (True, "true", "1"),
+                       allowed=allowed, on_solution=record)
+    result.setdefault("stats", {})["first_solution_time"] = first.get("time")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run seeded copies of a randomized CP model in parallel.")
+    parser.add_argument("instance", help="Path to a .dat instance.")
+    parser.add_argument("--solver", type=str, default="gecode")
+    parser.add_argument("--model", type=str, default="domwdeg_indrandom_sb", help="CP model, see cdmo/backends.py.")
+    parser.add_argument("--copies", type=int, help="Number of seeded copies (default: one per CPU).")
+    parser.add_argument("--base-seed", type=int, default=1)
+    parser.add_argument("--implied", action="store_true", help="Add the implied constraints.")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out", type=str, help="Optional JSON file for the result.")
+    args = parser.parse_args()
+
+    from cdmo.instances import load_instance
+    result = portfolio(load_instance(args.instance), solver=args.solver, model=args.model, copies=args.copies,
+                       base_seed=args.base_seed, timeout=args.timeout, implied=args.implied,
+                       on_solution=lambda elapsed, obj: print(f"{elapsed:8.2f}s  {obj}"))
+    print(json.dumps(result, indent=3, default=str))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=4, default=str)
+
+
+if __name__ == "__main__":
+    main()
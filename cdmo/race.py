@@ -0,0 +1,161 @@
+"""
+Race CP, SMT and MIP on the same instance with a shared incumbent.
+
+    python3 -m cdmo.race Instances/inst13.dat --timeout 300 \
+        --configs cp:chuffed:firstfail_indmin_sb,smt:2d:sb,mip
+
+Every backend runs in its own process. Whenever one of them finds a better
+max distance k it is published in shared memory and the others tighten
+their search to "< k":
+    - Z3 is interrupted and D < k is asserted on the same Optimize object;
+    - MiniZinc is stopped and restarted with "constraint z < k";
+    - CBC runs in rounds and each new round is cut off at d_max <= k - 1.
+The race ends as soon as one backend proves optimality, or a backend proves
+that nothing better than the shared incumbent exists (stats["best_bound"]).
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue as queue_module
+import time
+
+from cdmo.backends import parse_config
+from cdmo.instances import load_instance
+
+RACE_BACKENDS = ("cp", "smt", "mip")
+DEFAULT_CONFIGS = ["cp:chuffed:firstfail_indmin_sb", "smt:2d:sb", "mip"]
+
+
+class SharedIncumbent:
+    """One racer's view of the shared state: the best objective of every racer and the stop flag."""
+
+    def __init__(self, best, done, index):
+        self.best = best
+        self.done = done
+        self.index = index
+
+    def publish(self, elapsed, obj):
+        """on_solution callback: record an improving objective of this racer."""
+        if obj is None:
+            return
+        with self.best.get_lock():
+            if obj < self.best[self.index]:
+                self.best[self.index] = obj
+
+    def bound(self):
+        """Best objective found by another racer, if it beats this one's; otherwise None."""
+        others = min((value for i, value in enumerate(self.best) if i != self.index), default=math.inf)
+        if others < self.best[self.index]:
+            return int(round(others))
+        return None
+
+    def stopped(self):
+        return self.done.is_set()
+
+
+def _racer(index, spec, instance_file, timeout, best, done, queue):
+    name, runner, kwargs = parse_config(spec)
+    shared = SharedIncumbent(best, done, index)
+    start_time = time.time()
+    try:
+        result = runner(load_instance(instance_file), timeout=timeout, on_solution=shared.publish,
+                        shared=shared, **kwargs)
+    except Exception as e:
+        result = {"time": 0, "optimal": False, "obj": None, "sol": [], "error": repr(e)}
+    result["wall_time"] = round(time.time() - start_time, 3)
+    queue.put((index, result))
+
+
+def _proven(results, best):
+    """True once the best objective in results or best is optimal or matched by a proven lower bound."""
+    if any(result.get("optimal") for result in results.values()):
+        return True
+    objs = [result["obj"] for result in results.values() if result.get("obj") is not None]
+    objs += [value for value in best if value != math.inf]
+    bounds = [result.get("stats", {}).get("best_bound") for result in results.values()]
+    bounds = [math.ceil(bound - 1e-6) for bound in bounds if bound is not None]
+    return bool(objs and bounds) and max(bounds) >= min(objs)
+
+
+def race(instance_file, configs=DEFAULT_CONFIGS, timeout=300, grace=30):
+    """
+    Parameters:
+        instance_file (str): .dat file to solve.
+        configs (list of str): Backend specs (cp/smt/mip), see cdmo/backends.parse_config().
+        timeout (float): Seconds for the whole race.
+        grace (float): Extra seconds before racers that do not stop are killed.
+
+    Returns:
+        dict: The best result ("time", "optimal", "obj", "sol"), the winning
+        config and a summary of every racer.
+    """
+    for spec in configs:
+        if spec.split(":")[0] not in RACE_BACKENDS:
+            raise ValueError(f"Backend '{spec}' cannot race. Choose from {list(RACE_BACKENDS)}.")
+
+    start_time = time.time()
+    best = multiprocessing.Array("d", [math.inf] * len(configs))
+    done = multiprocessing.Event()
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_racer, args=(i, spec, instance_file, timeout, best, done, queue))
+                 for i, spec in enumerate(configs)]
+    for process in processes:
+        process.start()
+
+    results = {}
+    deadline = start_time + timeout + grace
+    while len(results) < len(configs):
+        try:
+            index, result = queue.get(timeout=max(0.1, deadline - time.time()))
+        except queue_module.Empty:
+            break
+        results[index] = result
+        if not done.is_set() and _proven(results, best):
+            # Everyone else stops within a poll interval; don't wait out the full timeout.
+            done.set()
+            deadline = min(deadline, time.time() + grace)
+    done.set()
+    for process in processes:
+        process.join(timeout=1)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    finished = [(configs[i], result) for i, result in results.items() if result.get("obj") is not None]
+    winner, winning = min(finished, key=lambda item: item[1]["obj"], default=(None, None))
+    return {
+        "time": int(time.time() - start_time),
+        "optimal": _proven(results, []),  # only objectives we have a solution for
+        "obj": winning["obj"] if winning else None,
+        "sol": winning["sol"] if winning else [],
+        "winner": winner,
+        "racers": {
+            spec: {key: results.get(i, {"error": "did not finish"}).get(key)
+                   for key in ("obj", "optimal", "wall_time", "error")}
+            for i, spec in enumerate(configs)
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Race CP, SMT and MIP with a shared incumbent.")
+    parser.add_argument("instance", help="Path to a .dat instance.")
+    parser.add_argument("--configs", type=lambda s: s.split(","), default=DEFAULT_CONFIGS,
+                        help="Backend specs, e.g. cp:gecode:firstfail_indmin_sb,smt:3d:sb,mip.")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out", type=str, help="Optional JSON file for the result.")
+    args = parser.parse_args()
+
+    result = race(args.instance, args.configs, timeout=args.timeout)
+    print(json.dumps(result, indent=3))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Instance reduction: merge items at the same location.
+
+Items u and v are co-located when D[u][v] = D[v][u] = 0 and their rows and
+columns are equal, i.e. every other node sees them as one point. Each such
+group becomes one node whose size is the sum of its members, so every model
+has fewer nodes and (n+1) fewer arcs per courier and merged item:
+
+    - groups are split (first fit decreasing) into parts that fit the
+      largest courier, so a merged node can still be carried;
+    - merging stops before fewer nodes than couriers are left, since every
+      courier delivers at least one item;
+    - with --tolerance > 0, rows and columns that differ by at most that
+      much are merged too; the reduced distances are then approximate.
+
+The backend solves the reduced instance; its routes are expanded back to the
+original items (members of a group delivered one after another), the
+objective is recomputed on the original distances and the result is checked
+like check_solution.py does. Merging forces co-located items onto one
+courier, which can exclude the optimum (capacities, couriers left without
+items), so "optimal" is only kept when nothing was merged or when the
+objective meets the lower bound max_j (SP[o][j] + SP[j][o]) over shortest
+paths, which holds for the original instance.
+
+    python3 -m cdmo.reduce Instances/inst*.dat
+    python3 -m cdmo solve 13 --backend cp:chuffed:firstfail_indmin_sb --reduce
+"""
+
+import argparse
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from cdmo.instances import Instance, load_instance
+from cdmo.polish import route_lengths
+
+# groups[k]: the 0-based original items of reduced item k+1
+Reduction = namedtuple("Reduction", ["instance", "groups"])
+
+
+def co_located(distance, tolerance=0):
+    """Groups (lists of 0-based items, more than one each) of items at the same location."""
+    D = np.asarray(distance, dtype=np.int64)
+    n = D.shape[0] - 1
+    parent = list(range(n))
+
+    def find(u):
+        while parent[u] != u:
+            parent[u] = parent[parent[u]]
+            u = parent[u]
+        return u
+
+    if tolerance == 0:
+        # Equal rows and columns (their own 0 entries included) identify the location.
+        seen = {}
+        for u in range(n):
+            key = D[u].tobytes() + D[:, u].tobytes()
+            if key in seen:
+                parent[find(u)] = find(seen[key])
+            else:
+                seen[key] = u
+    else:
+        for u in range(n):
+            close = (np.abs(D[u] - D[u + 1:n]).max(axis=1) <= tolerance) & \
+                    (np.abs(D[:, u][:, None] - D[:, u + 1:n]).max(axis=0) <= tolerance)
+            for v in np.nonzero(close)[0] + u + 1:
+                parent[find(int(v))] = find(u)
+
+    groups = {}
+    for u in range(n):
+        groups.setdefault(find(u), []).append(u)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _split(members, size, limit):
+    """First fit decreasing of the members into parts of total size <= limit."""
+    parts = []
+    for u in sorted(members, key=lambda u: -size[u]):
+        for part in parts:
+            if sum(size[v] for v in part) + size[u] <= limit:
+                part.append(u)
+                break
+        else:
+            parts.append([u])
+    return parts
+
+
+def reduce_instance(instance, tolerance=0):
+    """
+    Merge co-located items.
+
+    Returns:
+        Reduction: the reduced Instance and, per reduced item, its original items.
+    """
+    m, n = int(instance.num_couriers), int(instance.num_load)
+    size = np.asarray(instance.load_size, dtype=np.int64)
+    limit = int(np.max(instance.courier_capacity))
+
+    merged = {}
+    for members in co_located(instance.distance, tolerance):
+        for part in _split(members, size, limit):
+            merged[min(part)] = sorted(part)
+    covered = {u for part in merged.values() for u in part}
+    groups = list(merged.values()) + [[u] for u in range(n) if u not in covered]
+    # Every courier needs an item: undo the largest merges until there are enough nodes.
+    while len(groups) < m:
+        largest = max(range(len(groups)), key=lambda k: len(groups[k]))
+        if len(groups[largest]) == 1:
+            break
+        groups[largest:largest + 1] = [groups[largest][:-1], groups[largest][-1:]]
+    groups.sort(key=min)
+
+    nodes = [group[0] for group in groups] + [n]
+    reduced = Instance(m, len(groups), np.asarray(instance.courier_capacity),
+                       np.array([size[group].sum() for group in groups], dtype=np.int32),
+                       np.ascontiguousarray(np.asarray(instance.distance)[np.ix_(nodes, nodes)]))
+    return Reduction(reduced, groups)
+
+
+def expand_routes(routes, groups):
+    """Reduced routes (1-based) -> original routes (1-based), group members one after another."""
+    return [[u + 1 for item in route for u in groups[item - 1]] for route in routes]
+
+
+def shortest_path_bound(distance):
+    """max_j SP[o][j] + SP[j][o]: every courier delivering j travels at least that far."""
+    SP = np.asarray(distance, dtype=np.int64).copy()
+    for k in range(SP.shape[0]):
+        np.minimum(SP, SP[:, [k]] + SP[[k], :], out=SP)
+    depot = SP.shape[0] - 1
+    return int((SP[depot, :depot] + SP[:depot, depot]).max())
+
+
+def validate_solution(instance, sol, obj):
+    """The checks of check_solution.py for one result. Returns a list of error messages."""
+    n = int(instance.num_load)
+    size = np.asarray(instance.load_size)
+    capacity = np.asarray(instance.courier_capacity)
+    errors = []
+    if len(sol) != int(instance.num_couriers):
+        errors.append(f"{len(sol)} routes for {instance.num_couriers} couriers")
+    items = sorted(item for route in sol for item in route)
+    if items != list(range(1, n + 1)):
+        errors.append(f"the routes collect {len(items)} items, not each of the {n} items once")
+    for courier, route in enumerate(sol):
+        load = int(size[[item - 1 for item in route]].sum()) if route else 0
+        if courier < len(capacity) and load > capacity[courier]:
+            errors.append(f"courier {courier + 1} carries {load}, over its capacity {capacity[courier]}")
+    if not errors and obj != max(route_lengths(sol, instance.distance)):
+        errors.append(f"objective {obj} differs from the max distance {max(route_lengths(sol, instance.distance))}")
+    return errors
+
+
+def run_reduced(runner, instance, timeout=300, tolerance=0, knn=None, **kwargs):
+    """
+    Solve the reduced instance with runner (or run_sparse with knn) and
+    return the result in terms of the original instance.
+    """
+    start_time = time.time()
+    reduction = reduce_instance(instance, tolerance)
+    reduction_time = round(time.time() - start_time, 3)
+    reduced = reduction.instance
+    merged = int(instance.num_load) - int(reduced.num_load)
+    if merged:
+        # The reduced instance is a restriction (merged items share a courier),
+        # so its lower bounds do not bound the original instance.
+        kwargs.pop("on_bound", None)
+    if knn is not None:
+        from cdmo.backends import run_sparse
+        result = run_sparse(runner, reduced, knn, timeout=timeout, **kwargs)
+    else:
+        result = runner(reduced, timeout=timeout, **kwargs)
+
+    stats = result.setdefault("stats", {})
+    stats.update(reduction_time=reduction_time, reduced_items=int(reduced.num_load), merged_items=merged)
+    sol = result.get("sol")
+    if isinstance(sol, list) and sol:
+        result["sol"] = expand_routes(sol, reduction.groups)
+        result["obj"] = max(route_lengths(result["sol"], instance.distance))
+        errors = validate_solution(instance, result["sol"], result["obj"])
+        if errors:
+            result.update(sol=[], obj=None, optimal=False, error="expanded solution invalid: " + "; ".join(errors))
+    if merged:
+        stats["best_bound"] = None
+        if result.get("optimal"):
+            stats["reduced_optimal"] = True
+            result["optimal"] = result.get("obj") is not None and \
+                result["obj"] <= shortest_path_bound(instance.distance)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how much co-located items reduce instances.")
+    parser.add_argument("instances", nargs="+", help=".dat files")
+    parser.add_argument("--tolerance", type=int, default=0, help="Merge rows/columns differing by at most this.")
+    args = parser.parse_args()
+
+    print(f"{'instance':<24} {'m':>4} {'n':>6} {'reduced':>8} {'groups':>7}")
+    for path in args.instances:
+        instance = load_instance(path)
+        reduction = reduce_instance(instance, args.tolerance)
+        groups = sum(1 for group in reduction.groups if len(group) > 1)
+        print(f"{os.path.basename(path):<24} {instance.num_couriers:>4} {instance.num_load:>6} "
+              f"{reduction.instance.num_load:>8} {groups:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Incremental re-optimisation after a small change of the instance.
+
+Instead of solving the changed instance from scratch, the previous routes
+(a "sol" list from res/*) are carried over:
+
+    1. apply_delta() builds the new instance from the old one and a delta:
+           {"remove_items": [3, 8],
+            "add_items": [{"size": 4, "distances_from": [...], "distances_to": [...]}],
+            "sizes": {"5": 7},
+            "remove_couriers": [2],
+            "add_couriers": [15],
+            "capacities": {"1": 20}}
+       Items and couriers are numbered as in the old instance (1-based).
+       An added item's distance lists run over the old items 1..n, the items
+       added before it, then the depot (entries of removed items are
+       ignored). Kept items and couriers keep their order; added ones come
+       after them.
+    2. repair() removes the deleted items, evicts items from couriers that
+       are now over capacity, inserts orphaned and new items where they
+       lengthen a route the least and gives empty couriers an item.
+    3. The repaired routes are polished (cdmo/polish.py), then only the
+       couriers touched by the change, the bottleneck courier and
+       --extra-couriers nearby ones are re-solved with a CP/SMT/MIP backend.
+       The other routes stay fixed. The sub-solve gets the repaired
+       objective as its incumbent through the same `shared` hook as a race
+       (cdmo/race.py), so it only searches for strictly better routes.
+
+The sub-instance, and with it the time limit (--time-per-item seconds per
+item in it), grows with the change, not with the instance.
+
+    python3 -m cdmo.reoptimise Instances/inst07.dat delta.json --backend cp:chuffed:firstfail_indmin_sb
+    python3 -m cdmo.reoptimise Instances/inst07.dat delta.json --previous res/CP/7.json --out new.json
+"""
+
+import argparse
+import inspect
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from cdmo.instances import Instance, load_instance
+from cdmo.polish import polish_routes, route_lengths
+from cdmo.stats import empty_stats
+
+TIME_PER_ITEM = 1.0
+POLISH_TIME = 0.5
+
+# The changed instance plus how the old numbering maps onto it: item_map
+# (old item -> new item, both 1-based), courier_map (old courier -> new
+# courier, both 0-based), the new item numbers and the couriers whose data
+# changed (new 0-based indices).
+Change = namedtuple("Change", ["instance", "item_map", "courier_map", "added_items", "touched_couriers"])
+
+
+def _numbered(mapping):
+    """JSON object keys are strings; {"5": 7} -> {5: 7}."""
+    return {int(key): int(value) for key, value in (mapping or {}).items()}
+
+
+def apply_delta(instance, delta):
+    """
+    Parameters:
+        instance (Instance): The instance the previous solution was computed for.
+        delta (dict): See the module docstring; every key is optional.
+
+    Returns:
+        Change: the new instance and the renumbering of items and couriers.
+    """
+    m, n = int(instance.num_couriers), int(instance.num_load)
+    removed = {int(item) for item in delta.get("remove_items", [])}
+    removed_couriers = {int(courier) for courier in delta.get("remove_couriers", [])}
+    sizes, capacities = _numbered(delta.get("sizes")), _numbered(delta.get("capacities"))
+    for item in removed | set(sizes):
+        if not 1 <= item <= n:
+            raise ValueError(f"Item {item} does not exist (the instance has {n} items).")
+    for courier in removed_couriers | set(capacities):
+        if not 1 <= courier <= m:
+            raise ValueError(f"Courier {courier} does not exist (the instance has {m} couriers).")
+
+    # Distances over old items, added items and the depot, before dropping anything.
+    added = delta.get("add_items", [])
+    k = len(added)
+    depot = n + k
+    D = np.zeros((n + k + 1, n + k + 1), dtype=np.int64)
+    old_nodes = list(range(n)) + [depot]
+    D[np.ix_(old_nodes, old_nodes)] = np.asarray(instance.distance, dtype=np.int64)
+    for a, item in enumerate(added):
+        others = list(range(n + a)) + [depot]
+        for key in ("distances_from", "distances_to"):
+            if len(item[key]) != len(others):
+                raise ValueError(f"Added item {a + 1}: '{key}' needs {len(others)} entries "
+                                 f"(old items, earlier added items, depot), got {len(item[key])}.")
+        D[n + a, others] = item["distances_from"]
+        D[others, n + a] = item["distances_to"]
+
+    kept = [item for item in range(1, n + 1) if item not in removed]
+    nodes = [item - 1 for item in kept] + list(range(n, n + k)) + [depot]
+    load_size = [sizes.get(item, int(instance.load_size[item - 1])) for item in kept] + \
+                [int(item["size"]) for item in added]
+
+    kept_couriers = [courier for courier in range(1, m + 1) if courier not in removed_couriers]
+    courier_capacity = [capacities.get(courier, int(instance.courier_capacity[courier - 1]))
+                        for courier in kept_couriers] + [int(c) for c in delta.get("add_couriers", [])]
+    if not courier_capacity:
+        raise ValueError("The delta removes every courier.")
+
+    new = Instance(len(courier_capacity), len(load_size), np.array(courier_capacity, dtype=np.int32),
+                   np.array(load_size, dtype=np.int32), D[np.ix_(nodes, nodes)].astype(np.int32))
+    courier_map = {old - 1: new_index for new_index, old in enumerate(kept_couriers)}
+    touched = {courier_map[courier - 1] for courier in capacities if courier not in removed_couriers}
+    return Change(new, {old: new_item for new_item, old in enumerate(kept, 1)}, courier_map,
+                  list(range(len(kept) + 1, len(load_size) + 1)), touched)
+
+
+def _insertion(D, route, node, depot):
+    """(extra length, position) of the cheapest place for node in route (0-based nodes)."""
+    path = [depot] + route + [depot]
+    costs = [D[path[q], node] + D[node, path[q + 1]] - D[path[q], path[q + 1]] for q in range(len(path) - 1)]
+    q = int(np.argmin(costs))
+    return int(costs[q]), q
+
+
+def _removal(D, route, depot):
+    """Length saved by removing each position of route (0-based nodes)."""
+    path = [depot] + route + [depot]
+    return [D[path[q - 1], path[q]] + D[path[q], path[q + 1]] - D[path[q - 1], path[q + 1]]
+            for q in range(1, len(path) - 1)]
+
+
+def repair(routes, change, sizes_changed=()):
+    """
+    Carry the previous routes over to the changed instance.
+
+    Parameters:
+        routes (list of lists): The previous solution (1-based items, old numbering).
+        change (Change): From apply_delta().
+        sizes_changed: Old item numbers whose size changed; their couriers count as touched.
+
+    Returns:
+        tuple: (routes for the new instance, set of touched couriers).
+    """
+    instance = change.instance
+    m, n = int(instance.num_couriers), int(instance.num_load)
+    D = np.asarray(instance.distance, dtype=np.int64)
+    size = np.asarray(instance.load_size, dtype=np.int64)
+    capacity = np.asarray(instance.courier_capacity, dtype=np.int64)
+    depot = n
+
+    paths = [[] for _ in range(m)]
+    touched = set(change.touched_couriers)
+    orphans = [item - 1 for item in change.added_items]
+    resized = set(sizes_changed)
+    for old_courier, route in enumerate(routes):
+        items = [change.item_map[item] - 1 for item in route if item in change.item_map]
+        courier = change.courier_map.get(old_courier)
+        if courier is None:
+            orphans += items
+            continue
+        paths[courier] = items
+        if len(items) != len(route) or resized.intersection(route):
+            touched.add(courier)
+    touched.update(range(len(change.courier_map), m))  # added couriers
+
+    # Over capacity: evict the item whose removal saves the most distance.
+    for courier, path in enumerate(paths):
+        while path and size[path].sum() > capacity[courier]:
+            q = int(np.argmax(_removal(D, path, depot)))
+            orphans.append(path.pop(q))
+            touched.add(courier)
+
+    # Largest items first, each where it lengthens a route the least.
+    lengths = route_lengths([[node + 1 for node in path] for path in paths], D)
+    for node in sorted(orphans, key=lambda node: -size[node]):
+        best = None
+        for courier, path in enumerate(paths):
+            if size[path].sum() + size[node] > capacity[courier]:
+                continue
+            extra, q = _insertion(D, path, node, depot)
+            if best is None or lengths[courier] + extra < best[0]:
+                best = (lengths[courier] + extra, courier, q)
+        if best is None:
+            raise ValueError(f"Item {node + 1} (size {size[node]}) does not fit on any courier.")
+        length, courier, q = best
+        paths[courier].insert(q, node)
+        lengths[courier] = length
+        touched.add(courier)
+
+    # Every courier delivers at least one item: move the cheapest one over.
+    for courier, path in enumerate(paths):
+        if path:
+            continue
+        best = None
+        for donor, donor_path in enumerate(paths):
+            if len(donor_path) < 2:
+                continue
+            for q, saved in enumerate(_removal(D, donor_path, depot)):
+                node = donor_path[q]
+                if size[node] > capacity[courier]:
+                    continue
+                worst = max(lengths[donor] - saved, D[depot, node] + D[node, depot])
+                if best is None or worst < best[0]:
+                    best = (worst, donor, q)
+        if best is None:
+            raise ValueError(f"No item can be moved to the empty courier {courier + 1}.")
+        _, donor, q = best
+        path.append(paths[donor].pop(q))
+        lengths[donor], lengths[courier] = route_lengths([[node + 1 for node in paths[donor]], [path[0] + 1]], D)
+        touched.update((courier, donor))
+
+    return [[node + 1 for node in path] for path in paths], touched
+
+
+def neighbourhood(routes, distance, touched, extra=1):
+    """
+    Couriers to re-solve: the touched ones, the bottleneck and up to <extra>
+    more whose items lie closest to theirs.
+    """
+    D = np.asarray(distance, dtype=np.int64)
+    lengths = route_lengths(routes, D)
+    chosen = set(touched) | {int(np.argmax(lengths))}
+    items = [item - 1 for courier in chosen for item in routes[courier]]
+    others = [courier for courier in range(len(routes)) if courier not in chosen]
+    closeness = {courier: min(min(D[item - 1, j], D[j, item - 1]) for item in routes[courier] for j in items)
+                 for courier in others}
+    chosen.update(sorted(others, key=closeness.get)[:extra])
+    return sorted(chosen)
+
+
+def sub_instance(instance, routes, couriers):
+    """The couriers' part of the instance. Returns (Instance, its items as new-instance numbers)."""
+    items = sorted(item for courier in couriers for item in routes[courier])
+    nodes = [item - 1 for item in items] + [int(instance.num_load)]
+    D = np.asarray(instance.distance)
+    sub = Instance(len(couriers), len(items),
+                   np.asarray(instance.courier_capacity)[couriers],
+                   np.asarray(instance.load_size)[[item - 1 for item in items]],
+                   np.ascontiguousarray(D[np.ix_(nodes, nodes)]))
+    return sub, items
+
+
+class _Incumbent:
+    """The `shared` hook of the runners, holding the repaired routes' objective as the bound to beat."""
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def bound(self):
+        return self.obj
+
+    def stopped(self):
+        return False
+
+
+def reoptimise(instance, previous, delta, backend="cp", timeout=60, time_per_item=TIME_PER_ITEM,
+               extra_couriers=1):
+    """
+    Re-plan after a change without solving the new instance from scratch.
+
+    Parameters:
+        instance (Instance): The instance <previous> was computed for.
+        previous (list of lists): Its "sol" routes.
+        delta (dict): The change (see the module docstring).
+        backend (str): Backend spec for the local re-solve (see cdmo/backends.py),
+            or None to stop after repair and polishing.
+        timeout (float): Upper limit on the re-solve, in seconds.
+        time_per_item (float): Re-solve seconds per item in the neighbourhood.
+
+    Returns:
+        tuple: (new Instance, result dict). The result's stats include the
+        repaired objective and the re-solved couriers.
+    """
+    start_time = time.time()
+    if len(previous) != int(instance.num_couriers):
+        raise ValueError(f"The previous solution has {len(previous)} routes, "
+                         f"the instance {instance.num_couriers} couriers.")
+    change = apply_delta(instance, delta)
+    new = change.instance
+    routes, touched = repair(previous, change, _numbered(delta.get("sizes")).keys())
+    repaired_obj = max(route_lengths(routes, new.distance))
+    routes, obj = polish_routes(routes, new.distance, new.load_size, new.courier_capacity, POLISH_TIME)
+
+    stats = empty_stats()
+    stats.update(repaired_obj=repaired_obj, polished_obj=obj, touched_couriers=sorted(c + 1 for c in touched))
+    optimal = False
+    if backend is not None:
+        from cdmo.backends import parse_config
+
+        couriers = neighbourhood(routes, new.distance, touched, extra_couriers)
+        sub, items = sub_instance(new, routes, couriers)
+        sub_obj = max(route_lengths([routes[c] for c in couriers], new.distance))
+        _, runner, kwargs = parse_config(backend)
+        if "shared" in inspect.signature(runner).parameters:
+            kwargs["shared"] = _Incumbent(sub_obj)
+        result = runner(sub, timeout=min(timeout, max(1.0, time_per_item * len(items))), **kwargs)
+        if result.get("obj") is not None and result["obj"] < sub_obj:
+            for courier, route in zip(couriers, result["sol"]):
+                routes[courier] = [items[item - 1] for item in route]
+            obj = max(route_lengths(routes, new.distance))
+        stats.update(resolved_couriers=[c + 1 for c in couriers], resolved_items=len(items),
+                     solve_time=result.get("stats", {}).get("solve_time"))
+        # A proof on the sub-problem only holds for the whole instance if it was the whole instance.
+        if len(couriers) == int(new.num_couriers):
+            stats["best_bound"] = result.get("stats", {}).get("best_bound")
+            optimal = bool(result.get("optimal")) or stats["best_bound"] == sub_obj
+
+    return new, {"time": int(time.time() - start_time), "optimal": optimal, "obj": obj, "sol": routes,
+                 "stats": stats}
+
+
+def load_previous(path):
+    """The best "sol" in a result file (one result dict or a res/* dict of them)."""
+    with open(path, "r") as f:
+        results = json.load(f)
+    if "sol" in results:
+        return results["sol"]
+    stored = [result for result in results.values() if result.get("obj") and result.get("sol")]
+    if not stored:
+        raise ValueError(f"No solution in {path}.")
+    return min(stored, key=lambda result: result["obj"])["sol"]
+
+
+def main():
+    from cdmo.candidates import known_routes
+    from cdmo.instances import write_dat
+
+    parser = argparse.ArgumentParser(description="Re-plan after a change of the instance.")
+    parser.add_argument("instance", help="The .dat file the previous solution belongs to.")
+    parser.add_argument("delta", help="JSON file with the change.")
+    parser.add_argument("--previous", help="Result JSON with the previous routes "
+                                           "(default: the best stored solution in res/*).")
+    parser.add_argument("--backend", type=str, default="cp", help="Backend spec for the re-solve, or 'none'.")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--time-per-item", type=float, default=TIME_PER_ITEM)
+    parser.add_argument("--extra-couriers", type=int, default=1)
+    parser.add_argument("--out", type=str, help="Optional JSON file for the result.")
+    parser.add_argument("--write-instance", type=str, help="Optional .dat file for the changed instance.")
+    args = parser.parse_args()
+
+    if args.previous:
+        previous = load_previous(args.previous)
+    else:
+        number = re.search(r"(\d+)", os.path.basename(args.instance))
+        previous = known_routes(int(number.group(1))) if number else None
+        if previous is None:
+            parser.error(f"No stored solution for {args.instance}; pass --previous.")
+    with open(args.delta, "r") as f:
+        delta = json.load(f)
+
+    new, result = reoptimise(load_instance(args.instance), previous, delta,
+                             backend=None if args.backend == "none" else args.backend, timeout=args.timeout,
+                             time_per_item=args.time_per_item, extra_couriers=args.extra_couriers)
+    print(json.dumps(result, indent=3, default=str))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=4, default=str)
+    if args.write_instance:
+        write_dat(new, args.write_instance)
+
+
+if __name__ == "__main__":
+    main()
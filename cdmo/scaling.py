@@ -0,0 +1,125 @@
+"""
+Scaling benchmark: run every backend over a grid of generated instance sizes.
+
+    python3 -m cdmo.scaling --sizes 10,20,50,100 --couriers 3,10 \
+        --backends cp,smt:2d,mip --timeout 60 --out bench/scaling.json
+
+For each (n, m, seed) an instance is generated into <workdir>/ and every
+backend config runs on it in its own process. The report lists model-build
+time, time-to-first-solution, final objective, gap and peak memory, so the
+size at which a backend stops producing solutions is easy to spot.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from cdmo.backends import run_isolated
+from cdmo.generator import generate_instance
+from cdmo.instances import load_instance, write_dat
+
+
+def trivial_lower_bound(instance):
+    """Some courier has to make the longest depot -> item -> depot round trip."""
+    D = np.asarray(instance.distance)
+    n = instance.num_load
+    return int((D[n, :n] + D[:n, n]).max())
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def run_grid(sizes, couriers, backends, timeout, seeds=(0,), tightness=0.8,
+             asymmetry=0.0, workdir="bench/instances"):
+    """Run the grid and return one row per (instance, backend) run."""
+    os.makedirs(workdir, exist_ok=True)
+    rows = []
+    for n in sizes:
+        for m in couriers:
+            if m > n:
+                continue
+            for seed in seeds:
+                name = f"gen_n{n}_m{m}_t{tightness}_a{asymmetry}_s{seed}"
+                instance_file = os.path.join(workdir, f"{name}.dat")
+                if not os.path.exists(instance_file):
+                    write_dat(generate_instance(n, m, seed=seed, tightness=tightness,
+                                                asymmetry=asymmetry), instance_file)
+                lower_bound = trivial_lower_bound(load_instance(instance_file))
+
+                runs = []
+                for spec in backends:
+                    print(f"Running {spec} on {name} ...")
+                    result = run_isolated(spec, instance_file, timeout)
+                    runs.append((spec, result))
+
+                # A proven optimum from any backend is the best bound we have.
+                for spec, result in runs:
+                    if result.get("optimal") and result.get("obj") is not None:
+                        lower_bound = max(lower_bound, result["obj"])
+
+                for spec, result in runs:
+                    stats = result.get("stats", {})
+                    obj = result.get("obj")
+                    rows.append({
+                        "instance": name,
+                        "n": n,
+                        "m": m,
+                        "seed": seed,
+                        "backend": spec,
+                        "build_time": stats.get("build_time"),
+                        "first_solution_time": stats.get("first_solution_time"),
+                        "wall_time": result.get("wall_time"),
+                        "obj": obj,
+                        "optimal": result.get("optimal", False),
+                        "gap": round((obj - lower_bound) / obj, 4) if obj else None,
+                        "peak_rss_mb": result.get("peak_rss_mb"),
+                        "error": result.get("error"),
+                    })
+    return rows
+
+
+def print_report(rows):
+    header = f"{'n':>6} {'m':>4} {'backend':<32} {'build':>8} {'first':>8} {'wall':>8} {'obj':>8} {'gap':>7} {'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    for row in rows:
+        print(f"{row['n']:>6} {row['m']:>4} {row['backend']:<32} "
+              f"{fmt(row['build_time'], '8.2f'):>8} {fmt(row['first_solution_time'], '8.2f'):>8} "
+              f"{fmt(row['wall_time'], '8.2f'):>8} {fmt(row['obj'], '8d'):>8} "
+              f"{fmt(row['gap'], '7.2%'):>7} {fmt(row['peak_rss_mb'], '8.1f'):>8}"
+              + ("  *" if row["optimal"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark over generated instances.")
+    parser.add_argument("--sizes", type=_int_list, default=[10, 20, 50, 100], help="Item counts, e.g. 10,20,50.")
+    parser.add_argument("--couriers", type=_int_list, default=[3, 10], help="Courier counts, e.g. 3,10.")
+    parser.add_argument("--seeds", type=_int_list, default=[0])
+    parser.add_argument("--backends", type=lambda s: s.split(","), default=["cp", "smt:2d", "mip"],
+                        help="Backend specs, e.g. cp:chuffed:firstfail_indmin_sb,smt:3d:sb,mip.")
+    parser.add_argument("--tightness", type=float, default=0.8)
+    parser.add_argument("--asymmetry", type=float, default=0.0)
+    parser.add_argument("--timeout", type=int, default=60, help="Seconds per run.")
+    parser.add_argument("--workdir", type=str, default="bench/instances")
+    parser.add_argument("--out", type=str, default="bench/scaling.json")
+    args = parser.parse_args()
+
+    rows = run_grid(args.sizes, args.couriers, args.backends, args.timeout, seeds=args.seeds,
+                    tightness=args.tightness, asymmetry=args.asymmetry, workdir=args.workdir)
+    print_report(rows)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(rows, f, indent=4)
+    print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Adaptive time-budget scheduler for a sweep over many instances.
+
+    python3 -m cdmo.schedule --budget 3600 --instances 1-21 \
+        --config cp:chuffed:firstfail_indmin_sb --out bench/schedule.json
+
+Instead of a fixed 300 s per instance, the sweep gets one wall-clock budget:
+    - every instance gets a predicted difficulty from n, m and how tight the
+      capacities are (difficulty());
+    - instances run easiest first, each with its difficulty-weighted share of
+      the budget that is still left, so time not used by a run proven optimal
+      early is handed on to the harder ones;
+    - a reserve (--reserve) is kept back; at the end it and whatever else is
+      left goes to runs that were still improving when their time ran out
+      (last incumbent in the final --window of the slice). Those are run
+      again with the longer limit and the better result is kept.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from cdmo.backends import run_isolated
+from cdmo.benchmark import parse_instances
+from cdmo.instances import instance_path, load_instance
+
+
+def difficulty(instance):
+    """
+    Relative difficulty estimate: items times items per courier (route length
+    drives the search), scaled up when the capacities leave little slack.
+    """
+    n, m = int(instance.num_load), int(instance.num_couriers)
+    tightness = float(np.sum(instance.load_size)) / max(1, float(np.sum(instance.courier_capacity)))
+    return n * max(1.0, n / m) * (1.0 + tightness)
+
+
+def _better(new, old):
+    if new.get("optimal"):
+        return True
+    if new.get("obj") is None:
+        return False
+    return old.get("obj") is None or new["obj"] < old["obj"]
+
+
+def still_improving(job, window):
+    """True when the last incumbent of a non-optimal run came in the final <window> of its slice."""
+    result = job["result"]
+    last = result.get("last_solution_time")
+    if result.get("optimal") or result.get("error") or last is None:
+        return False
+    return last >= (1 - window) * job["slice"]
+
+
+def schedule(instance_files, spec, budget, reserve=0.2, window=0.25, min_slice=1, max_slice=None, grace=30):
+    """
+    Parameters:
+        instance_files (list of str): .dat files to solve.
+        spec (str): Backend config, see cdmo/backends.parse_config().
+        budget (float): Wall-clock seconds for the whole sweep.
+        reserve (float): Fraction of the budget kept for still-improving runs.
+        window (float): Fraction of a slice in which a new incumbent counts as still improving.
+        min_slice, max_slice (float): Bounds on the time given to one run.
+        grace (float): Extra seconds before a stuck run is killed (run_isolated()).
+
+    Returns:
+        list of dict: One job per instance with its difficulty, slice and result.
+    """
+    start_time = time.time()
+    jobs = [{"instance": path, "difficulty": difficulty(load_instance(path))} for path in instance_files]
+    jobs.sort(key=lambda job: job["difficulty"])
+
+    def remaining():
+        return budget - (time.time() - start_time)
+
+    # First pass: weighted share of what is left, so early finishers pay for later jobs.
+    main_budget = budget * (1 - reserve)
+    for i, job in enumerate(jobs):
+        left = main_budget - (time.time() - start_time)
+        weight = job["difficulty"] / sum(j["difficulty"] for j in jobs[i:])
+        job["slice"] = _clamp(left * weight, min_slice, max_slice)
+        print(f"[{os.path.basename(job['instance'])}] difficulty {job['difficulty']:.0f}, {job['slice']:.1f} s")
+        job["result"] = run_isolated(spec, job["instance"], job["slice"], grace=grace)
+        job["extended"] = False
+
+    # Second pass: reserve + leftovers to runs that were still finding better solutions.
+    improving = [job for job in jobs if still_improving(job, window)]
+    for i, job in enumerate(improving):
+        left = remaining()
+        if left < min_slice:
+            break
+        weight = job["difficulty"] / sum(j["difficulty"] for j in improving[i:])
+        extended_slice = _clamp(job["slice"] + left * weight, min_slice, max_slice)
+        if extended_slice <= job["slice"]:
+            continue
+        print(f"[{os.path.basename(job['instance'])}] still improving, rerun with {extended_slice:.1f} s")
+        result = run_isolated(spec, job["instance"], extended_slice, grace=grace)
+        if _better(result, job["result"]):
+            job["result"] = result
+        job["slice"] = extended_slice
+        job["extended"] = True
+    return jobs
+
+
+def _clamp(value, low, high):
+    value = max(low, value)
+    return min(high, value) if high is not None else value
+
+
+def print_report(jobs, budget, elapsed):
+    print(f"{'instance':<14} {'difficulty':>10} {'slice':>8} {'wall':>8} {'obj':>8}  status")
+    for job in jobs:
+        result = job["result"]
+        status = "optimal" if result.get("optimal") else (result.get("error") or "time limit")
+        if job["extended"]:
+            status += " (extended)"
+        obj = result.get("obj")
+        print(f"{os.path.basename(job['instance']):<14} {job['difficulty']:>10.0f} {job['slice']:>8.1f} "
+              f"{result.get('wall_time') or 0:>8.1f} {obj if obj is not None else '-':>8}  {status}")
+    print(f"\n{sum(1 for job in jobs if job['result'].get('optimal'))}/{len(jobs)} optimal, "
+          f"{elapsed:.0f} of {budget:.0f} s used.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a sweep under one global time budget.")
+    parser.add_argument("--budget", type=float, required=True, help="Wall-clock seconds for the whole sweep.")
+    parser.add_argument("--instances", type=parse_instances, default=parse_instances("1-21"))
+    parser.add_argument("--config", type=str, default="cp", help="Backend spec, e.g. smt:2d:sb or mip.")
+    parser.add_argument("--reserve", type=float, default=0.2, help="Budget fraction kept for still-improving runs.")
+    parser.add_argument("--window", type=float, default=0.25,
+                        help="A run is still improving if its last incumbent came in this final fraction.")
+    parser.add_argument("--min-slice", type=float, default=1)
+    parser.add_argument("--max-slice", type=float, default=None)
+    parser.add_argument("--out", type=str, default="bench/schedule.json")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    files = [instance_path(number) for number in args.instances if os.path.exists(instance_path(number))]
+    jobs = schedule(files, args.config, args.budget, reserve=args.reserve, window=args.window,
+                    min_slice=args.min_slice, max_slice=args.max_slice)
+    print_report(jobs, args.budget, time.time() - start_time)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"budget": args.budget, "config": args.config, "jobs": jobs}, f, indent=4, default=str)
+    print(f"Schedule saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Local solver service with warm workers and streamed incumbents.
+
+    python3 -m cdmo service --port 8765 --workers 4 --preload cp,smt,mip
+
+Workers are started once and import their backends up front, so a request
+only pays for parsing the instance and building the model. The HTTP API
+(localhost only):
+
+    POST /solve?backend=cp:chuffed:firstfail_indmin_sb&timeout=10
+        body: an instance in the Instances/*.dat format
+        reply: newline-delimited JSON, streamed as the solve goes:
+            {"event": "accepted", "job": 3}
+            {"event": "started", "job": 3, "worker": 1}
+            {"event": "incumbent", "job": 3, "elapsed": 0.12, "obj": 14}
+            {"event": "result", "job": 3, "obj": 14, "optimal": true, ...}
+    POST /cancel/<job>   stop a queued or running job
+    GET  /health         worker status
+
+Timeouts are per request, capped by --max-timeout. Cancelled jobs return
+their best solution so far with "cancelled": true. CP, SMT and MIP stop
+through the same hook as a race (cdmo/race.py); a worker running a backend
+without it is restarted. Closing the connection cancels the job.
+
+Every job also has a hard deadline of timeout + cancel_grace seconds after
+it started, since a solver can overrun its own limit (CBC ignores it during
+presolve and the root LP, Z3 models are built before the stop hook is
+polled). A worker that does not answer by then, or within cancel_grace of a
+cancel, is killed together with its process group (CBC, MiniZinc, decomp
+and portfolio children) and replaced. The job's result then carries the
+objective of the last streamed incumbent; its routes died with the worker,
+so "sol" is empty and "error" says why.
+
+Workers are not daemon processes, so backends that start processes of their
+own (decomp, portfolio) work; shutdown() stops them when the server exits.
+MIP jobs run CBC in rounds (10 s, then doubling) and CBC only reports its
+incumbents at the end of a round, so a MIP job streams its first incumbents
+after the first round, or together with the result when it is shorter.
+"""
+
+import argparse
+import atexit
+import inspect
+import itertools
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue as queue_module
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cdmo.backends import get_backend, load_script, parse_config
+from cdmo.instances import parse_dat_text
+
+
+def warm_up(kind):
+    """Import everything a backend needs before the first request arrives."""
+    get_backend(kind)
+    if kind == "cp":
+        load_script("cp1/try.py", "cp_try")
+    elif kind == "smt":
+        import smt_final.smt1  # noqa: F401
+        import smt_final.smt3  # noqa: F401
+    elif kind == "mip":
+        import pulp  # noqa: F401
+        load_script("test/solver_model.py", "mip_solver_model")
+
+
+class _Cancel:
+    """The `shared` hook of the runners, used here only to stop a job."""
+
+    def __init__(self, cancelled, job):
+        self.cancelled = cancelled
+        self.job = job
+
+    def stopped(self):
+        return self.cancelled.value == self.job
+
+    def bound(self):
+        return None
+
+
+def _worker(index, preload, jobs, events, cancelled):
+    # Own process group, so a kill also takes down the solver processes this worker starts.
+    os.setpgrp()
+    # Events go through this worker's own pipe: killing it cannot corrupt another worker's channel.
+    lock = threading.Lock()
+
+    def send(job_id, event):
+        with lock:
+            events.send((job_id, event))
+
+    for kind in preload:
+        warm_up(kind)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, spec, dat_text, timeout = job
+        send(job_id, {"event": "started", "worker": index})
+        try:
+            instance = parse_dat_text(dat_text, f"job {job_id}")
+            name, runner, kwargs = parse_config(spec)
+            if "shared" in inspect.signature(runner).parameters:
+                kwargs["shared"] = _Cancel(cancelled, job_id)
+            result = runner(instance, timeout=timeout, **kwargs,
+                            on_solution=lambda elapsed, obj: send(
+                                job_id, {"event": "incumbent", "elapsed": round(elapsed, 3), "obj": obj}))
+        except Exception as e:
+            result = {"time": 0, "optimal": False, "obj": None, "sol": [], "error": repr(e)}
+        result["cancelled"] = cancelled.value == job_id
+        send(job_id, {"event": "result", **result})
+
+
+class SolverService:
+    """Worker pool plus the routing of worker events to the waiting requests."""
+
+    def __init__(self, workers=2, preload=("cp", "smt", "mip"), max_timeout=300, cancel_grace=5):
+        self.preload = list(preload)
+        self.max_timeout = max_timeout
+        self.cancel_grace = cancel_grace
+        self.jobs = multiprocessing.Queue()
+        self.ids = itertools.count(1)
+        # Reentrant: the router receives and delivers an event under it in one step (see _reap).
+        self.lock = threading.RLock()
+        self.streams = {}      # job -> queue.Queue of events for the request thread
+        self.running = {}      # job -> worker index
+        self.timeouts = {}     # job -> time limit of the request
+        self.incumbents = {}   # job -> objective of the last streamed incumbent
+        self.cancelled = set()
+        self.workers = [self._start_worker(i) for i in range(workers)]
+        threading.Thread(target=self._route, daemon=True).start()
+        # Runs before multiprocessing joins the (non-daemon) workers at exit.
+        atexit.register(self.shutdown)
+
+    def _start_worker(self, index):
+        flag = multiprocessing.Value("i", 0)
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        # Not a daemon: decomp and portfolio start processes of their own.
+        process = multiprocessing.Process(target=_worker, args=(index, self.preload, self.jobs, sender, flag))
+        process.start()
+        sender.close()
+        return {"process": process, "cancelled": flag, "events": receiver}
+
+    @staticmethod
+    def _kill(worker):
+        """Kill a worker and every process in its group."""
+        try:
+            os.killpg(worker["process"].pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            worker["process"].kill()
+        worker["process"].join()
+        worker["events"].close()
+
+    def shutdown(self, grace=1):
+        """Stop every worker: idle ones take the None job, busy ones are killed with their children."""
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker["process"].join(timeout=grace)
+            if worker["process"].is_alive():
+                self._kill(worker)
+
+    def _route(self):
+        while True:
+            with self.lock:
+                channels = {worker["events"]: worker for worker in self.workers}
+            try:
+                ready = multiprocessing.connection.wait(list(channels), timeout=0.5)
+            except OSError:
+                continue  # a channel was closed while waiting
+            for channel in ready:
+                with self.lock:
+                    try:
+                        job_id, event = channel.recv()
+                    except (EOFError, OSError):
+                        continue  # the worker died or was replaced
+                    self._deliver(job_id, event)
+
+    def _deliver(self, job_id, event):
+        reap = None
+        with self.lock:
+            if event["event"] == "started":
+                self.running[job_id] = event["worker"]
+                if job_id in self.cancelled:
+                    self.workers[event["worker"]]["cancelled"].value = job_id
+                reap = (job_id, event["worker"], self.timeouts.get(job_id, self.max_timeout) + self.cancel_grace,
+                        "worker restarted after exceeding the time limit")
+            elif event["event"] == "incumbent":
+                self.incumbents[job_id] = event["obj"]
+            elif event["event"] == "result":
+                if self.running.pop(job_id, None) is None and job_id not in self.timeouts:
+                    return  # already answered by _reap
+                self.cancelled.discard(job_id)
+                self.timeouts.pop(job_id, None)
+                self.incumbents.pop(job_id, None)
+            stream = self.streams.get(job_id)
+        if reap is not None:
+            threading.Thread(target=self._reap, args=reap, daemon=True).start()
+        if stream is not None:
+            stream.put(dict(event, job=job_id))
+
+    def submit(self, spec, dat_text, timeout):
+        """Queue a job; returns (job id, queue of its events)."""
+        parse_config(spec)  # reject unknown backends before queuing
+        job_id = next(self.ids)
+        stream = queue_module.Queue()
+        timeout = min(timeout, self.max_timeout)
+        with self.lock:
+            self.streams[job_id] = stream
+            self.timeouts[job_id] = timeout
+        self.jobs.put((job_id, spec, dat_text, timeout))
+        return job_id, stream
+
+    def finish(self, job_id):
+        with self.lock:
+            self.streams.pop(job_id, None)
+
+    def cancel(self, job_id):
+        """Stop a job; a worker that does not stop within cancel_grace is replaced."""
+        with self.lock:
+            if job_id not in self.streams:
+                return False
+            self.cancelled.add(job_id)
+            index = self.running.get(job_id)
+            if index is not None:
+                self.workers[index]["cancelled"].value = job_id
+        if index is not None:
+            threading.Thread(target=self._reap, args=(job_id, index, self.cancel_grace,
+                                                      "worker restarted after cancel"), daemon=True).start()
+        return True
+
+    def _reap(self, job_id, index, delay, reason):
+        """Replace the worker if it is still on job_id after delay seconds; answer with the last incumbent."""
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            with self.lock:
+                if self.running.get(job_id) != index:
+                    return
+            time.sleep(0.1)
+        with self.lock:
+            # A result still in the pipe means the worker may already wait for its next job,
+            # holding the jobs queue's lock; killing it then would block every other worker.
+            while self.running.get(job_id) == index and self.workers[index]["events"].poll():
+                job, event = self.workers[index]["events"].recv()
+                self._deliver(job, event)
+            if self.running.get(job_id) != index:
+                return
+            self._kill(self.workers[index])
+            self.workers[index] = self._start_worker(index)
+            self.running.pop(job_id, None)
+            self.timeouts.pop(job_id, None)
+            obj = self.incumbents.pop(job_id, None)
+            cancelled = job_id in self.cancelled
+            self.cancelled.discard(job_id)
+            stream = self.streams.get(job_id)
+        if stream is not None:
+            stream.put({"event": "result", "job": job_id, "time": int(delay), "optimal": False, "obj": obj,
+                        "sol": [], "cancelled": cancelled,
+                        "error": reason + ("; the routes of the last incumbent were lost" if obj is not None else "")})
+
+    def health(self):
+        with self.lock:
+            return {
+                "workers": [{"index": i, "alive": w["process"].is_alive(),
+                             "job": next((job for job, index in self.running.items() if index == i), None)}
+                            for i, w in enumerate(self.workers)],
+                "queued": len(self.streams) - len(self.running),
+                "preload": self.preload,
+            }
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, payload):
+            data = (json.dumps(payload, default=str) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/health":
+                self._json(200, service.health())
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path.startswith("/cancel/"):
+                job_id = int(url.path.rsplit("/", 1)[1])
+                self._json(200 if service.cancel(job_id) else 404, {"job": job_id})
+                return
+            if url.path != "/solve":
+                self._json(404, {"error": "not found"})
+                return
+
+            query = parse_qs(url.query)
+            dat_text = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+            try:
+                job_id, stream = service.submit(query.get("backend", ["cp"])[0], dat_text,
+                                                float(query.get("timeout", [service.max_timeout])[0]))
+            except ValueError as e:
+                self._json(400, {"error": str(e)})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                self._chunk({"event": "accepted", "job": job_id})
+                while True:
+                    event = stream.get()
+                    self._chunk(event)
+                    if event["event"] == "result":
+                        break
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                service.cancel(job_id)
+            finally:
+                service.finish(job_id)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local solver service with warm workers.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--preload", type=lambda s: s.split(","), default=["cp", "smt", "mip"],
+                        help="Backends every worker imports at startup.")
+    parser.add_argument("--max-timeout", type=float, default=300, help="Upper limit for per-request timeouts.")
+    args = parser.parse_args()
+
+    service = SolverService(workers=args.workers, preload=args.preload, max_timeout=args.max_timeout)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+One statistics schema for every backend.
+
+Each solver reports different counters under different names (MiniZinc
+"failures", Z3 "sat conflicts", CBC "Enumerated nodes", ...). The functions
+below map them onto STATS_FIELDS so results from CP, SMT and MIP can be put
+side by side. Counters a solver does not have stay None.
+"""
+
+import re
+
+STATS_FIELDS = [
+    "flatten_time",   # model -> solver format (MiniZinc flattening), seconds
+    "build_time",     # Python-side model construction (+ flattening), seconds
+    "solve_time",     # time spent inside the solver, seconds
+    "nodes",          # search nodes / decisions
+    "failures",       # CP failures
+    "conflicts",      # SAT/SMT conflicts
+    "restarts",
+    "propagations",
+    "lp_iterations",  # simplex iterations (MIP)
+    "variables",
+    "constraints",
+    "solutions",      # number of improving solutions found
+    "best_bound",     # best proven lower bound on the objective, if known
+    "memory_mb",      # solver-reported peak memory
+]
+
+
+def empty_stats():
+    return {field: None for field in STATS_FIELDS}
+
+
+def _seconds(value):
+    """MiniZinc reports times either as milliseconds (number) or as timedelta."""
+    if value is None:
+        return None
+    return round(value / 1000.0 if isinstance(value, (int, float)) else value.total_seconds(), 3)
+
+
+def _first(statistics, *keys):
+    for key in keys:
+        if key in statistics:
+            return statistics[key]
+    return None
+
+
+def _sum(statistics, *keys):
+    values = [statistics[key] for key in keys if key in statistics]
+    return sum(values) if values else None
+
+
+def from_minizinc(statistics):
+    """Map a minizinc.Result.statistics dict (Gecode or Chuffed) onto the schema."""
+    stats = empty_stats()
+    stats["flatten_time"] = _seconds(statistics.get("flatTime"))
+    stats["build_time"] = stats["flatten_time"]
+    stats["solve_time"] = _seconds(statistics.get("solveTime"))
+    stats["nodes"] = _first(statistics, "nodes")
+    stats["failures"] = _first(statistics, "failures")
+    stats["restarts"] = _first(statistics, "restarts")
+    stats["propagations"] = _first(statistics, "propagations")
+    stats["variables"] = _first(statistics, "variables") or \
+        _sum(statistics, "flatIntVars", "flatBoolVars", "flatFloatVars", "flatSetVars")
+    stats["constraints"] = _first(statistics, "propagators") or \
+        _sum(statistics, "flatIntConstraints", "flatBoolConstraints", "flatFloatConstraints", "flatSetConstraints")
+    stats["solutions"] = _first(statistics, "nSolutions", "solutions")
+    stats["best_bound"] = _first(statistics, "objectiveBound")
+    return stats
+
+
+def from_z3(statistics, build_time=None, solve_time=None, variables=None, constraints=None):
+    """Map a z3 Statistics object (Solver or Optimize) onto the schema."""
+    raw = {key: statistics.get_key_value(key) for key in statistics.keys()}
+    stats = empty_stats()
+    stats["build_time"] = build_time
+    stats["solve_time"] = solve_time
+    stats["nodes"] = _first(raw, "decisions", "sat decisions")
+    stats["conflicts"] = _first(raw, "conflicts", "sat conflicts")
+    stats["restarts"] = _first(raw, "restarts", "sat restarts")
+    stats["propagations"] = _first(raw, "propagations") or \
+        _sum(raw, "sat propagations 2ary", "sat propagations nary")
+    stats["memory_mb"] = _first(raw, "max memory", "memory")
+    stats["variables"] = variables
+    stats["constraints"] = constraints
+    return stats
+
+
+CBC_PATTERNS = {
+    "nodes": re.compile(r"^Enumerated nodes:\s+(\d+)", re.M),
+    "lp_iterations": re.compile(r"^Total iterations:\s+(\d+)", re.M),
+    "lower_bound": re.compile(r"^Lower bound:\s+(\S+)", re.M),
+    "optimal_value": re.compile(r"^Result - Optimal solution found\s+Objective value:\s+(\S+)", re.M),
+    "solutions": re.compile(r"Integer solution of \S+ found", re.M),
+}
+
+
+def from_cbc(log_text, model=None, build_time=None, solve_time=None):
+    """Parse the summary of a CBC log (PuLP logPath=...) and count the PuLP model."""
+    stats = empty_stats()
+    stats["build_time"] = build_time
+    stats["solve_time"] = solve_time
+    for field in ("nodes", "lp_iterations"):
+        match = CBC_PATTERNS[field].search(log_text)
+        if match:
+            stats[field] = int(match.group(1))
+    # "Lower bound" is printed when CBC stops early; an optimal run proves its objective.
+    match = CBC_PATTERNS["lower_bound"].search(log_text) or CBC_PATTERNS["optimal_value"].search(log_text)
+    if match:
+        stats["best_bound"] = float(match.group(1))
+    stats["solutions"] = len(CBC_PATTERNS["solutions"].findall(log_text))
+    if model is not None:
+        stats["variables"] = len(model.variables())
+        stats["constraints"] = len(model.constraints)
+    return stats
+
+
+def read_log(log_path):
+    try:
+        with open(log_path, "r") as f:
+            return f.read()
+    except OSError:
+        return ""
@@ -0,0 +1,138 @@
+"""
+Sound symmetry breaking shared by every backend.
+
+Two kinds of symmetry are detected from the data:
+
+    - interchangeable couriers: equal capacities (distances do not depend
+      on the courier), so their routes can be swapped;
+    - interchangeable items: same size and identical distance rows and
+      columns (e.g. two parcels for the same address), so they can swap
+      places in any solution.
+
+Read a solution as the vector a = (courier of item 1, ..., courier of item n).
+The constraints keep only the lexicographically smallest vector of every
+symmetry class, so at least one optimal solution always survives:
+
+    - couriers c < c' with equal capacity: the smallest item of c is
+      smaller than the smallest item of c' (value precedence);
+    - interchangeable items j < k: courier(j) <= courier(k).
+
+Both follow from the same order on a, so they are sound together. The
+constraints only need "courier c delivers item j" (assigned(c, j)); every
+backend passes its own expression for that.
+"""
+
+import numpy as np
+
+
+def courier_pairs(courier_capacity):
+    """(c, c') pairs of consecutive couriers within each equal-capacity group."""
+    last = {}
+    pairs = []
+    for c, capacity in enumerate(courier_capacity):
+        if capacity in last:
+            pairs.append((last[capacity], c))
+        last[capacity] = c
+    return pairs
+
+
+def _twins(D, u, v):
+    rest = np.ones(D.shape[0], dtype=bool)
+    rest[[u, v]] = False
+    return (D[u, v] == D[v, u]
+            and (D[u, rest] == D[v, rest]).all()
+            and (D[rest, u] == D[rest, v]).all())
+
+
+def item_pairs(load_size, distance, depot=None):
+    """
+    (j, k) pairs, j < k, of interchangeable items (0-based item indices, i.e.
+    node indices without the depot). Every pair is checked directly, items
+    of one class are chained.
+    """
+    D = np.asarray(distance, dtype=np.int64)
+    depot = D.shape[0] - 1 if depot is None else depot
+    nodes = [v for v in range(D.shape[0]) if v != depot]
+    size = np.asarray(load_size)
+
+    # cheap filter before the full row/column comparison
+    key = list(zip(size.tolist(), D[nodes, depot].tolist(), D[depot, nodes].tolist()))
+    classes = []  # lists of item indices
+    pairs = []
+    for k in range(len(nodes)):
+        for members in classes:
+            j = members[-1]
+            if key[j] == key[k] and _twins(D, nodes[j], nodes[k]):
+                pairs.append((j, k))
+                members.append(k)
+                break
+        else:
+            classes.append([k])
+    return pairs
+
+
+def z3_constraints(assigned, m, n, courier_capacity, load_size, distance, prefix="sb"):
+    """
+    Z3 symmetry breaking. assigned(c, j) must return a Bool expression
+    (courier c delivers 0-based item j). Returns a list of constraints.
+    """
+    from z3 import Bool, Implies, Or, Not
+
+    constraints = []
+    for c, c2 in courier_pairs(courier_capacity):
+        # below[j] -> courier c delivers some item < j
+        below = [None]
+        for j in range(1, n):
+            flag = Bool(f"{prefix}_below_{c}_{j}")
+            previous = assigned(c, j - 1) if below[-1] is None else Or(below[-1], assigned(c, j - 1))
+            constraints.append(Implies(flag, previous))
+            below.append(flag)
+        constraints.append(Not(assigned(c2, 0)))
+        for j in range(1, n):
+            constraints.append(Implies(assigned(c2, j), below[j]))
+
+    for j, k in item_pairs(load_size, distance):
+        for i in range(m):
+            constraints.append(Implies(assigned(i, k), Or([assigned(i2, j) for i2 in range(i + 1)])))
+    return constraints
+
+
+def pulp_constraints(model, assigned, m, n, courier_capacity, load_size, distance, depot=None, prefix="sb"):
+    """
+    Add the PuLP version to <model>. assigned(c, j) must return a 0/1 linear
+    expression (courier c delivers 0-based item j).
+    """
+    import pulp
+
+    for c, c2 in courier_pairs(courier_capacity):
+        # below[j] <= 1 only if courier c delivers some item < j
+        below = [0]
+        for j in range(1, n):
+            flag = pulp.LpVariable(f"{prefix}_below_{c}_{j}", lowBound=0, upBound=1)
+            model += flag <= below[-1] + assigned(c, j - 1)
+            below.append(flag)
+        for j in range(n):
+            model += assigned(c2, j) <= below[j]
+
+    for j, k in item_pairs(load_size, distance, depot):
+        for i in range(m):
+            model += assigned(i, k) <= pulp.lpSum(assigned(i2, j) for i2 in range(i + 1))
+
+
+def minizinc_constraints(courier_capacity, load_size, distance):
+    """
+    MiniZinc version for the cp1 models (load_assigned rows, depot num_load+1
+    as padding). The depot pads every row, so the minimum of a row is the
+    courier's smallest item. Returns a string for Model.add_string().
+    """
+    lines = []
+    for c, c2 in courier_pairs(courier_capacity):
+        lines.append(f"constraint min(load_assigned[{c + 1}, 2..num_load+1]) < "
+                     f"min(load_assigned[{c2 + 1}, 2..num_load+1]);")
+
+    for j, k in item_pairs(load_size, distance):
+        lines.append(
+            f"constraint forall(courier in 1..num_couriers)("
+            f"exists(pos in 2..num_load+1)(load_assigned[courier, pos] = {k + 1}) -> "
+            f"exists(other in 1..courier, pos in 2..num_load+1)(load_assigned[other, pos] = {j + 1}));")
+    return "\n".join(lines) + "\n"
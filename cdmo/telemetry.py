@@ -0,0 +1,222 @@
+"""
+Convergence telemetry: incumbent and bound over time for every run.
+
+A result only keeps the final time, objective and optimal flag. A Trace
+records every improvement while the run goes, as JSON lines:
+
+    {"run": "3f2a...", "event": "start", "backend": "mip", "instance": "inst07.dat", "timeout": 60, ...}
+    {"run": "3f2a...", "event": "solution", "t": 0.41, "incumbent": 212, "bound": null}
+    {"run": "3f2a...", "event": "bound", "t": 2.9, "incumbent": 212, "bound": 167}
+    {"run": "3f2a...", "event": "end", "t": 60.2, "incumbent": 206, "bound": 180, "optimal": false}
+
+Solutions come from the runners' on_solution callback (MiniZinc intermediate
+solutions, Z3 on_model, CBC log lines); bounds from the runners that take
+on_bound (CBC "best possible" lines, the column generation and
+decomposition lower bounds) and from the final stats["best_bound"].
+
+Runs through run_isolated() (benchmark, scaling, schedule, tune-z3) are
+appended to bench/telemetry.jsonl unless CDMO_TELEMETRY=0; `cdmo solve`
+takes --telemetry <file>. The summary gives per run the time to the first
+solution, the time to reach the target (within --target-gap of the best
+objective any run found on that instance), the primal integral (the
+integral of the primal gap over the time limit; the gap is 1 while there
+is no solution) and the final gap to the bound:
+
+    python3 -m cdmo.telemetry bench/telemetry.jsonl --target-gap 0.01
+"""
+
+import argparse
+import datetime
+import inspect
+import json
+import os
+import time
+import uuid
+
+from cdmo.backends import ROOT_DIR
+
+TELEMETRY_FILE = os.path.join(ROOT_DIR, "bench", "telemetry.jsonl")
+
+
+def telemetry_file():
+    """Where run_isolated() records runs, or None if CDMO_TELEMETRY=0."""
+    if os.environ.get("CDMO_TELEMETRY") == "0":
+        return None
+    return os.environ.get("CDMO_TELEMETRY_FILE", TELEMETRY_FILE)
+
+
+class Trace:
+    """Event writer for one run; use it as on_solution and on_bound."""
+
+    def __init__(self, path, callback=None, **meta):
+        self.path = path
+        self.callback = callback
+        self.run = uuid.uuid4().hex[:12]
+        self.incumbent = None
+        self.best_bound = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._write(dict(event="start", started=datetime.datetime.now().isoformat(timespec="seconds"), **meta))
+
+    def _write(self, event):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(dict(run=self.run, **event), default=str) + "\n")
+
+    def _event(self, kind, elapsed, **extra):
+        self._write(dict(event=kind, t=round(elapsed, 3), incumbent=self.incumbent, bound=self.best_bound, **extra))
+
+    def __call__(self, elapsed, obj):
+        if obj is not None and (self.incumbent is None or obj < self.incumbent):
+            self.incumbent = obj
+            self._event("solution", elapsed)
+        if self.callback is not None:
+            self.callback(elapsed, obj)
+
+    def bound(self, elapsed, value):
+        if value is not None and (self.best_bound is None or value > self.best_bound):
+            self.best_bound = value
+            self._event("bound", elapsed)
+
+    def close(self, result, elapsed):
+        """Final event from the result dict (its objective and bound may be better than the last events)."""
+        if result.get("obj") is not None and (self.incumbent is None or result["obj"] < self.incumbent):
+            self.incumbent = result["obj"]
+        bound = result.get("obj") if result.get("optimal") else (result.get("stats") or {}).get("best_bound")
+        if bound is not None and (self.best_bound is None or bound > self.best_bound):
+            self.best_bound = bound
+        self._event("end", elapsed, optimal=bool(result.get("optimal")), error=result.get("error"))
+
+
+def traced(runner, instance, path, timeout=300, on_solution=None, meta=None, takes_bound=None, **kwargs):
+    """
+    Run runner(instance, ...) with a Trace. on_bound is passed when takes_bound
+    is set, by default when the runner's signature has it.
+    """
+    trace = Trace(path, callback=on_solution, timeout=timeout, **(meta or {}))
+    if takes_bound is None:
+        takes_bound = "on_bound" in inspect.signature(runner).parameters
+    if takes_bound:
+        kwargs["on_bound"] = trace.bound
+    start_time = time.time()
+    try:
+        result = runner(instance, timeout=timeout, on_solution=trace, **kwargs)
+    except Exception as e:
+        trace.close({"error": repr(e)}, time.time() - start_time)
+        raise
+    trace.close(result, time.time() - start_time)
+    return result
+
+
+def load_runs(paths):
+    """{run id: {"meta": start event, "events": [...], "end": end event or None}} from JSONL files."""
+    runs = {}
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                run = runs.setdefault(event["run"], {"meta": {}, "events": [], "end": None})
+                if event["event"] == "start":
+                    run["meta"] = event
+                elif event["event"] == "end":
+                    run["end"] = event
+                else:
+                    run["events"].append(event)
+    return runs
+
+
+def primal_gap(incumbent, reference):
+    if incumbent is None or reference is None:
+        return 1.0
+    if incumbent == reference:
+        return 0.0
+    return abs(incumbent - reference) / max(abs(incumbent), abs(reference))
+
+
+def summarize_run(run, reference=None, target_gap=0.0):
+    """
+    Metrics of one run.
+
+    Parameters:
+        run (dict): From load_runs().
+        reference (float): Best known objective for the instance.
+        target_gap (float): Relative gap to the reference that counts as reaching the target.
+
+    Returns:
+        dict: time_to_first, time_to_target, primal_integral, final_obj, final_bound, final_gap.
+    """
+    events = sorted(run["events"], key=lambda e: e["t"])
+    end = run["end"] or (events[-1] if events else {})
+    horizon = run["meta"].get("timeout") or end.get("t", 0)
+    solutions = [(e["t"], e["incumbent"]) for e in events if e["event"] == "solution"]
+    # The result can be better than the last reported solution (e.g. after polishing).
+    if end.get("incumbent") is not None and (not solutions or end["incumbent"] < solutions[-1][1]):
+        solutions.append((end["t"], end["incumbent"]))
+
+    time_to_target = next((t for t, obj in solutions if primal_gap(obj, reference) <= target_gap), None)
+    integral, last_t, last_obj = 0.0, 0.0, None
+    for t, obj in solutions:
+        t = min(t, horizon)
+        integral += (t - last_t) * primal_gap(last_obj, reference)
+        last_t, last_obj = t, obj
+    integral += max(0.0, horizon - last_t) * primal_gap(last_obj, reference)
+
+    final_obj, final_bound = end.get("incumbent"), end.get("bound")
+    return {
+        "time_to_first": solutions[0][0] if solutions else None,
+        "time_to_target": time_to_target,
+        "primal_integral": round(integral, 3),
+        "final_obj": final_obj,
+        "final_bound": final_bound,
+        "final_gap": round((final_obj - final_bound) / final_obj, 4)
+        if final_obj and final_bound is not None else None,
+    }
+
+
+def summarize(runs, target_gap=0.0):
+    """Summaries of every run; the reference per instance is the best objective any run found."""
+    reference = {}
+    for run in runs.values():
+        instance = run["meta"].get("instance")
+        values = [e["incumbent"] for e in run["events"] + ([run["end"]] if run["end"] else [])
+                  if e.get("incumbent") is not None]
+        if values:
+            reference[instance] = min(values + ([reference[instance]] if instance in reference else []))
+    rows = []
+    for run_id, run in runs.items():
+        instance = run["meta"].get("instance")
+        row = {"run": run_id, "instance": instance, "backend": run["meta"].get("backend"),
+               "timeout": run["meta"].get("timeout"), "reference": reference.get(instance)}
+        row.update(summarize_run(run, reference.get(instance), target_gap))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize convergence telemetry.")
+    parser.add_argument("files", nargs="*", default=[TELEMETRY_FILE], help="Telemetry JSONL files.")
+    parser.add_argument("--target-gap", type=float, default=0.0,
+                        help="Relative gap to the best known objective that counts as reaching the target.")
+    parser.add_argument("--out", type=str, help="Optional JSON file for the summary rows.")
+    args = parser.parse_args()
+
+    rows = summarize(load_runs(args.files), args.target_gap)
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print(f"{'instance':<20} {'backend':<32} {'first':>8} {'target':>8} {'integral':>9} "
+          f"{'obj':>8} {'bound':>8} {'gap':>7}")
+    for row in sorted(rows, key=lambda r: (str(r["instance"]), str(r["backend"]))):
+        print(f"{str(row['instance']):<20} {str(row['backend']):<32} {fmt(row['time_to_first'], '8.2f')} "
+              f"{fmt(row['time_to_target'], '8.2f')} {fmt(row['primal_integral'], '9.2f')} "
+              f"{fmt(row['final_obj'], '>8')} {fmt(row['final_bound'], '>8')} {fmt(row['final_gap'], '7.3f')}")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Single-courier routing.
+
+Once the items of a courier are fixed, its route is a plain TSP through
+those items and the depot. solve_tour() takes the sub-matrix of the
+courier's nodes (depot last, as in the .dat files) and returns the best
+visiting order it can prove or find:
+
+    - up to HELD_KARP_MAX items: Held-Karp bitmask DP, exact and fast
+      (one NumPy step per (subset size, last item) pair),
+    - larger routes: a small PuLP assignment model with subtour cuts added
+      lazily (every time CBC returns several cycles, found with follow_loop,
+      each cycle gets a "sum of its arcs <= |S| - 1" cut); if that runs out
+      of time, nearest neighbour improved with 2-opt / or-opt.
+"""
+
+import time
+
+import numpy as np
+
+HELD_KARP_MAX = 16
+
+
+def follow_loop(start, arcs_used):
+    """Walk the arcs from start until the loop closes; consumes the arcs it uses."""
+    route = [start]
+    current = start
+    while True:
+        # Find next 'v' if (current, v) is in arcs_used
+        next_vs = [v for (u, v) in arcs_used if u == current]
+        if not next_vs:
+            # No continuation from current
+            break
+        # Pick the first arc (assuming exactly one next node due to constraints)
+        v = next_vs[0]
+        route.append(v)
+        arcs_used.remove((current, v))
+        current = v
+        if current == start:
+            # Loop closed
+            break
+    return route
+
+
+def cycles(arcs):
+    """Split a set of arcs (every node with one in and one out arc) into its cycles."""
+    arcs_used = set(arcs)
+    result = []
+    while arcs_used:
+        start = next(iter(arcs_used))[0]
+        result.append(follow_loop(start, arcs_used)[:-1])
+    return result
+
+
+def tour_length(D, order):
+    """Length of depot -> order -> depot, where the depot is the last node of D."""
+    D = np.asarray(D)
+    depot = D.shape[0] - 1
+    nodes = [depot] + list(order) + [depot]
+    return int(sum(D[u, v] for u, v in zip(nodes[:-1], nodes[1:])))
+
+
+def nearest_neighbour(D):
+    """Greedy tour from the depot; a starting point when the exact solver gives up."""
+    D = np.asarray(D)
+    depot = D.shape[0] - 1
+    left = set(range(depot))
+    order, current = [], depot
+    while left:
+        current = min(left, key=lambda v: D[current, v])
+        order.append(current)
+        left.remove(current)
+    return order
+
+
+def held_karp(D):
+    """
+    Exact TSP by dynamic programming over subsets (depot last in D).
+    dp[mask, j] is the shortest path depot -> (all items in mask) ending in j;
+    every (subset size, j) step is one vectorized update over all masks.
+    Returns (order, length).
+    """
+    D = np.asarray(D, dtype=np.int64)
+    k = D.shape[0] - 1
+    depot = k
+    full = 1 << k
+    inf = np.iinfo(np.int64).max // 4
+    dp = np.full((full, k), inf, dtype=np.int64)
+    parent = np.full((full, k), -1, dtype=np.int64)
+    items = np.arange(k)
+    dp[1 << items, items] = D[depot, :k]
+
+    masks = np.arange(full)
+    popcount = ((masks[:, None] >> items) & 1).sum(axis=1)
+    for size in range(2, k + 1):
+        layer = masks[popcount == size]
+        for j in range(k):
+            mask = layer[(layer >> j) & 1 == 1]
+            candidates = dp[mask ^ (1 << j)] + D[:k, j]
+            best = candidates.argmin(axis=1)
+            dp[mask, j] = candidates[np.arange(len(mask)), best]
+            parent[mask, j] = best
+
+    closing = dp[full - 1] + D[:k, depot]
+    j = int(closing.argmin())
+    length = int(closing[j])
+    order, mask = [], full - 1
+    while j != -1:
+        order.append(j)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    return order[::-1], length
+
+
+def improved_greedy_tour(D, time_limit=1.0):
+    """Nearest neighbour followed by 2-opt / or-opt (cdmo/polish.py)."""
+    from cdmo.polish import improve_order
+
+    order = improve_order(D, nearest_neighbour(D), time_limit)
+    return order, tour_length(D, order)
+
+
+def solve_tour_mip(D, time_limit=None):
+    """
+    Exact TSP via subtour cuts. Returns (order, length, exact); exact is
+    False if the time limit was hit and the greedy tour is returned instead.
+    """
+    import pulp
+
+    D = np.asarray(D)
+    size = D.shape[0]
+    deadline = None if time_limit is None else time.time() + time_limit
+    nodes = range(size)
+
+    model = pulp.LpProblem("tour", pulp.LpMinimize)
+    x = {(u, v): pulp.LpVariable(f"x_{u}_{v}", cat=pulp.LpBinary) for u in nodes for v in nodes if u != v}
+    model += pulp.lpSum(int(D[u, v]) * var for (u, v), var in x.items())
+    for v in nodes:
+        model += pulp.lpSum(x[u, v] for u in nodes if u != v) == 1
+        model += pulp.lpSum(x[v, w] for w in nodes if w != v) == 1
+
+    while True:
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            break
+        options = {"msg": 0}
+        if remaining is not None:
+            options["timeLimit"] = max(1, int(remaining))
+        model.solve(pulp.PULP_CBC_CMD(**options))
+        # PuLP also reports a solve stopped on time as LpStatusOptimal; only sol_status tells a proof apart.
+        if model.sol_status != pulp.LpSolutionOptimal:
+            break
+        used = [arc for arc, var in x.items() if var.value() > 0.5]
+        loops = cycles(used)
+        if len(loops) == 1:
+            loop = loops[0]
+            # rotate so the route starts right after the depot
+            start = loop.index(size - 1)
+            order = loop[start + 1:] + loop[:start]
+            return order, tour_length(D, order), True
+        for loop in loops:
+            model += pulp.lpSum(x[u, v] for u in loop for v in loop if u != v) <= len(loop) - 1
+
+    order, length = improved_greedy_tour(D)
+    return order, length, False
+
+
+def solve_tour(D, time_limit=None):
+    """
+    Best route through every node of D (depot last).
+
+    Parameters:
+        D: (k+1)x(k+1) distance sub-matrix, the depot is the last row/column.
+        time_limit (float): Seconds for the exact solver, None for no limit.
+
+    Returns:
+        tuple: (order, length, exact) with order a list of row indices 0..k-1.
+    """
+    D = np.asarray(D)
+    k = D.shape[0] - 1
+    if k <= 2:
+        orders = [list(range(k)), list(range(k))[::-1]]
+        order = min(orders, key=lambda o: tour_length(D, o))
+        return order, tour_length(D, order), True
+    if k <= HELD_KARP_MAX:
+        order, length = held_karp(D)
+        return order, length, True
+    return solve_tour_mip(D, time_limit)
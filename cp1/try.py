@@ -3,9 +3,27 @@ import os
 import minizinc
 import traceback
 import datetime
+import asyncio
+import time
 import sys
 import re
 import math
+import subprocess
+
+# Make the shared cdmo package importable when run as `python3 cp1/try.py`.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from cdmo import flatzinc as fzn_cache
+from cdmo.candidates import candidate_arcs, known_routes
+from cdmo.estimate import ModelTooLarge, check_fits
+from cdmo.implied import minizinc_constraints as implied_constraints
+from cdmo.instances import instance_path, load_instance
+from cdmo.ledger import Ledger, allowed_digest, fingerprint, solver_version
+from cdmo.polish import polish_result
+from cdmo.stats import from_minizinc
+from cdmo.symmetry import minizinc_constraints as symmetry_constraints
 
 # Define available solvers and models
 SOLVERS = ["gecode", "chuffed"]
@@ -13,9 +31,22 @@ MODELS = {
     "firstfail_indmin": "cp1/model/firstfail_indmin.mzn",
     "firstfail_indmin_sb": "cp1/model/firstfail_indmin_sb.mzn",
     "domwdeg_indrandom_sb": "cp1/model/domwdeg_indrandom_sb.mzn",
-    "domwdeg_indrandom": "cp1/model/domwdeg_indrandom.mzn"
+    "domwdeg_indrandom": "cp1/model/domwdeg_indrandom.mzn",
+    "firstfail_indmin_bp": "cp1/model/firstfail_indmin_bp.mzn",
+    "firstfail_indmin_bp_sb": "cp1/model/firstfail_indmin_bp_sb.mzn"
 }
 RESULT_DIR = "res/CP/"
+TIMEOUT = 300  # seconds per run, also part of the ledger fingerprint
+SEED = 1  # solver random seed (indomain_random, restarts), also part of the ledger fingerprint
+
+# Appended to any model when a candidate-arc matrix is given: consecutive
+# stops (including the depot padding) must be joined by a candidate arc.
+CANDIDATE_ARCS_MZN = """
+array[1..num_load+1, 1..num_load+1] of bool: candidate_arc;
+constraint forall(courier in 1..num_couriers, pos in 1..num_load+1)(
+    candidate_arc[load_assigned[courier, pos], load_assigned[courier, pos+1]]
+);
+"""
 INSTANCE_DIR = "converted_instances/"
 
 def get_num_load(dzn_file):
@@ -30,9 +61,65 @@ def get_num_load(dzn_file):
         pass
     return None  # Return None if not found
 
-def solve_minizinc(solver_name, model_path, instance_number):
+async def _solve_streaming(instance, timeout, start_time, on_solution, stop=None, seed=None):
+    """
+    Like Instance.solve, but reports every intermediate solution to on_solution.
+    The solver is cancelled as soon as stop() returns True; the second return
+    value tells whether that happened.
+    """
+    status = minizinc.result.Status.UNKNOWN
+    statistics = {}
+    solution = None
+
+    async def consume():
+        nonlocal status, solution
+        async for result in instance.solutions(timeout=timeout, processes=1, intermediate_solutions=True,
+                                               random_seed=seed):
+            status = result.status
+            statistics.update(result.statistics)
+            if result.solution is not None:
+                solution = result.solution
+                on_solution(time.time() - start_time, result.solution.objective)
+
+    task = asyncio.ensure_future(consume())
+    stopped = False
+    while not task.done():
+        await asyncio.wait([task], timeout=0.2)
+        if not task.done() and stop is not None and stop():
+            task.cancel()
+            stopped = True
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    return minizinc.Result(status, solution, statistics), stopped
+
+def model_extras(model_path, instance, implied=False):
+    """
+    MiniZinc added to a model from the instance data: symmetry breaking for
+    the _sb models (cdmo/symmetry.py) and, if asked, implied constraints
+    (cdmo/implied.py).
+    """
+    extra = ""
+    if model_path.endswith("_sb.mzn"):
+        extra += symmetry_constraints(instance.courier_capacity, instance.load_size, instance.distance)
+    if implied:
+        extra += implied_constraints(instance.courier_capacity, instance.load_size, instance.distance)
+    return extra or None
+
+def solve_minizinc(solver_name, model_path, instance_number, dzn_file=None, timeout=300, on_solution=None,
+                   allowed=None, extra=None, stop=None, seed=None):
+    """
+    stop: optional callable polled while solving; when it returns True the
+    solver is cancelled and the result gets "status": "STOPPED". With stop
+    the result always carries the MiniZinc status name (e.g. UNSATISFIABLE).
+    seed: random seed for the solver (indomain_random, restarts); it is kept
+    in stats["seed"] so a run of a randomized model can be reproduced.
+    """
     try:
-        dzn_file = f"{INSTANCE_DIR}inst{instance_number}.dzn"
+        start_time = time.time()
+        if dzn_file is None:
+            dzn_file = f"{INSTANCE_DIR}inst{instance_number}.dzn"
 
         if not os.path.exists(dzn_file):
             return {
@@ -54,39 +141,81 @@ def solve_minizinc(solver_name, model_path, instance_number):
             }
         depot_point = num_load + 1  # Set depot dynamically
 
-        # Load MiniZinc model
-        model = minizinc.Model()
-        model.add_file(model_path)
-        solver = minizinc.Solver.lookup(solver_name)
-
-        instance = minizinc.Instance(solver, model)
-        instance.add_file(dzn_file)
-
-        # Set timeout
-        timeout = datetime.timedelta(seconds=300)
-
-        # Solve the model
-        result = instance.solve(timeout=timeout, processes=1)
-
-        # Extract solve time
-        solve_time = result.statistics.get("solveTime", 0)
-        solve_time = solve_time / 1000.0 if isinstance(solve_time, int) else solve_time.total_seconds()
-        solve_time = math.floor(solve_time)
+        compiled = None
+        if fzn_cache.enabled():
+            data = None
+            if allowed is not None:
+                data = "candidate_arc = array2d(1..num_load+1, 1..num_load+1, [" + ", ".join(
+                    "true" if a else "false" for row in allowed for a in row) + "]);\n"
+            try:
+                compiled = fzn_cache.compile_cached(
+                    solver_name, model_path, (CANDIDATE_ARCS_MZN if allowed is not None else "") + (extra or ""),
+                    dzn_file, data, timeout=timeout)
+            except (RuntimeError, OSError, subprocess.SubprocessError) as e:
+                print(f"FlatZinc cache unavailable, flattening through minizinc-python: {e}")
+
+        stopped = False
+        if compiled is not None:
+            # Cached FlatZinc: straight to the solver (see cdmo/flatzinc.py)
+            status, solution, statistics, stopped = fzn_cache.solve_cached(
+                solver_name, compiled, max(1, timeout - compiled["flatten_time"]), start_time, on_solution, stop,
+                seed=seed)
+            load_assigned = solution.get("load_assigned") if solution else None
+            objective = solution.get("_objective") if solution else None
+        else:
+            # Load MiniZinc model
+            model = minizinc.Model()
+            model.add_file(model_path)
+            if allowed is not None:
+                model.add_string(CANDIDATE_ARCS_MZN)
+            if extra:
+                model.add_string(extra)
+            solver = minizinc.Solver.lookup(solver_name)
+
+            instance = minizinc.Instance(solver, model)
+            instance.add_file(dzn_file)
+            if allowed is not None:
+                instance["candidate_arc"] = [[bool(a) for a in row] for row in allowed]
+
+            # Solve the model
+            if on_solution is None and stop is None:
+                result = instance.solve(timeout=datetime.timedelta(seconds=timeout), processes=1, random_seed=seed)
+            else:
+                result, stopped = asyncio.run(_solve_streaming(instance, datetime.timedelta(seconds=timeout),
+                                                               start_time, on_solution or (lambda elapsed, obj: None),
+                                                               stop, seed))
+            status, statistics = result.status.name, result.statistics
+            load_assigned = result.solution.load_assigned if result.solution is not None and \
+                hasattr(result.solution, "load_assigned") else None
+            objective = result.objective if hasattr(result, "objective") else None
+
+        # Extract solve time and solver statistics
+        stats = from_minizinc(statistics)
+        if compiled is not None:
+            stats["flatten_time"] = stats["build_time"] = compiled["flatten_time"]
+            stats["cached_flatten_time"] = compiled["cached_flatten_time"]
+            stats["fzn_cache_hit"] = compiled["hit"]
+        stats["seed"] = seed
+        solve_time = math.floor(stats["solve_time"] or 0)
 
         # Extract and clean solution
         solution_data = []
-        if result.solution is not None and hasattr(result.solution, "load_assigned"):
+        if load_assigned is not None:
             solution_data = [
                 [x for x in group if x != depot_point]  
-                for group in result.solution.load_assigned
+                for group in load_assigned
             ]
 
-        return {
+        final_dict = {
             "time": solve_time,
-            "optimal": result.status == minizinc.result.Status.OPTIMAL_SOLUTION,
-            "obj": result.objective if hasattr(result, "objective") else None,
-            "sol": solution_data
+            "optimal": status == "OPTIMAL_SOLUTION" and allowed is None,
+            "obj": objective,
+            "sol": solution_data,
+            "stats": stats
         }
+        if stop is not None:
+            final_dict["status"] = "STOPPED" if stopped else status
+        return final_dict
 
     except minizinc.error.MiniZincError as e:
         return {
@@ -105,8 +234,58 @@ def solve_minizinc(solver_name, model_path, instance_number):
             "error": f"General error: {traceback.format_exc()}"
         }
 
-def process_instance(solver_name, model_name, instance_number):
+def candidate_graph(instance_number, knn):
+    """k-nearest-neighbour candidate arcs, widened to keep the best stored solution feasible."""
+    if knn is None:
+        return None
+    distance = load_instance(instance_path(instance_number)).distance
+    return candidate_arcs(distance, knn, routes=known_routes(instance_number))
+
+def solve_recorded(solver_name, model_path, instance_number, instance, allowed=None, knn=None, implied=False,
+                   ledger=None, timeout=TIMEOUT, seed=SEED):
+    """
+    solve_minizinc() + route polishing, skipped when the ledger already has
+    the result for this exact configuration (see cdmo/ledger.py).
+    """
+    # Results are polished before they are recorded, so polishing is part of the configuration.
+    model_files = [model_path, "cp1/try.py", "cdmo/flatzinc.py", "cdmo/polish.py", "cdmo/tsp.py"]
+    if model_path.endswith("_sb.mzn"):
+        model_files.append("cdmo/symmetry.py")
+    if implied:
+        model_files.append("cdmo/implied.py")
+    if knn is not None:
+        model_files.append("cdmo/candidates.py")
+    fp = None
+    if ledger is not None:
+        fp = fingerprint(instance, model_files, solver_version("minizinc", solver_name),
+                         {"timeout": timeout, "seed": seed, "knn": knn, "allowed": allowed_digest(allowed),
+                          "implied": implied})
+        cached = ledger.lookup(fp)
+        if cached is not None:
+            print(f"Reusing {solver_name} {model_path} on instance {instance_number} from {ledger.path}")
+            return cached
+
+    try:
+        # Refuse up front instead of running out of memory while flattening (cdmo/estimate.py)
+        check_fits("cp", int(instance.num_couriers), int(instance.num_load), allowed=allowed,
+                   symmetry=model_path.endswith("_sb.mzn"), implied=implied)
+    except ModelTooLarge as e:
+        return {"time": 0, "optimal": False, "obj": None, "sol": [], "error": str(e)}
+    result = solve_minizinc(solver_name, model_path, instance_number, timeout=timeout, allowed=allowed,
+                            extra=model_extras(model_path, instance, implied), seed=seed)
+    # Polish the routes of non-optimal runs before saving (see cdmo/polish.py)
+    polish_result(result, instance.distance, instance.load_size, instance.courier_capacity)
+    if ledger is not None:
+        ledger.record(fp, result, runner="cp", instance=f"{int(instance_number):02d}", solver=solver_name,
+                      model=model_path)
+    return result
+
+def process_instance(solver_name, model_name, instance_number, knn=None, implied=False, ledger=None, seed=SEED):
     result = {}
+    allowed = candidate_graph(instance_number, knn)
+    instance = load_instance(instance_path(instance_number))
+    suffix = "_implied" if implied else ""
+    options = dict(allowed=allowed, knn=knn, implied=implied, ledger=ledger, seed=seed)
 
     # Handle "all models and solvers" case
     if solver_name == "all" and model_name == "all":
@@ -127,8 +306,8 @@ def process_instance(solver_name, model_name, instance_number):
             for model in models_to_run:
                 model_path = MODELS.get(model)
                 if model_path:
-                    key = f"{solver}_{model}"
-                    result[key] = solve_minizinc(solver, model_path, instance_number)
+                    key = f"{solver}_{model}{suffix}"
+                    result[key] = solve_recorded(solver, model_path, instance_number, instance, **options)
 
 
     elif solver_name == "all":
@@ -148,21 +327,22 @@ def process_instance(solver_name, model_name, instance_number):
             for model in models_to_run:
                 model_path = MODELS.get(model)
                 if model_path:
-                    key = f"{solver}_{model_name}"
-                    result[key] = solve_minizinc(solver, model_path, instance_number)
+                    key = f"{solver}_{model_name}{suffix}"
+                    result[key] = solve_recorded(solver, model_path, instance_number, instance, **options)
 
     elif model_name == "all":
         # Handle case where model is "all" but specific solver is provided
         for model, model_path in MODELS.items():
-            if solver_name == "chuffed" and model not in ["firstfail_indmin_sb", "firstfail_indmin"]:
+            if solver_name == "chuffed" and model not in ["firstfail_indmin_sb", "firstfail_indmin",
+                                                          "firstfail_indmin_bp_sb", "firstfail_indmin_bp"]:
                 continue
 
-            key = f"{solver_name}_{model}"
-            result[key] = solve_minizinc(solver_name, model_path, instance_number)
+            key = f"{solver_name}_{model}{suffix}"
+            result[key] = solve_recorded(solver_name, model_path, instance_number, instance, **options)
 
     else:
         # Handle the case for specific solver and model
-        result = solve_minizinc(solver_name, MODELS[model_name], instance_number)
+        result = solve_recorded(solver_name, MODELS[model_name], instance_number, instance, **options)
 
     # Save result as JSON
     os.makedirs(RESULT_DIR, exist_ok=True)
@@ -175,7 +355,7 @@ def process_instance(solver_name, model_name, instance_number):
     print(json.dumps(result, indent=3))
 
 
-def process_all_instances(solver_name, model_name):
+def process_all_instances(solver_name, model_name, knn=None, implied=False, ledger=None, seed=SEED):
     """Run all available instances in the converted_instances directory."""
     if not os.path.exists(INSTANCE_DIR):
         print(f"Error: Instance directory '{INSTANCE_DIR}' not found.")
@@ -192,7 +372,7 @@ def process_all_instances(solver_name, model_name):
 
     for instance_file in instance_files:
         instance_number = re.search(r"inst(\d+)\.dzn", instance_file).group(1)
-        process_instance(solver_name, model_name, instance_number)
+        process_instance(solver_name, model_name, instance_number, knn, implied, ledger, seed)
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
@@ -200,8 +380,22 @@ if __name__ == "__main__":
         print("Example: python try.py gecode firstfail_indmin 01")
         print("Use 'all' for solver and/or model to run all available options.")
         print("Use 'all' as instance_number to run all instances.")
+        print("Optional: --knn K to only allow arcs to each item's K nearest neighbours.")
+        print("Optional: --implied to add implied constraints derived from the instance data.")
+        print(f"Optional: --seed S for the solver's random seed (default {SEED}).")
+        print("Optional: --resume to reuse every finished run from res/ledger.jsonl (not only optimal ones).")
+        print("Optional: --force to solve again even if the ledger has an optimal result.")
         sys.exit(1)
 
+    knn = None
+    if "--knn" in sys.argv:
+        knn = int(sys.argv[sys.argv.index("--knn") + 1])
+    implied = "--implied" in sys.argv
+    seed = SEED
+    if "--seed" in sys.argv:
+        seed = int(sys.argv[sys.argv.index("--seed") + 1])
+    ledger = Ledger(resume="--resume" in sys.argv, force="--force" in sys.argv)
+
     solver_arg = sys.argv[1].lower()
     model_arg = sys.argv[2].lower()
     instance_arg = sys.argv[3].lower()
@@ -215,11 +409,11 @@ if __name__ == "__main__":
         sys.exit(1)
 
     if instance_arg == "all":
-        process_all_instances(solver_arg, model_arg)
+        process_all_instances(solver_arg, model_arg, knn, implied, ledger, seed)
     else:
         if not instance_arg.isdigit() or int(instance_arg) < 1:
             print("Error: Instance number must be a positive integer.")
             sys.exit(1)
 
         instance_number = f"{int(instance_arg):02d}"
-        process_instance(solver_arg, model_arg, instance_number)
+        process_instance(solver_arg, model_arg, instance_number, knn, implied, ledger, seed)
@@ -1,10 +1,24 @@
 import numpy as np
+import os
+import sys
+import tempfile
 import time
 from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpBinary, PULP_CBC_CMD
 
+# Make the shared cdmo package importable when run as `python3 mip/trial_fix.py`.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from cdmo.stats import from_cbc, read_log
+from cdmo.symmetry import pulp_constraints as symmetry_constraints
+
 class MCP:
-    def __init__(self, distance, num_couriers, max_capacities, load_sizes):
+    def __init__(self, distance, num_couriers, max_capacities, load_sizes, allowed=None):
+        # allowed: optional boolean candidate-arc matrix (cdmo/candidates.py, depot=0);
+        # x variables are only created for allowed arcs.
         self.distance = distance
+        self.allowed = allowed
         self.n = len(distance)  # number of nodes (total load + depot)
         self.m = num_couriers
         self.max_capacities = max_capacities
@@ -16,11 +30,12 @@ class MCP:
         x = {}  # decision binary variables: x[i,j,k] = 1 if courier k goes from node i to j
         u = {}  # variables for MTZ subtour elimination
     
-        for i in range(self.n):
-            for j in range(self.n):
-                for k in range(self.m):
-                    if i != j:
-                        x[i, j, k] = LpVariable(f'x_{i}_{j}_{k}', cat=LpBinary)
+        arcs = [(i, j) for i in range(self.n) for j in range(self.n)
+                if i != j and (self.allowed is None or self.allowed[i][j])]
+        for (i, j) in arcs:
+            for k in range(self.m):
+                x[i, j, k] = LpVariable(f'x_{i}_{j}_{k}', cat=LpBinary)
+        arc_set = set(arcs)
         
         # MTZ variables
         for i in range(1, self.n):
@@ -28,49 +43,56 @@ class MCP:
                 u[i, k] = LpVariable(f'u_{i}_{k}', lowBound=0, upBound=self.n - 1)
 
         # objective function
-        total_distance = lpSum(self.distance[i][j] * x[i, j, k] for i in range(self.n) for j in range(self.n) for k in range(self.m) if i != j)
+        total_distance = lpSum(self.distance[i][j] * x[i, j, k] for (i, j) in arcs for k in range(self.m))
         self.problem += total_distance
 
         # constraints =======================================================================================================================
         
         # each load must go to one courier and be picked up only once
         for j in range(1, self.n):
-            self.problem += lpSum(x[i, j, k] for i in range(self.n) for k in range(self.m) if i != j) == 1
+            self.problem += lpSum(x[i, j, k] for i in range(self.n) for k in range(self.m) if (i, j) in arc_set) == 1
         
         # each load must be assigned to some courier
         for j in range(1, self.n):
-            self.problem += lpSum(x[i, j, k] for i in range(self.n) for k in range(self.m) if i != j) >= 1
+            self.problem += lpSum(x[i, j, k] for i in range(self.n) for k in range(self.m) if (i, j) in arc_set) >= 1
         
         # courier starts and ends at the origin point (depot)
         for k in range(self.m):
-            self.problem += lpSum(x[0, j, k] for j in range(1, self.n)) == 1
-            self.problem += lpSum(x[i, 0, k] for i in range(1, self.n)) == 1
+            self.problem += lpSum(x[0, j, k] for j in range(1, self.n) if (0, j) in arc_set) == 1
+            self.problem += lpSum(x[i, 0, k] for i in range(1, self.n) if (i, 0) in arc_set) == 1
         
         # load capacity constraint for each courier
         for k in range(self.m):
-            self.problem += lpSum(self.load_sizes[j-1] * x[i, j, k] for i in range(self.n) for j in range(1, self.n) if i != j) <= self.max_capacities[k]
+            self.problem += lpSum(self.load_sizes[j-1] * x[i, j, k] for (i, j) in arcs if j != 0) <= self.max_capacities[k]
 
         # subtour elimination using MTZ constraint
-        for i in range(1, self.n):
-            for j in range(1, self.n):
+        for (i, j) in arcs:
+            if i != 0 and j != 0:
                 for k in range(self.m):
-                    if i != j:
-                        self.problem += u[i, k] - u[j, k] + (self.n - 1) * x[i, j, k] <= self.n - 2
+                    self.problem += u[i, k] - u[j, k] + (self.n - 1) * x[i, j, k] <= self.n - 2
         
         # each courier must have at least one assignment
         for k in range(self.m):
-            self.problem += lpSum(x[0, j, k] for j in range(1, self.n)) >= 1  # Each courier should at least serve one load
+            self.problem += lpSum(x[0, j, k] for j in range(1, self.n) if (0, j) in arc_set) >= 1  # Each courier should at least serve one load
 
-        # symmetry Breaking Constraint
-        for c in range(self.m - 1):
-            if self.max_capacities[c] == self.max_capacities[c + 1]:  # Check if capacities are equal
-                self.problem += lpSum(x[0, j, c] for j in range(1, self.n)) >= lpSum(x[0, j, c + 1] for j in range(1, self.n))  # Ensure loads assigned to courier c are less than or equal to those assigned to courier c + 1
+        # symmetry breaking (cdmo/symmetry.py): equal-capacity couriers ordered by their
+        # smallest load, interchangeable loads by their courier
+        def assigned(k, j):  # courier k delivers load j (node j + 1)
+            return lpSum(x[i, j + 1, k] for i in range(self.n) if (i, j + 1) in arc_set)
+        symmetry_constraints(self.problem, assigned, self.m, self.n - 1, self.max_capacities,
+                             self.load_sizes, self.distance, depot=0)
 
+        build_time = time.time() - start_time
 
         # Solve the problem
-        self.problem.solve(PULP_CBC_CMD())
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "cbc.log")
+            self.problem.solve(PULP_CBC_CMD(logPath=log_path))
+            log_text = read_log(log_path)
 
         time_taken = time.time() - start_time
+        self.stats = from_cbc(log_text, self.problem, build_time=round(build_time, 3),
+                              solve_time=round(time_taken - build_time, 3))
 
         # Output =======================================================================================================================
         if self.problem.status == 1:
@@ -84,7 +106,7 @@ class MCP:
             route = []
             for i in range(self.n):
                 for j in range(self.n):
-                    if i != j and x[i, j, k].varValue > 0.5:
+                    if (i, j, k) in x and x[i, j, k].varValue > 0.5:
                         route.append(j)
             routes.append([node for node in route if node != 0])
         
@@ -92,7 +114,8 @@ class MCP:
             'time': round(time_taken, 2),
             'optimal': optimal,
             'obj': round(self.problem.objective.value(), 2),
-            'sol': routes          
+            'sol': routes,
+            'stats': self.stats
         }
 
         return solution
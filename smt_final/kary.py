@@ -0,0 +1,141 @@
+"""
+Parallel k-ary search on D for the SMT models.
+
+Instead of one Optimize call on one core, [lower_bound, upper_bound] is
+probed at up to <workers> points at once. Every probe runs in its own
+process and builds the same formula as a decision problem with D <= probe
+(run_model_2d/3d with probe=...):
+    - sat: a solution with max distance v <= probe exists, so the interval
+      shrinks to [lo, v - 1] and probes >= v are cancelled;
+    - unsat: nothing with D <= probe exists, the interval shrinks to
+      [probe + 1, hi] and probes <= probe are cancelled.
+Free workers get new probes spread over what is left of the interval. A
+probe that comes back unknown is not tried again, and one that fails with
+an error (e.g. the model does not fit) ends the search, since every other
+probe builds the same model. The search ends when the interval is empty
+(the best solution is optimal) or the time runs out.
+
+Each probe answers through its own Pipe, so killing a cancelled probe
+cannot leave a shared queue half written or locked; killed probes are
+joined right away.
+
+    python3 smt_final/main.py --model 2d --instance 13 --symmetry --parallel 8
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+
+try:
+    from .utils import compute_bounds
+except ImportError:
+    from utils import compute_bounds
+
+
+def _probe(model, m, n, l, s, D_matrix, symmetry, implied, allowed, profile, probe, timeout, sender):
+    if model == "2d":
+        from smt_final.smt1 import run_model_2d as run_model
+    else:
+        from smt_final.smt3 import run_model_3d as run_model
+    try:
+        result = run_model(m, n, l, s, D_matrix, n, symmetry, f"probe {probe}", timeout=timeout, save=False,
+                           allowed=allowed, implied=implied, profile=profile, probe=probe)
+    except Exception as e:
+        result = {"time": 0, "optimal": False, "obj": None, "sol": [], "error": repr(e)}
+    sender.send(result)
+    sender.close()
+
+
+def probe_points(lo, hi, count, running=()):
+    """Up to <count> probes spread evenly over [lo, hi], skipping probes already running or tried."""
+    free = [value for value in range(lo, hi + 1) if value not in running]
+    if not free or count <= 0:
+        return []
+    if len(free) <= count:
+        return free
+    step = len(free) / (count + 1)
+    return sorted({free[int(step * (i + 1))] for i in range(count)})
+
+
+def kary_search(m, n, l, s, D_matrix, model="2d", symmetry=False, implied=False, allowed=None,
+                profile="default", workers=None, timeout=300):
+    """
+    Returns the usual result dict; stats has the number of probes run and the
+    final lower bound ("best_bound").
+    """
+    start_time = time.time()
+    workers = workers or os.cpu_count() or 1
+    lo, hi = compute_bounds(D_matrix, m, n)
+    best = None
+    running = {}
+    unknown = set()
+    error = None
+    probes_run = 0
+
+    def finish(probe, kill=False):
+        process, receiver = running.pop(probe)
+        if kill:
+            process.kill()
+        process.join()
+        receiver.close()
+
+    def cancel(keep):
+        for probe in [p for p in running if not keep(p)]:
+            finish(probe, kill=True)
+
+    while lo <= hi:
+        remaining = timeout - (time.time() - start_time)
+        if remaining <= 0:
+            break
+        for probe in probe_points(lo, hi, workers - len(running), set(running) | unknown):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_probe,
+                args=(model, m, n, l, s, D_matrix, symmetry, implied, allowed, profile, probe, remaining, sender))
+            process.start()
+            sender.close()
+            running[probe] = (process, receiver)
+            probes_run += 1
+        if not running:
+            break
+
+        ready = multiprocessing.connection.wait([receiver for _, receiver in running.values()], timeout=remaining)
+        if not ready:
+            break
+        probe = next(p for p, (_, receiver) in running.items() if receiver is ready[0])
+        try:
+            result = running[probe][1].recv()
+        except EOFError:
+            # The probe died without answering (e.g. killed for memory).
+            result = {"obj": None, "sol": [], "stats": {}}
+        finish(probe)
+        if result.get("obj") is not None:
+            print(f"Probe D <= {probe}: sat, max distance {result['obj']}")
+            if best is None or result["obj"] < best["obj"]:
+                best = result
+            hi = min(hi, result["obj"] - 1)
+            cancel(lambda p: p <= hi)
+        elif result.get("stats", {}).get("best_bound") is not None:
+            print(f"Probe D <= {probe}: unsat")
+            lo = max(lo, probe + 1)
+            cancel(lambda p: p >= lo)
+        elif result.get("error"):
+            print(f"Probe D <= {probe}: {result['error']}")
+            error = result["error"]
+            break
+        else:
+            print(f"Probe D <= {probe}: unknown")
+            unknown.add(probe)
+
+    cancel(lambda p: False)
+    if best is None:
+        best = {"obj": None, "sol": [], "stats": {}}
+        if error is not None:
+            best["error"] = error
+    best = dict(best)
+    best["stats"] = dict(best.get("stats") or {}, probes=probes_run, best_bound=lo)
+    # An empty interval means every smaller D was refuted.
+    best["optimal"] = best["obj"] is not None and lo > hi and allowed is None
+    best["time"] = int(time.time() - start_time)
+    return best
@@ -1,11 +1,107 @@
 # main.py
 
 import argparse
+import glob
+import os
+import re
 import sys
-from smt1 import run_model_2d
-from smt3 import run_model_3d
-# from smt2 import run_model_2d
-from utils import read_dat_file
+try:
+    from .smt1 import run_model_2d
+    from .smt3 import run_model_3d
+    from .utils import read_dat_file, save_json
+    from .profiles import PROFILES, resolve_profile
+    from .kary import kary_search
+except ImportError:
+    from smt1 import run_model_2d
+    from smt3 import run_model_3d
+    # from smt2 import run_model_2d
+    from utils import read_dat_file, save_json
+    from profiles import PROFILES, resolve_profile
+    from kary import kary_search
+from cdmo.candidates import candidate_arcs, known_routes
+from cdmo.estimate import ModelTooLarge, choose_smt_encoding
+from cdmo.instances import load_instance
+from cdmo.ledger import Ledger, allowed_digest, fingerprint, solver_version
+from cdmo.polish import polish_result
+
+# Results are polished before they are recorded, so polishing is part of the configuration.
+MODEL_FILES = {
+    "2d": ["smt_final/smt1.py", "smt_final/utils.py", "smt_final/profiles.py", "cdmo/polish.py", "cdmo/tsp.py"],
+    "3d": ["smt_final/smt3.py", "smt_final/utils.py", "smt_final/profiles.py", "cdmo/polish.py", "cdmo/tsp.py"],
+}
+TIMEOUT = 300  # seconds per run, also part of the ledger fingerprint
+
+
+def run_instance(args, instance, instance_filepath, ledger):
+    """
+    Run the selected model on one instance, or reuse its result from the
+    ledger when this exact configuration was already solved (cdmo/ledger.py).
+    """
+    try:
+        m, n, l, sizes, D_matrix = read_dat_file(instance_filepath)
+    except FileNotFoundError:
+        print(f"Error: Instance file '{instance_filepath}' not found.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading instance file: {e}")
+        sys.exit(1)
+
+    origin = n  # Assuming origin is indexed at n
+
+    # Candidate arcs, widened so the best stored solution stays feasible
+    allowed = candidate_arcs(D_matrix, args.knn, routes=known_routes(instance)) if args.knn else None
+
+    # Switch to the other encoding (or give up) before building a model that does not fit (cdmo/estimate.py)
+    try:
+        model = choose_smt_encoding(m, n, args.model.lower(), allowed=allowed, symmetry=args.symmetry,
+                                    implied=args.implied)
+    except ModelTooLarge as e:
+        print(f"Error: {e}")
+        return None
+
+    model_files = list(MODEL_FILES[model])
+    if args.symmetry:
+        model_files.append("cdmo/symmetry.py")
+    if args.implied:
+        model_files.append("cdmo/implied.py")
+    if args.knn:
+        model_files.append("cdmo/candidates.py")
+    profile = resolve_profile(args.profile, model, n)
+    if args.parallel:
+        model_files.append("smt_final/kary.py")
+    fp = fingerprint(load_instance(instance_filepath), model_files, solver_version("z3"),
+                     {"timeout": TIMEOUT, "symmetry": args.symmetry, "implied": args.implied, "knn": args.knn,
+                      "allowed": allowed_digest(allowed), "profile": profile, "parallel": bool(args.parallel)})
+    cached = ledger.lookup(fp)
+    model_name = f"SMT{model.upper()}{'_symmetry' if args.symmetry else ''}{'_implied' if args.implied else ''}"
+    if profile != "default":
+        model_name += f"_{profile}"
+    if args.parallel:
+        model_name += "_parallel"
+    if cached is not None:
+        print(f"Reusing {model_name} on {instance_filepath} from {ledger.path}")
+        save_json(cached, model_name, f"{int(instance)}.json", "res/SMT")
+        return cached
+
+    # Select and run the specified model
+    if args.parallel:
+        # Parallel decision probes on D (smt_final/kary.py)
+        result = kary_search(m, n, l, sizes, D_matrix, model=model, symmetry=args.symmetry, implied=args.implied,
+                             allowed=allowed, profile=profile, workers=args.parallel, timeout=TIMEOUT)
+        result = polish_result(result, D_matrix, sizes, l)
+        save_json(result, model_name, f"{int(instance)}.json", "res/SMT")
+    elif model == "2d":
+        result = run_model_2d(m, n, l, sizes, D_matrix, origin, args.symmetry, instance, allowed=allowed,
+                              implied=args.implied, profile=profile, timeout=TIMEOUT)
+    elif model == "3d":
+        result = run_model_3d(m, n, l, sizes, D_matrix, origin, args.symmetry, instance, allowed=allowed,
+                              implied=args.implied, profile=profile, timeout=TIMEOUT)
+    else:
+        print(f"Error: Unknown model '{args.model}'. Choose '2d' or '3d'.")
+        sys.exit(1)
+    ledger.record(fp, result, runner="smt", instance=f"{int(instance):02d}", model=model_name)
+    return result
+
 
 def main():
     # Initialize the argument parser
@@ -29,74 +125,62 @@ def main():
         action="store_true",
         help="Enable symmetry breaking constraints."
     )
+    parser.add_argument(
+        "--implied",
+        action="store_true",
+        help="Add implied (redundant) constraints derived from the instance data."
+    )
     parser.add_argument(
         "--runall",
         action="store_true",
         help="Enable running all instances."
     )
+    parser.add_argument(
+        "--knn",
+        type=int,
+        help="Only allow arcs to each item's K nearest neighbours (plus depot arcs)."
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default="default",
+        choices=list(PROFILES) + ["auto"],
+        help="Z3 configuration (smt_final/profiles.py); 'auto' uses the tuned profile for the instance size."
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        metavar="K",
+        help="Search D with K decision probes in parallel processes instead of one Optimize call."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse every finished run from res/ledger.jsonl, not only optimal ones."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Solve again even if the ledger has an optimal result."
+    )
     
     # Parse the arguments
     args = parser.parse_args()
     
+    ledger = Ledger(resume=args.resume, force=args.force)
+
     if args.runall:
         print("runall")
-        for i in range(1,23):
-            if i < 10:
-
-                # Construct the instance file path
-                instance_filename = f"inst0{i}.dat"
-                
-            else: 
-                instance_filename = f"inst{i}.dat"
-            
-            # Read the data file
-            instance_filepath = f"Instances/{instance_filename}"
-            try:
-                m, n, l, sizes, D_matrix = read_dat_file(instance_filepath)
-            except FileNotFoundError:
-                print(f"Error: Instance file '{instance_filepath}' not found.")
-                sys.exit(1)
-            except Exception as e:
-                print(f"Error reading instance file: {e}")
-                sys.exit(1)
-            
-            origin = n  # Assuming origin is indexed at n
-            ITEMS = list(range(n))  # Adjust if ITEMS is a subset
-
-
-            # Select and run the specified model
-            if args.model.lower() == "2d":
-                run_model_2d(m, n, l, sizes, D_matrix, origin, args.symmetry, i)
-            elif args.model.lower() == "3d":
-                run_model_3d(m, n, l, sizes, D_matrix, origin, args.symmetry, args.instance)
-            else:
-                print(f"Error: Unknown model '{args.model}'. Choose '2d' or '3d'.")
-                sys.exit(1)
-
+        for instance_filepath in sorted(glob.glob("Instances/inst*.dat")):
+            instance_filename = os.path.basename(instance_filepath)
+            i = int(re.search(r"inst(\d+)\.dat", instance_filename).group(1))
+            run_instance(args, i, instance_filepath, ledger)
             print(f"------------------------------INSTANCE {instance_filename} DONE-------------------------------------\n\n")
     else:
         # Read the data file
         instance_filename = f"inst{args.instance}.dat"
         instance_filepath = f"Instances/{instance_filename}"
-        try:
-            m, n, l, sizes, D_matrix = read_dat_file(instance_filepath)
-        except FileNotFoundError:
-            print(f"Error: Instance file '{instance_filepath}' not found.")
-            sys.exit(1)
-        except Exception as e:
-            print(f"Error reading instance file: {e}")
-            sys.exit(1)
-        
-        origin = n  # Assuming origin is indexed at n
-        
-        # Select and run the specified model
-        if args.model.lower() == "2d":
-            run_model_2d(m, n, l, sizes, D_matrix, origin, args.symmetry, args.instance)
-        elif args.model.lower() == "3d":
-            run_model_3d(m, n, l, sizes, D_matrix, origin, args.symmetry, args.instance)
-        else:
-            print(f"Error: Unknown model '{args.model}'. Choose '2d' or '3d'.")
-            sys.exit(1)
+        run_instance(args, args.instance, instance_filepath, ledger)
 
 if __name__ == "__main__":
     main()
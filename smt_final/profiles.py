@@ -0,0 +1,254 @@
+"""
+Named Z3 configurations for the SMT models and a tuning run to pick them.
+
+A profile sets Z3 parameters and, optionally, pre-solving tactics:
+    - "params" go through z3.set_param before the model is built
+      (opt.*, smt.arith.solver, sat.cardinality.solver, parallel.enable, ...);
+    - "tactics" cannot be used with Optimize, so those profiles run a
+      descent instead: a Then(tactics..., "smt") solver is asked for any
+      solution, then for one with D below it, until unsat or timeout. The
+      tactic solver keeps a model converter, so routes are read as usual.
+
+    # evaluate every profile over the instances and store the best per size bucket
+    python3 -m smt_final.profiles --model 2d --instances 1-10 --timeout 60
+
+    # then let main.py pick it
+    python3 smt_final/main.py --model 2d --instance 13 --profile auto
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import z3
+
+# Make the shared cdmo package importable when run as `python3 smt_final/profiles.py`.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+PROFILES = {
+    "default": {},
+    # SMT-based optimisation with symba instead of the basic linear descent
+    "symba": {"params": {"opt.optsmt_engine": "symba"}},
+    # Cardinality/PB constraints handled natively by the SAT core
+    "card": {"params": {"sat.cardinality.solver": True, "opt.enable_sat": True, "opt.elim_01": True}},
+    # Legacy simplex-based arithmetic solver
+    "simplex": {"params": {"smt.arith.solver": 2}},
+    # Portfolio of parallel SAT workers
+    "parallel": {"params": {"parallel.enable": True}},
+    # Simplify and eliminate variables before solving
+    "presolve": {"tactics": ["simplify", "propagate-values", "solve-eqs"]},
+    # Compile cardinality constraints (and pure PB goals) to bit-vectors
+    "pb2bv": {"tactics": ["simplify", "card2bv", "pb2bv"]},
+}
+
+PROFILE_FILE = os.path.join(ROOT_DIR, "res", "SMT", "profiles.json")
+
+# Instance-size buckets for the tuned profiles (upper bound on n, inclusive).
+SIZE_BUCKETS = [("small", 20), ("medium", 100), ("large", None)]
+
+
+def size_bucket(n):
+    for name, limit in SIZE_BUCKETS:
+        if limit is None or n <= limit:
+            return name
+
+
+def resolve_profile(profile, model, n, path=PROFILE_FILE):
+    """Turn "auto" into the tuned profile for this model and size (or "default")."""
+    if profile != "auto":
+        return profile
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get(model, {}).get(size_bucket(n), "default")
+    except (OSError, json.JSONDecodeError):
+        return "default"
+
+
+class TacticOptimizer:
+    """
+    The part of z3.Optimize the SMT models use (add, minimize, check, model,
+    ...) on top of a tactic-built solver, by repeatedly asking for a better D.
+    Distances are integral, so each solution with D = v is followed by the
+    cut D <= ceil(v) - 1 (D is a Real bounded only from below; "D < v" would
+    creep down by fractions). check() returns sat once the last solution is
+    proven optimal and unknown on timeout; model() then holds the best
+    solution found. If a constraint was added from outside after the last
+    own cut (a race's D < k), unsat stays unsat: the best model is then not
+    proven optimal, only nothing below k is.
+    """
+
+    def __init__(self, tactics):
+        steps = [z3.OrElse(z3.Tactic(name), z3.Tactic("skip")) for name in tactics]
+        self.solver = z3.Then(*steps, z3.Tactic("smt")).solver() if steps else z3.Solver()
+        self.ctx = self.solver.ctx
+        self.objective = None
+        self.on_model = None
+        self.best = None
+        self.timeout = None
+        self.own_cut = False
+
+    def add(self, *constraints):
+        if self.best is not None:
+            self.own_cut = False
+        self.solver.add(*constraints)
+
+    def assertions(self):
+        return self.solver.assertions()
+
+    def statistics(self):
+        return self.solver.statistics()
+
+    def set(self, timeout=None, **params):
+        if timeout is not None:
+            self.timeout = timeout
+        if params:
+            self.solver.set(**params)
+
+    def minimize(self, objective):
+        self.objective = objective
+
+    def set_on_model(self, on_model):
+        self.on_model = on_model
+
+    def model(self):
+        if self.best is None:
+            raise z3.Z3Exception("model is not available")
+        return self.best
+
+    def check(self):
+        deadline = time.time() + self.timeout / 1000 if self.timeout is not None else None
+        while True:
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return z3.unknown
+                self.solver.set(timeout=int(remaining * 1000))
+            result = self.solver.check()
+            if result == z3.unsat:
+                return z3.sat if self.best is not None and self.own_cut else z3.unsat
+            if result != z3.sat:
+                return z3.unknown
+            self.best = self.solver.model()
+            if self.on_model is not None:
+                self.on_model(self.best)
+            value = self.best.evaluate(self.objective, model_completion=True)
+            if z3.is_rational_value(value):
+                ceiling = -(-value.numerator_as_long() // value.denominator_as_long())
+            else:
+                ceiling = value.as_long()
+            self.solver.add(self.objective <= ceiling - 1)
+            self.own_cut = True
+
+
+class DecisionSolver(TacticOptimizer):
+    """
+    Decision version for one probe of the parallel search (smt_final/kary.py):
+    minimize(D) asserts D <= probe and check() answers once whether such a
+    solution exists.
+    """
+
+    def __init__(self, tactics, probe):
+        super().__init__(tactics)
+        self.probe = probe
+
+    def minimize(self, objective):
+        self.objective = objective
+        self.solver.add(objective <= self.probe)
+
+    def check(self):
+        if self.timeout is not None:
+            self.solver.set(timeout=self.timeout)
+        result = self.solver.check()
+        if result == z3.sat:
+            self.best = self.solver.model()
+            if self.on_model is not None:
+                self.on_model(self.best)
+        return result
+
+
+def make_optimizer(profile="default", probe=None):
+    """
+    A fresh optimizer configured by the named profile (global Z3 params are
+    reset first). With a probe, a DecisionSolver for D <= probe instead.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown Z3 profile '{profile}'. Choose from {list(PROFILES)} or 'auto'.")
+    config = PROFILES[profile]
+    z3.reset_params()
+    for name, value in config.get("params", {}).items():
+        z3.set_param(name, value)
+    if probe is not None:
+        return DecisionSolver(config.get("tactics", []), probe)
+    if config.get("tactics"):
+        return TacticOptimizer(config["tactics"])
+    return z3.Optimize()
+
+
+def tune(model, instances, timeout, profiles=None, path=PROFILE_FILE):
+    """
+    Run every profile on every instance (each in its own process) and store
+    the best profile per size bucket in <path>. Profiles are ranked by
+    instances solved to optimality, then best objectives found, then time.
+
+    Returns:
+        dict: {bucket: profile} for this model.
+    """
+    from cdmo.backends import run_isolated
+    from cdmo.instances import instance_path, load_instance
+
+    profiles = profiles or list(PROFILES)
+    scores = {}
+    for number in instances:
+        instance_file = instance_path(number)
+        if not os.path.exists(instance_file):
+            continue
+        bucket = size_bucket(int(load_instance(instance_file).num_load))
+        runs = {}
+        for profile in profiles:
+            print(f"[inst{number:02d}] {model} with profile {profile}")
+            runs[profile] = run_isolated(f"smt:{model}:sb:{profile}", instance_file, timeout)
+        objs = [run["obj"] for run in runs.values() if run.get("obj") is not None]
+        for profile, run in runs.items():
+            optimal, best, wall = scores.setdefault(bucket, {}).get(profile, (0, 0, 0.0))
+            scores[bucket][profile] = (
+                optimal + bool(run.get("optimal")),
+                best + (run.get("obj") is not None and run["obj"] == min(objs)),
+                wall + (run.get("wall_time") or timeout),
+            )
+
+    chosen = {bucket: max(ranked, key=lambda p: (ranked[p][0], ranked[p][1], -ranked[p][2]))
+              for bucket, ranked in scores.items()}
+
+    stored = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            stored = json.load(f)
+    stored.setdefault(model, {}).update(chosen)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(stored, f, indent=4)
+    for bucket, ranked in scores.items():
+        for profile, (optimal, best, wall) in sorted(ranked.items(), key=lambda item: -item[1][0]):
+            print(f"{bucket:<8} {profile:<10} optimal {optimal:>3}  best {best:>3}  {wall:8.1f} s")
+    print(f"Best profiles for {model}: {chosen} (saved to {path})")
+    return chosen
+
+
+def main():
+    from cdmo.benchmark import parse_instances
+
+    parser = argparse.ArgumentParser(description="Pick the best Z3 profile per instance-size bucket.")
+    parser.add_argument("--model", choices=["2d", "3d"], default="2d")
+    parser.add_argument("--instances", type=parse_instances, default=parse_instances("1-10"))
+    parser.add_argument("--profiles", type=lambda s: s.split(","), help="Subset of profiles to evaluate.")
+    parser.add_argument("--timeout", type=int, default=60, help="Seconds per run.")
+    args = parser.parse_args()
+    tune(args.model, args.instances, args.timeout, profiles=args.profiles)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,77 @@
 from z3 import *
-from utils import *
+try:
+    from .utils import *
+    from .profiles import make_optimizer
+except ImportError:
+    from utils import *
+    from profiles import make_optimizer
 import time
 
-def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
+
+def extract_routes_2d(model, y, m, n, origin, s, l):
+    """Rebuild every courier's ordered item list (1-based) from the active y arcs."""
+    assigned_matrix = []
+    for i in range(m):
+        print(f"=== Courier {i} ===")
+
+        # ---- Reconstruct the route(s)
+        # Gather all arcs y[i,u,v] that are True in the model
+        arcs = [
+            (u_node, v_node) for (c, u_node, v_node), var in y.items()
+            if c == i and is_true(model.evaluate(var, model_completion=True))
+        ]
+
+        arcs_used = set(arcs)
+
+        if len(arcs) == 0:
+            print("No route (courier may have 0 items).")
+            # Since all couriers must have at least one item, this should not occur
+            assigned_matrix.append([])
+            continue
+
+        # Reconstruct the route
+        loop = follow_loop(origin, arcs_used)
+
+        # Print the route
+        route_str = " -> ".join(
+            ("origin" if node == origin else f"d{node}")
+            for node in loop
+        )
+        print(f"Route: {route_str}")
+
+        # ---- 1) Extract ordered items based on the route
+        # Items are numbered from 0 to n-1, origin is n; the output is 1-based
+        ordered_items = [node + 1 for node in loop if node != origin]
+        print(f"Ordered items = {ordered_items}")
+
+        # ---- 2) Compute the total load based on ordered items
+        load_i = sum(s[node - 1] for node in ordered_items)
+        print(f"Total load = {load_i} (capacity = {l[i]})")
+
+        assigned_matrix.append(ordered_items)
+    return assigned_matrix
+
+
+def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance,
+                 timeout=300, save=True, on_solution=None, allowed=None, implied=False, shared=None,
+                 profile="default", probe=None):
+    """
+    allowed: optional (n+1)x(n+1) boolean candidate-arc matrix (cdmo/candidates.py);
+    arc variables are only created where it is True. None means the full graph.
+    implied: add the redundant constraints of cdmo/implied.py.
+    shared: incumbent shared with other backends in a race (cdmo/race.py).
+    profile: Z3 configuration from smt_final/profiles.py.
+    probe: only decide whether D <= probe is feasible (smt_final/kary.py).
+    """
     start_time = time.time()
-    model_name = f"SMT2D{'_symmetry' if symmetry else ''}"
+    model_name = f"SMT2D{'_symmetry' if symmetry else ''}{'_implied' if implied else ''}"
+    if profile != "default":
+        model_name += f"_{profile}"
     lower_bound, upper_bound = compute_bounds(D_matrix, m, n)
     print(lower_bound, upper_bound)
 
     # Create an Optimize object
-    solver = Optimize()
+    solver = make_optimizer(profile, probe=probe)
 
     # Item-to-Courier Assignment Variables
     x = {}
@@ -17,12 +79,19 @@ def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
         for j in range(n):
             x[i, j] = Bool(f"x_{i}_{j}")
 
-    # Route/Arc Variables
+    # Route/Arc Variables (self-loops are never created)
+    arcs = [(u, v) for u in range(n+1) for v in range(n+1)
+            if u != v and (allowed is None or allowed[u][v])]
+    in_arcs = {v: [] for v in range(n+1)}
+    out_arcs = {u: [] for u in range(n+1)}
+    for (u, v) in arcs:
+        out_arcs[u].append(v)
+        in_arcs[v].append(u)
+
     y = {}
     for i in range(m):
-        for u in range(n+1):
-            for v in range(n+1):
-                y[i, u, v] = Bool(f"y_{i}_{u}_{v}")
+        for (u, v) in arcs:
+            y[i, u, v] = Bool(f"y_{i}_{u}_{v}")
 
     # Courier Distance Variables
     distance_i = {}
@@ -43,17 +112,12 @@ def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
     for i in range(m):
         solver.add(PbLe([(x[i, j], s[j]) for j in range(n)], l[i]))
 
-    # 3. Symmetry Breaking
-    # Order couriers by the sum of their assigned item indices to break symmetry
+    # 3. Symmetry Breaking (cdmo/symmetry.py)
+    # Equal-capacity couriers are ordered by their smallest item and
+    # interchangeable items by their courier; unlike ordering every courier,
+    # this never cuts off all optimal solutions.
     if(symmetry):
-        for i in range(m - 1):
-            lhs = Sum([If(x[i, j], j, 0) for j in range(n)])
-            rhs = Sum([If(x[i + 1, j], j, 0) for j in range(n)])
-            solver.add(lhs <= rhs)
-            # Explanation:
-            # This ensures that the sum of item indices assigned to courier i
-            # is less than or equal to that of courier i+1, preventing
-            # permutations of courier assignments that are symmetric.
+        solver.add(symmetry_constraints(lambda i, j: x[i, j], m, n, l, s, D_matrix))
 
 
     # 4. Route consistency constraints 
@@ -61,11 +125,11 @@ def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
         for j in range(n):
             # In-degree for location j if assigned to courier i
             solver.add(
-                Sum([If(y[i, u, j], 1, 0) for u in range(n+1)]) == If(x[i, j], 1, 0)
+                Sum([If(y[i, u, j], 1, 0) for u in in_arcs[j]]) == If(x[i, j], 1, 0)
             )
             # Out-degree for location j if assigned to courier i
             solver.add(
-                Sum([If(y[i, j, v], 1, 0) for v in range(n+1)]) == If(x[i, j], 1, 0)
+                Sum([If(y[i, j, v], 1, 0) for v in out_arcs[j]]) == If(x[i, j], 1, 0)
             )
 
     # 5. Enforce at least one item per courier
@@ -83,20 +147,16 @@ def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
 
         # If courier i has at least one assigned item, it leaves the origin exactly once...
         solver.add(
-            Sum([If(y[i, origin, v], 1, 0) for v in range(n)]) ==
+            Sum([If(y[i, origin, v], 1, 0) for v in out_arcs[origin]]) ==
             If(assigned_count_i > 0, 1, 0)
         )
         # ...and returns exactly once
         solver.add(
-            Sum([If(y[i, u, origin], 1, 0) for u in range(n)]) ==
+            Sum([If(y[i, u, origin], 1, 0) for u in in_arcs[origin]]) ==
             If(assigned_count_i > 0, 1, 0)
         )
 
-    
-    # 7. Forbid self-loops
-    for i in range(m):
-        for j in range(n+1):
-            solver.add(Not(y[i, j, j]))
+    # 7. Self-loops: no y[i, j, j] variables exist, so nothing to forbid.
 
     
     # 8. Distance calculation
@@ -106,11 +166,15 @@ def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
             distance_i[i] == 
             Sum([
                 If(y[i, u, v], D_matrix[u][v], 0)
-                for u in range(n+1)
-                for v in range(n+1)
+                for (u, v) in arcs
             ])
         )
 
+    # 8.1 Implied constraints (cdmo/implied.py): item counts, eligibility,
+    # minimum loads and round-trip distance bounds
+    if implied:
+        solver.add(implied_constraints(lambda i, j: x[i, j], lambda i: distance_i[i], m, n, l, s, D_matrix))
+
     # 9. Bound each courier's distance by D
     # Each courier’s distance must be less than or equal to D.
     for i in range(m):
@@ -127,142 +191,81 @@ def run_model_2d(m, n, l, s, D_matrix, origin, symmetry, instance):
             solver.add(u[i, j] <= n)
 
     # 11. Add the MTZ constraints:
-    for i in range(m):
-        for j in range(n):
-            for k in range(n):
-                if j != k:  # no self loops
-                    # If courier i travels j->k, then:
-                    # u[i, k] >= u[i, j] + 1 - M*(1 - y[i, j, k])
-                    solver.add(u[i, k] >= u[i, j] + 1 - n * (1 - If(y[i, j, k], 1, 0))
-    )
+    # If courier i travels j->k, then:
+    # u[i, k] >= u[i, j] + 1 - M*(1 - y[i, j, k])
+    add_chunked(solver, (u[i, k] >= u[i, j] + 1 - n * (1 - If(y[i, j, k], 1, 0))
+                         for i in range(m) for (j, k) in arcs if j != origin and k != origin))
 
     # 12. Integrate Lower and Upper Bounds
     solver.add(D >= lower_bound)
     solver.add(D <= upper_bound)
 
     # 13. Objective: minimize D
-    solver.set(timeout=300000)
+    solver.set(timeout=int(timeout * 1000))
     obj = solver.minimize(D)
-    # Solve
-    result = solver.check()
+    if on_solution is not None:
+        solver.set_on_model(lambda mdl: on_solution(time.time() - start_time, model_objective(mdl, distance_i, m)))
+    build_time = time.time() - start_time
+
+    # Solve (in a race, tightened whenever another backend finds a better D)
+    cut = None
+    if shared is None:
+        result = solver.check()
+    else:
+        result, cut = check_with_shared(solver, D, shared, timeout)
     total_time = int(time.time() - start_time)
-    assigned_matrix = []
+    stats = from_z3(solver.statistics(), build_time=round(build_time, 3),
+                    solve_time=round(time.time() - start_time - build_time, 3),
+                    variables=len(x) + len(y) + len(u) + m + 1, constraints=len(solver.assertions()))
+    if result == unsat and cut is not None:
+        stats["best_bound"] = cut
+    if result == unsat and probe is not None:
+        stats["best_bound"] = probe + 1
 
     if result == sat:
         print(f"Instance {instance}: Solution is SAT. Optimal or near-optimal solution found.")
         model = solver.model()
-        
+
         # Retrieve the minimized D
         D_val = model.evaluate(D, model_completion=True)
         print(f"Instance {instance}: Minimum possible maximum distance (D) = {D_val}")
-        
-        origin = n  # Recall we used 'n' as the origin index
-        assigned_matrix = []
-        for i in range(m):
-            print(f"=== Courier {i} ===")
-            
-            # ---- Reconstruct the route(s)
-            # Gather all arcs y[i,u,v] that are True in the model
-            arcs = []
-            for u_node in range(n+1):
-                for v_node in range(n+1):
-                    if model.evaluate(y[i, u_node, v_node], model_completion=True):
-                        arcs.append((u_node, v_node))
-            
-            arcs_used = set(arcs)
-            
-            if len(arcs) == 0:
-                print("No route (courier may have 0 items).")
-                # Since all couriers must have at least one item, this should not occur
-                assigned_matrix.append([])
-            else:
-                # Reconstruct the route
-                loop = follow_loop(origin, arcs_used)
-                
-                # Print the route
-                route_str = " -> ".join(
-                    ("origin" if node == origin else f"d{node}")
-                    for node in loop
-                )
-                print(f"Route: {route_str}")
-                
-                # ---- 1) Extract ordered items based on the route
-                # Exclude the origin (assuming origin is 'n')
-                # Items are numbered from 0 to n-1, origin is n
-                ordered_items = []
-                for node in loop:
-                    if node != origin:
-                        ordered_items.append(node + 1)  # Adjust if you want 1-based indexing
-                print(f"Ordered items = {ordered_items}")
-                
-                # ---- 2) Compute the total load based on ordered items
-                # Note: ordered_items contains 1-based indices, so subtract 1 for 0-based access
-                load_i = sum(s[node - 1] for node in ordered_items)
-                print(f"Total load = {load_i} (capacity = {l[i]})")
-                
-                # ---- 3) Append the ordered list to assigned_matrix
-                assigned_matrix.append(ordered_items)
-            
-        
+
+        assigned_matrix = extract_routes_2d(model, y, m, n, origin, s, l)
         print(f"Instance {instance}: Total Time = {total_time} seconds")
-        
+
         print("")  # blank line
         final_dict = {
                 "time": total_time,
-                "optimal": True,
-                "obj": int(D_val.as_string()),
-                "sol": assigned_matrix
+                # Optimal on a candidate-arc subgraph is not a proof for the full problem;
+                # a probe only shows that some solution has D <= probe.
+                "optimal": allowed is None and probe is None,
+                "obj": int(D_val.as_string()) if probe is None else model_objective(model, distance_i, m),
+                "sol": assigned_matrix,
+                "stats": stats
             }
-        
-        print(final_dict)
-        save_json(final_dict, model_name, f"{int(instance)}.json", "res/SMT")
     else:
         print("No solution or UNSAT.")
+        try:
+            # On timeout the optimizer still holds its best model so far.
+            model = solver.model()
+        except Z3Exception:
+            model = None
 
-        model = solver.model()
-        D_val = model.evaluate(D, model_completion=True)
-    # ---- Reconstruct the route using y variables
-        arcs = []
-        for u_node in range(n + 1):
-            for v_node in range(n + 1):
-                if model.evaluate(y[i, u_node, v_node], model_completion=True):
-                    arcs.append((u_node, v_node))
-        
-        arcs_used = set(arcs)
-        
-        if not arcs:
-            print("No route found for this courier.")
-            assigned_matrix.append([])
+        assigned_matrix = extract_routes_2d(model, y, m, n, origin, s, l) if model is not None else []
+        if not is_complete(assigned_matrix, n):
+            final_dict = {"time": timeout, "optimal": False, "obj": None, "sol": [], "stats": stats}
         else:
-            # Reconstruct the route starting from origin
-            route = follow_loop(origin, arcs_used)
-            
-            # Print the reconstructed route
-            route_str = " -> ".join(
-                ("Origin" if node == origin else f"Item {node}") for node in route
-            )
-            print(f"Route: {route_str}")
-            
-            # ---- Extract ordered items based on the route
-            # Exclude the origin from the items list
-            ordered_items = [node for node in route if node != origin]
-            print(f"Ordered Assigned Items: {ordered_items}")
-
-            # ---- Compute the total load based on ordered items
-            # Assuming items are 1-based in 'ordered_items' and 0-based in 's'
-            load_i = sum(s[node - 1] for node in ordered_items)
-            print(f"Total Load = {load_i} (Capacity = {l[i]})")
-            
-            # ---- Append the ordered list to assigned_matrix
-            assigned_matrix.append(ordered_items)
+            final_dict = {
+                    "time": timeout,
+                    "optimal": False,
+                    "obj": model_objective(model, distance_i, m),
+                    "sol": assigned_matrix,
+                    "stats": stats
+                }
 
-        final_dict = {
-                "time": 300,
-                "optimal": False,
-                "obj": int(D_val.as_string()),
-                "sol": assigned_matrix
-            }
-        print(final_dict)
+    print(final_dict)
+    if save:
+        # Cheap local search on timed-out routes (cdmo/polish.py)
+        final_dict = polish_result(final_dict, D_matrix, s, l)
         save_json(final_dict, model_name, f"{int(instance)}.json", "res/SMT")
-        
-        
\ No newline at end of file
+    return final_dict
@@ -1,5 +1,10 @@
 from z3 import *
-from utils import *
+try:
+    from .utils import *
+    from .profiles import make_optimizer
+except ImportError:
+    from utils import *
+    from profiles import make_optimizer
 import time
 
 def extract_solution(model, x, y, distance_i, D, m, n, s, capacities):
@@ -29,21 +34,33 @@ def extract_solution(model, x, y, distance_i, D, m, n, s, capacities):
                 sorted_items[idx] = item+1
             assigned_matrix.append(sorted_items)
         return assigned_matrix, D_val
-    except e:
+    except Exception as e:
         print(e)
         return [], D_val
 
 
 
-def run_model_3d(m, n, l, s, D_matrix, origin, symmetry, instance):
+def run_model_3d(m, n, l, s, D_matrix, origin, symmetry, instance,
+                 timeout=300, save=True, on_solution=None, allowed=None, implied=False, shared=None,
+                 profile="default", probe=None):
+    """
+    allowed: optional (n+1)x(n+1) boolean candidate-arc matrix (cdmo/candidates.py);
+    consecutive items must be joined by an allowed arc. None means the full graph.
+    implied: add the redundant constraints of cdmo/implied.py.
+    shared: incumbent shared with other backends in a race (cdmo/race.py).
+    profile: Z3 configuration from smt_final/profiles.py.
+    probe: only decide whether D <= probe is feasible (smt_final/kary.py).
+    """
     start_time = time.time()
-    model_name = f"SMT3D{'_symmetry' if symmetry else ''}"
+    model_name = f"SMT3D{'_symmetry' if symmetry else ''}{'_implied' if implied else ''}"
+    if profile != "default":
+        model_name += f"_{profile}"
     capacities = l.copy()
     lower_bound, upper_bound = compute_bounds(D_matrix, m, n)
     print(lower_bound, upper_bound)
     
     # Create an Optimize object
-    solver = Optimize()
+    solver = make_optimizer(profile, probe=probe)
 
     # x[i, j, k] is True if courier i delivers item j in position k
     # Item-to-Courier Assignment Variables to position
@@ -53,12 +70,17 @@ def run_model_3d(m, n, l, s, D_matrix, origin, symmetry, instance):
             for k in range(n):
                 x[i, j, k] = Bool(f"x_{i}_{j}_{k}")
 
-    # Route/Arc Variables
+    # Route/Arc Variables (nodes: items and origin; self-loops are never created)
+    arcs = [(u, v) for u in range(n + 1) for v in range(n + 1)
+            if u != v and (allowed is None or allowed[u][v])]
     y = {}
     for i in range(m):
-        for u in range(n + 1):  # nodes: items and origin
-            for v in range(n + 1):
-                y[i, u, v] = Bool(f"y_{i}_{u}_{v}")
+        for (u, v) in arcs:
+            y[i, u, v] = Bool(f"y_{i}_{u}_{v}")
+    item_arcs = [(j, k) for (j, k) in arcs if j != origin and k != origin]
+    allowed_next = {j: set() for j in range(n)}
+    for (j, k) in item_arcs:
+        allowed_next[j].add(k)
     
     # Courier Distance Variables
     distance_i = {}
@@ -86,13 +108,11 @@ def run_model_3d(m, n, l, s, D_matrix, origin, symmetry, instance):
         for k in range(n):
             solver.add(Sum([If(x[i, j, k], 1, 0) for j in range(n)]) <= 1)
 
-    # 3. Symmetry Breaking
-    # Order couriers by the sum of their assigned item indices to break symmetry
+    # 3. Symmetry Breaking (cdmo/symmetry.py)
+    # Equal-capacity couriers are ordered by their smallest item and
+    # interchangeable items by their courier.
     if symmetry:
-        for i in range(m - 1):
-            sum_first_i   = Sum([If(x[i, j, 0], j, 0) for j in range(n)])
-            sum_first_ip1 = Sum([If(x[i+1, j, 0], j, 0) for j in range(n)])
-            solver.add(sum_first_i <= sum_first_ip1)
+        solver.add(symmetry_constraints(lambda i, j: Or([x[i, j, k] for k in range(n)]), m, n, l, s, D_matrix))
 
     # 4. Route consistency constraints
     # make sure that courier must take its next item in the order they are assigned
@@ -111,41 +131,53 @@ def run_model_3d(m, n, l, s, D_matrix, origin, symmetry, instance):
     # # Link assignments to route arcs:
     # If courier i delivers item j at position k and item l at position k+1,
     # then the arc from j to l must be activated.
-    for i in range(m):
-        for k in range(n - 1):
-            for j in range(n):
-                for l in range(n):
-                    solver.add(Implies(And(x[i, j, k], x[i, l, k+1]), y[i, j, l]))
+    # O(m n^3) clauses: streamed to the solver in chunks (add_chunked).
+    add_chunked(solver, (Implies(And(x[i, j, k], x[i, l, k+1]), y[i, j, l])
+                         for i in range(m) for k in range(n - 1) for (j, l) in item_arcs))
+    if allowed is not None:
+        # Non-candidate successors: one clause per (courier, position, item).
+        for i in range(m):
+            for k in range(n - 1):
+                for j in range(n):
+                    forbidden = [x[i, l, k+1] for l in range(n) if l != j and l not in allowed_next[j]]
+                    if forbidden:
+                        solver.add(Implies(x[i, j, k], Not(Or(forbidden))))
 
-    # 6. Forbid self-loops
-    for i in range(m):
-        for u in range(n + 1):  # items + origin
-            solver.add(Not(y[i, u, u]))
+    # 6. Self-loops: no y[i, u, u] variables exist, so nothing to forbid.
 
     # 7. Enforce courier must leave origin once and return once (Like 6)
     for i in range(m):
         for j in range(n):
             solver.add(Implies(x[i, j, 0], y[i, origin, j]))
 
-    for i in range(m):
-        for k in range(n):
-            for j in range(n):
-                if k == n-1:
-                    # For the last possible position, enforce the arc to origin.
-                    solver.add(Implies(x[i, j, k], y[i, j, origin]))
-                else:
-                    # If position k is used and position k+1 is not used at all, then j is last.
-                    solver.add(Implies(And(x[i, j, k],
-                                             Sum([If(x[i, l, k+1], 1, 0) for l in range(n)]) == 0),
-                                           y[i, j, origin]))
+    def last_item_clauses():
+        for i in range(m):
+            for k in range(n):
+                for j in range(n):
+                    if k == n-1:
+                        # For the last possible position, enforce the arc to origin.
+                        yield Implies(x[i, j, k], y[i, j, origin])
+                    else:
+                        # If position k is used and position k+1 is not used at all, then j is last.
+                        yield Implies(And(x[i, j, k],
+                                          Sum([If(x[i, l, k+1], 1, 0) for l in range(n)]) == 0),
+                                      y[i, j, origin])
+
+    add_chunked(solver, last_item_clauses())
 
     # 8. Distance Calculation
     # Compute each courier's total distance directly from the activated route arcs.
     for i in range(m):
-        route_distance = Sum([If(y[i, u, v], D_matrix[u][v], 0) 
-                              for u in range(n + 1) for v in range(n + 1)])
+        route_distance = Sum([If(y[i, u, v], D_matrix[u][v], 0)
+                              for (u, v) in arcs])
         solver.add(distance_i[i] == route_distance)
 
+    # 8.1 Implied constraints (cdmo/implied.py): item counts, eligibility,
+    # minimum loads and round-trip distance bounds
+    if implied:
+        solver.add(implied_constraints(lambda i, j: Or([x[i, j, k] for k in range(n)]), lambda i: distance_i[i],
+                                       m, n, capacities, s, D_matrix))
+
     # 9. Bound each courier's distance by D
     # Each courier’s distance must be less than or equal to D.
     for i in range(m):
@@ -163,54 +195,74 @@ def run_model_3d(m, n, l, s, D_matrix, origin, symmetry, instance):
     # 11. Add MTZ subtour elimination constraints:
     # If courier i travels directly from item j to item k, then
     # u[i, k] must be at least u[i, j] + 1, adjusted by a big-M formulation.
-    for i in range(m):
-        for j in range(n):
-            for k in range(n):
-                if j != k:
-                    # When y[i, j, k] is True then enforce u[i,k] >= u[i,j] + 1.
-                    # When y[i, j, k] is False, the constraint is relaxed by subtracting n.
-                    solver.add(u[i, k] >= u[i, j] + 1 - n * (1 - If(y[i, j, k], 1, 0)))
+    # When y[i, j, k] is True then enforce u[i,k] >= u[i,j] + 1.
+    # When y[i, j, k] is False, the constraint is relaxed by subtracting n.
+    add_chunked(solver, (u[i, k] >= u[i, j] + 1 - n * (1 - If(y[i, j, k], 1, 0))
+                         for i in range(m) for (j, k) in item_arcs))
 
     # 12. Integrate Lower and Upper Bounds
     solver.add(D >= lower_bound)
     solver.add(D <= upper_bound)
 
     # 13. Objective: minimize D
-    solver.set(timeout=300000)
+    solver.set(timeout=int(timeout * 1000))
     objective = solver.minimize(D)
+    if on_solution is not None:
+        solver.set_on_model(lambda mdl: on_solution(time.time() - start_time, model_objective(mdl, distance_i, m)))
+    build_time = time.time() - start_time
 
-
-
-    # Solve
-    result = solver.check()
+    # Solve (in a race, tightened whenever another backend finds a better D)
+    cut = None
+    if shared is None:
+        result = solver.check()
+    else:
+        result, cut = check_with_shared(solver, D, shared, timeout)
     total_time = int(time.time() - start_time)
+    stats = from_z3(solver.statistics(), build_time=round(build_time, 3),
+                    solve_time=round(time.time() - start_time - build_time, 3),
+                    variables=len(x) + len(y) + len(u) + m + 1, constraints=len(solver.assertions()))
+    if result == unsat and cut is not None:
+        stats["best_bound"] = cut
+    if result == unsat and probe is not None:
+        stats["best_bound"] = probe + 1
     if result == sat:
         model = solver.model()
         assigned_matrix, D_val = extract_solution(model, x, y, distance_i, D, m, n, s, capacities)
-        
+
         final_dict = {
                 "time": total_time,
-                "optimal": True,
-                "obj": int(D_val.as_string()),
-                "sol": assigned_matrix
+                # Optimal on a candidate-arc subgraph is not a proof for the full problem;
+                # a probe only shows that some solution has D <= probe.
+                "optimal": allowed is None and probe is None,
+                "obj": int(D_val.as_string()) if probe is None else model_objective(model, distance_i, m),
+                "sol": assigned_matrix,
+                "stats": stats
             }
-        print(final_dict)
-        save_json(final_dict, model_name, f"{int(instance)}.json", "res/SMT")
-        # Optionally, compute and print overall statistics (e.g., time taken)
-        # For example, if you recorded a start time, you might have:
-        # total_time = time.time() - start_time
-        # print(f"Total time taken: {total_time} seconds")
-        
-        # Optionally, store the result in JSON or another format as required.
     else:
         print("No solution or UNSAT.")
-        model = solver.model()
-        assigned_matrix, D_val = extract_solution(model, x, y, distance_i, D, m, n, s, capacities)
-        final_dict = {
-                "time": total_time,
-                "optimal": False,
-                "obj": int(D_val.as_string()),
-                "sol": assigned_matrix
-            }
-        print(final_dict)
+        try:
+            # On timeout the optimizer still holds its best model so far.
+            model = solver.model()
+        except Z3Exception:
+            model = None
+
+        assigned_matrix = []
+        if model is not None:
+            assigned_matrix, D_val = extract_solution(model, x, y, distance_i, D, m, n, s, capacities)
+        if not is_complete(assigned_matrix, n):
+            final_dict = {"time": total_time, "optimal": False, "obj": None, "sol": [], "stats": stats}
+        else:
+            final_dict = {
+                    "time": total_time,
+                    "optimal": False,
+                    "obj": model_objective(model, distance_i, m),
+                    "sol": assigned_matrix,
+                    "stats": stats
+                }
+
+    print(final_dict)
+    if save:
+        # Cheap local search on timed-out routes (cdmo/polish.py)
+        final_dict = polish_result(final_dict, D_matrix, s, capacities)
         save_json(final_dict, model_name, f"{int(instance)}.json", "res/SMT")
+    return final_dict
@@ -1,9 +1,25 @@
 import os
+import sys
 import json
+import threading
+import time
+
+# Make the shared cdmo package importable when run as `python3 smt_final/main.py`.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from cdmo.implied import z3_constraints as implied_constraints
+from cdmo.instances import load_instance, to_lists
+from cdmo.polish import polish_result
+from cdmo.stats import from_z3
+from cdmo.symmetry import z3_constraints as symmetry_constraints
+from cdmo.tsp import follow_loop
 
 def read_dat_file(filename):
     """
     Reads a .dat file and parses its contents into specified variables.
+    Uses the shared binary instance cache (see cdmo/instances.py).
 
     Parameters:
         filename (str): The path to the .dat file.
@@ -16,33 +32,7 @@ def read_dat_file(filename):
             - load_size (list of int)
             - distance (list of lists of int)
     """
-    with open(filename, 'r') as file:
-        # Read all lines and remove any leading/trailing whitespace
-        lines = [line.strip() for line in file if line.strip()]
-    
-    # Ensure there are enough lines to parse
-    if len(lines) < 4:
-        raise ValueError("The file does not contain enough lines to parse the required variables.")
-    
-    # Parse the first four lines
-    try:
-        num_couriers = int(lines[0])
-        num_load = int(lines[1])
-        courier_capacity = list(map(int, lines[2].split()))
-        load_size = list(map(int, lines[3].split()))
-    except ValueError as e:
-        raise ValueError(f"Error parsing the first four lines: {e}")
-    
-    # Parse the distance matrix
-    distance = []
-    for idx, line in enumerate(lines[4:], start=5):
-        try:
-            row = list(map(int, line.split()))
-            distance.append(row)
-        except ValueError as e:
-            raise ValueError(f"Error parsing line {idx} of the distance matrix: {e}")
-    
-    return num_couriers, num_load, courier_capacity, load_size, distance
+    return to_lists(load_instance(filename))
 
 def compute_bounds(D_matrix, m, n):
 
@@ -60,6 +50,75 @@ def compute_bounds(D_matrix, m, n):
 
     return lower_bound, upper_bound
 
+def model_objective(model, distance_i, m):
+    """Max courier distance in a Z3 model (the distances are integral Reals)."""
+    return max(
+        int(model.evaluate(distance_i[i], model_completion=True).as_fraction())
+        for i in range(m)
+    )
+
+def is_complete(assigned_matrix, n):
+    """True if every item 1..n is delivered exactly once (a timed-out model may be partial)."""
+    return sorted(item for route in assigned_matrix for item in route) == list(range(1, n + 1))
+
+def add_chunked(solver, constraints, chunk_size=10000):
+    """
+    Add constraints from a generator in chunks of chunk_size, so the
+    O(m n^3) constraint lists never exist in Python all at once.
+    """
+    chunk = []
+    for constraint in constraints:
+        chunk.append(constraint)
+        if len(chunk) >= chunk_size:
+            solver.add(chunk)
+            chunk = []
+    if chunk:
+        solver.add(chunk)
+
+def check_with_shared(solver, D, shared, timeout, poll=0.1):
+    """
+    solver.check() for a race (cdmo/race.py). Whenever another backend finds
+    a better objective k (shared.bound()), Z3 is interrupted, D < k is
+    asserted on the same Optimize object and the search goes on with the time
+    that is left. Stops early once shared.stopped().
+
+    Returns:
+        tuple: (check result, last k asserted or None). unsat with a k means
+        no solution better than k exists.
+    """
+    from z3 import unknown
+    deadline = time.time() + timeout
+    cut = None
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0 or shared.stopped():
+            return unknown, cut
+        solver.set(timeout=int(remaining * 1000))
+
+        interrupted = threading.Event()
+        finished = threading.Event()
+
+        def watch():
+            while not finished.wait(poll):
+                k = shared.bound()
+                if shared.stopped() or (k is not None and (cut is None or k < cut)):
+                    interrupted.set()
+                    solver.ctx.interrupt()
+                    return
+
+        watcher = threading.Thread(target=watch, daemon=True)
+        watcher.start()
+        result = solver.check()
+        finished.set()
+        watcher.join()
+        if result != unknown or not interrupted.is_set():
+            return result, cut
+
+        k = shared.bound()
+        if k is not None and (cut is None or k < cut):
+            cut = k
+            solver.add(D < k)
+
 def save_json(data_dict, solver_name, file_name, base_path):
 
     # Ensure the base path exists
@@ -92,22 +151,3 @@ def save_json(data_dict, solver_name, file_name, base_path):
     except IOError as e:
         print(f"An error occurred while writing to the file '{file_path}': {e}")
         raise
-
-def follow_loop(start, arcs_used):
-            route = [start]
-            current = start
-            while True:
-                # Find next 'v' if (current, v) is in arcs_used
-                next_vs = [v for (u, v) in arcs_used if u == current]
-                if not next_vs:
-                    # No continuation from current
-                    break
-                # Pick the first arc (assuming exactly one next node due to constraints)
-                v = next_vs[0]
-                route.append(v)
-                arcs_used.remove((current, v))
-                current = v
-                if current == start:
-                    # Loop closed
-                    break
-            return route
@@ -1,8 +1,61 @@
 
 import argparse
+import glob
+import json
+import os
+import re
 import sys
 from utils import *
-from solver_model import solve_multiple_couriers 
+from cdmo.backends import run_mip
+from cdmo.candidates import candidate_arcs, known_routes
+from cdmo.estimate import ModelTooLarge
+from cdmo.ledger import Ledger, allowed_digest, fingerprint, solver_version
+
+TIMEOUT = 300  # seconds per run, also part of the ledger fingerprint
+
+
+def run_instance(args, instance_number, instance_filepath, ledger):
+    """
+    Solve one instance with the MIP model, or reuse its result from the
+    ledger when this exact configuration was already solved (cdmo/ledger.py).
+    """
+    try:
+        instance = load_instance(instance_filepath)
+    except FileNotFoundError:
+        print(f"Error: Instance file '{instance_filepath}' not found.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading instance file: {e}")
+        sys.exit(1)
+
+    # Candidate arcs, widened so the best stored solution stays feasible
+    allowed = candidate_arcs(instance.distance, args.knn, routes=known_routes(instance_number)) if args.knn else None
+
+    # cdmo/backends.py run_mip() reads the solution and decides whether it is optimal.
+    model_files = ["test/solver_model.py", "cdmo/backends.py"]
+    if args.symmetry:
+        model_files.append("cdmo/symmetry.py")
+    if args.implied:
+        model_files.append("cdmo/implied.py")
+    if args.knn:
+        model_files.append("cdmo/candidates.py")
+    fp = fingerprint(instance, model_files, solver_version("pulp", args.solver),
+                     {"timeout": TIMEOUT, "symmetry": args.symmetry, "implied": args.implied, "knn": args.knn,
+                      "allowed": allowed_digest(allowed)})
+    result = ledger.lookup(fp)
+    if result is not None:
+        print(f"Reusing {instance_filepath} from {ledger.path}")
+    else:
+        try:
+            result = run_mip(instance, args.solver, symmetry=args.symmetry, implied=args.implied, allowed=allowed,
+                             timeout=TIMEOUT)
+        except ModelTooLarge as e:
+            print(f"Error: {e}")
+            return None
+        ledger.record(fp, result, runner="mip", instance=f"{int(instance_number):02d}", solver=args.solver)
+    print(json.dumps(result, indent=3))
+    return result
+
 def main():
     # Initialize the argument parser
     parser = argparse.ArgumentParser(description="Courier Assignment Problem Solver using Z3.")
@@ -20,56 +73,54 @@ def main():
         type=str,
         help="Specify the instance number (e.g., '07' for 'inst07.dat')."
     )
+    parser.add_argument(
+        "--knn",
+        type=int,
+        help="Only allow arcs to each item's K nearest neighbours (plus depot arcs)."
+    )
+    parser.add_argument(
+        "--symmetry",
+        action="store_true",
+        help="Enable symmetry breaking constraints."
+    )
+    parser.add_argument(
+        "--implied",
+        action="store_true",
+        help="Add implied (redundant) constraints derived from the instance data."
+    )
     parser.add_argument(
         "--runall",
         action="store_true",
         help="Enable running all instances."
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse every finished run from res/ledger.jsonl, not only optimal ones."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Solve again even if the ledger has an optimal result."
+    )
     
     # Parse the arguments
     args = parser.parse_args()
     
+    ledger = Ledger(resume=args.resume, force=args.force)
+
     if args.runall:
         print("runall")
-        for i in range(1,23):
-            if i < 10:
-                # Construct the instance file path
-                instance_filename = f"inst0{i}.dat"
-                
-            else: 
-                instance_filename = f"inst{i}.dat"
-            
-            # Read the data file
-            instance_filepath = f"Instances/{instance_filename}"
-
-            try:
-                m, n, l, sizes, D_matrix = read_dat_file(instance_filepath)
-            except FileNotFoundError:
-                print(f"Error: Instance file '{instance_filepath}' not found.")
-                sys.exit(1)
-            except Exception as e:
-                print(f"Error reading instance file: {e}")
-                sys.exit(1)
-
-
-            # Select and run the specified model
-            
-            solve_multiple_couriers(m, n, D_matrix, l, sizes, args.solver)
+        for instance_filepath in sorted(glob.glob("Instances/inst*.dat")):
+            instance_filename = os.path.basename(instance_filepath)
             print(f"------------------------------INSTANCE {instance_filename} RUNNING-------------------------------------")
+            i = int(re.search(r"inst(\d+)\.dat", instance_filename).group(1))
+            run_instance(args, i, instance_filepath, ledger)
     else:
         # Read the data file
         instance_filename = f"inst{args.instance}.dat"
         instance_filepath = f"Instances/{instance_filename}"
-        try:
-            m, n, l, sizes, D_matrix = read_dat_file(instance_filepath)
-        except FileNotFoundError:
-            print(f"Error: Instance file '{instance_filepath}' not found.")
-            sys.exit(1)
-        except Exception as e:
-            print(f"Error reading instance file: {e}")
-            sys.exit(1)
-
-        solve_multiple_couriers(m, n, D_matrix, l, sizes, args.solver)
+        run_instance(args, args.instance, instance_filepath, ledger)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,25 @@
+import os
+import sys
+
 import pulp
 
-def solve_multiple_couriers(m, n, D, l, s, solver, timeout=300 ):
-    
-    s.append(0)
+# Make the shared cdmo package importable when run as `python3 test/solver_model.py`.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from cdmo.implied import pulp_constraints as implied_constraints
+from cdmo.symmetry import pulp_constraints as symmetry_constraints
+
+def build_model(m, n, D, l, s, allowed=None, symmetry=False, implied=False):
+    """
+    Builds the arc-based MIP. Returns (model, y, path_increment, d_max).
+    allowed: optional (n+1)x(n+1) boolean candidate-arc matrix (cdmo/candidates.py);
+    y variables only exist for allowed arcs (y[c][p1] maps p2 -> variable).
+    symmetry: add the symmetry breaking constraints of cdmo/symmetry.py.
+    implied: add the redundant constraints of cdmo/implied.py.
+    """
+    s = list(s) + [0]
 
     packages = list(range(n + 1))
 
@@ -12,10 +29,13 @@ def solve_multiple_couriers(m, n, D, l, s, solver, timeout=300 ):
 
     model = pulp.LpProblem("Multiple_Couriers", pulp.LpMinimize)
 
-    
-    y = [[[pulp.LpVariable(f"y_{c}_{p1}_{p2}", cat=pulp.LpBinary) for p2 in packages] for p1 in packages] for c in couriers]
+    # Self-loops are never created (they were fixed to 0 anyway).
+    succ = [[p2 for p2 in packages if p2 != p1 and (allowed is None or allowed[p1][p2])] for p1 in packages]
+    pred = [[p1 for p1 in packages if p2 in succ[p1]] for p2 in packages]
+
+    y = [[{p2: pulp.LpVariable(f"y_{c}_{p1}_{p2}", cat=pulp.LpBinary) for p2 in succ[p1]} for p1 in packages] for c in couriers]
 
-    distances = [pulp.lpSum(D[p1][p2] * y[c][p1][p2] for p1 in packages for p2 in packages) for c in couriers]
+    distances = [pulp.lpSum(D[p1][p2] * y[c][p1][p2] for p1 in packages for p2 in succ[p1]) for c in couriers]
     d_max = pulp.LpVariable("d_max", lowBound=0)
     model += d_max
     for c in couriers:
@@ -23,66 +43,88 @@ def solve_multiple_couriers(m, n, D, l, s, solver, timeout=300 ):
 
     for c in couriers:
         for p1 in packages:
-            for p2 in packages:
-                p3s = [p3 for p3 in packages if p3 == n or p1 == n or (p3 != p1 and p3 != p2)]
+            model += pulp.lpSum(y[c][p3][p1] for p3 in pred[p1]) <= 1
+            for p2 in succ[p1]:
+                p3s = [p3 for p3 in pred[p1] if p3 == n or p1 == n or (p3 != p1 and p3 != p2)]
                 incoming = pulp.lpSum(y[c][p3][p1] for p3 in p3s)
                 model += incoming <= 1
                 model += incoming >= y[c][p1][p2]
-            model += y[c][p1][p1] == 0  # No self-loops
-        model += pulp.lpSum(s[p1] * y[c][p1][p2] for p1 in packages for p2 in packages) <= l[c]
+        model += pulp.lpSum(s[p1] * y[c][p1][p2] for p1 in packages for p2 in succ[p1]) <= l[c]
 
     for p in packages_no_base:
-        model += pulp.lpSum(y[c][p][p2] for c in couriers for p2 in packages) == 1
+        model += pulp.lpSum(y[c][p][p2] for c in couriers for p2 in succ[p]) == 1
+
+    if symmetry:
+        # courier c delivers package p <=> it leaves p
+        symmetry_constraints(model, lambda c, p: pulp.lpSum(y[c][p].values()), m, n, l, s[:-1], D)
+
+    if implied:
+        implied_constraints(model, lambda c, p: pulp.lpSum(y[c][p].values()), lambda c: distances[c],
+                            m, n, l, s[:-1], D)
 
     path_increment = [[pulp.LpVariable(f"path_increment_{c}_{p}", lowBound=0, upBound=n, cat=pulp.LpInteger) for p in packages] for c in couriers]
     for c in couriers:
         path_increment[c][n].setInitialValue(0)
         for p1 in packages:
-            for p2 in packages_no_base:
+            for p2 in succ[p1]:
+                if p2 == n:
+                    continue
                 model += path_increment[c][p2] >= path_increment[c][p1] + 1 - n * (1 - y[c][p1][p2])
                 model += path_increment[c][p2] <= path_increment[c][p1] + 1 + n * (1 - y[c][p1][p2])
-            model += path_increment[c][p1] <= pulp.lpSum(y[c][p1][p2] for p2 in packages) * (n + 1)
-        model += pulp.lpSum(y[c][n][p] for p in packages) == 1
-        model += pulp.lpSum(y[c][p][n] for p in packages) == 1
+            model += path_increment[c][p1] <= pulp.lpSum(y[c][p1][p2] for p2 in succ[p1]) * (n + 1)
+        model += pulp.lpSum(y[c][n][p] for p in succ[n]) == 1
+        model += pulp.lpSum(y[c][p][n] for p in pred[n]) == 1
 
-    solver = pulp.getSolver(solver, timeLimit=timeout, msg=1)
-    model.solve(solver)
+    return model, y, path_increment, d_max
 
+def extract_solution(n, couriers, path_increment):
+    """Position matrix: solution[c][k] is the (1-based) node courier c visits at step k."""
     solution = [[n + 1 for _ in range(n + 2)] for _ in couriers]
     for c in couriers:
-        for p in packages:
+        for p in range(n + 1):
             try:
                 if (z_value := int(path_increment[c][p].value())) != 0:
                     solution[c][z_value] = p + 1
             except:
                 pass
+    return solution
 
-    return solution, d_max.value() or 0
+def solution_to_routes(solution, n):
+    """Drop the depot (n+1) padding from a position matrix -> list of item routes."""
+    return [[p for p in row if p != n + 1] for row in solution]
 
-def minimizer_binary(instance, solver=solve_multiple_couriers, timeout=300):
-    return solver(**instance, timeout=timeout)
+def solve_multiple_couriers(m, n, D, l, s, solver, timeout=300, allowed=None, symmetry=False, implied=False):
 
+    model, y, path_increment, d_max = build_model(m, n, D, l, s, allowed=allowed, symmetry=symmetry,
+                                                  implied=implied)
 
-file_name = r"/Users/aaronsalazar/LocalDocs/Bologna/CDMO/Instances/inst07.dat"
+    solver = pulp.getSolver(solver, timeLimit=timeout, msg=1)
+    model.solve(solver)
 
-with open(file_name, 'r') as file:
-    lines = file.readlines()
+    solution = extract_solution(n, range(m), path_increment)
+    return solution, d_max.value() or 0
 
-m, n = int(lines[0].strip()), int(lines[1].strip())
-l, s = [int(x) for x in lines[2].strip().split()], [int(x) for x in lines[3].strip().split()]
-D = [list(map(int, line.strip().split())) for line in lines[4:]]
+def minimizer_binary(instance, solver=solve_multiple_couriers, timeout=300):
+    return solver(**instance, timeout=timeout)
 
-instance = {
-    'm': m,
-    'n': n,
-    'l': l,
-    's': s,
-    'D': D
-}
 
-try:
-    solution, min_distance = minimizer_binary(instance)
-    print(f"Solution: {solution}")
-    print(f"Minimum distance: {min_distance}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    # python3 test/solver_model.py [Instances/inst07.dat]
+    from cdmo.instances import load_instance, to_lists
+    file_name = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT_DIR, "Instances", "inst07.dat")
+    m, n, l, s, D = to_lists(load_instance(file_name))
+
+    instance = {
+        'm': m,
+        'n': n,
+        'l': l,
+        's': s,
+        'D': D
+    }
+
+    try:
+        solution, min_distance = minimizer_binary(instance)
+        print(f"Solution: {solution}")
+        print(f"Minimum distance: {min_distance}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
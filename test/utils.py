@@ -1,7 +1,17 @@
+import os
+import sys
+
+# Make the shared cdmo package importable when run as `python3 test/main.py`.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from cdmo.instances import load_instance, to_lists
 
 def read_dat_file(filename):
     """
     Reads a .dat file and parses its contents into specified variables.
+    Uses the shared binary instance cache (see cdmo/instances.py).
 
     Parameters:
         filename (str): The path to the .dat file.
@@ -14,33 +24,7 @@ def read_dat_file(filename):
             - load_size (list of int)
             - distance (list of lists of int)
     """
-    with open(filename, 'r') as file:
-        # Read all lines and remove any leading/trailing whitespace
-        lines = [line.strip() for line in file if line.strip()]
-    
-    # Ensure there are enough lines to parse
-    if len(lines) < 4:
-        raise ValueError("The file does not contain enough lines to parse the required variables.")
-    
-    # Parse the first four lines
-    try:
-        num_couriers = int(lines[0])
-        num_load = int(lines[1])
-        courier_capacity = list(map(int, lines[2].split()))
-        load_size = list(map(int, lines[3].split()))
-    except ValueError as e:
-        raise ValueError(f"Error parsing the first four lines: {e}")
-    
-    # Parse the distance matrix
-    distance = []
-    for idx, line in enumerate(lines[4:], start=5):
-        try:
-            row = list(map(int, line.split()))
-            distance.append(row)
-        except ValueError as e:
-            raise ValueError(f"Error parsing line {idx} of the distance matrix: {e}")
-    
-    return num_couriers, num_load, courier_capacity, load_size, distance
+    return to_lists(load_instance(filename))
 
 def build_single_route_from_origin(i, origin, arcs_used):
     """
@@ -0,0 +1,82 @@
+"""
+Shared helpers: tiny random instances and brute-force optima to check the
+solvers' bounds and reductions against.
+
+    python3 -m pytest tests
+"""
+
+import functools
+import itertools
+import os
+import sys
+
+import numpy as np
+
+# Make the shared cdmo package importable however pytest is started.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from cdmo.instances import Instance  # noqa: E402
+
+
+def tiny_instance(seed, m=3, n=6, twins=True, metric=True):
+    """
+    A random instance small enough to enumerate. twins places some items on
+    the same point with the same size and gives couriers equal capacities,
+    so there is symmetry to break; metric=False adds random detours, so the
+    direct arcs are not the shortest paths.
+    """
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 10, size=(n + 1, 2))
+    size = rng.integers(1, 5, size=n)
+    if twins:
+        for j in range(1, n, 3):
+            points[j] = points[j - 1]
+            size[j] = size[j - 1]
+    D = np.abs(points[:, None, :] - points[None, :, :]).sum(axis=2)
+    if not metric:
+        D = D + rng.integers(0, 8, size=D.shape) * (rng.random(D.shape) < 0.4)
+    np.fill_diagonal(D, 0)
+    capacity = np.full(m, int(np.ceil(size.sum() / m)) + 2)
+    if not twins:
+        capacity += np.arange(m)
+    return Instance(m, n, capacity, size, D.astype(np.int32))
+
+
+def tour(D, items):
+    """Shortest depot -> items -> depot length by trying every order (depot is the last node)."""
+    D = np.ascontiguousarray(D, dtype=np.int64)
+    return _tour(D.tobytes(), D.shape[0], tuple(sorted(items)))
+
+
+@functools.lru_cache(maxsize=None)
+def _tour(data, nodes, items):
+    D = np.frombuffer(data, dtype=np.int64).reshape(nodes, nodes)
+    depot = nodes - 1
+    if not items:
+        return 0
+    return min(int(D[depot, order[0]] + sum(D[u, v] for u, v in zip(order, order[1:])) + D[order[-1], depot])
+               for order in itertools.permutations(items))
+
+
+def assignments(instance):
+    """Every assignment (courier of each 0-based item) within capacity that gives every courier an item."""
+    m, n = int(instance.num_couriers), int(instance.num_load)
+    size = np.asarray(instance.load_size)
+    capacity = np.asarray(instance.courier_capacity)
+    for a in itertools.product(range(m), repeat=n):
+        load = np.bincount(a, weights=size, minlength=m)
+        if (load <= capacity).all() and len(set(a)) == m:
+            yield a
+
+
+def routes_of(a, m):
+    return [[j for j, c in enumerate(a) if c == courier] for courier in range(m)]
+
+
+def brute_force(instance, keep=lambda a: True):
+    """Optimal max route length over the assignments that keep(a) accepts (None if there is none)."""
+    m = int(instance.num_couriers)
+    return min((max(tour(instance.distance, route) for route in routes_of(a, m))
+                for a in assignments(instance) if keep(a)), default=None)
@@ -0,0 +1,19 @@
+import pytest
+
+from conftest import brute_force, tiny_instance
+
+pytest.importorskip("pulp")
+
+from cdmo.colgen import solve_colgen  # noqa: E402
+
+
+def test_lagrangian_bound_never_exceeds_the_optimum():
+    for seed in range(4):
+        instance = tiny_instance(seed, m=2, n=5, twins=False, metric=seed % 2 == 0)
+        optimum = brute_force(instance)
+        bounds = []
+        result = solve_colgen(instance, timeout=30, on_bound=lambda elapsed, bound: bounds.append(bound))
+        assert all(bound <= optimum for bound in bounds), f"seed {seed}"
+        assert (result["stats"]["best_bound"] or 0) <= optimum <= result["obj"]
+        if result["optimal"]:
+            assert result["obj"] == optimum
@@ -0,0 +1,30 @@
+import numpy as np
+
+from cdmo.implied import derive
+
+from conftest import assignments, routes_of, tiny_instance, tour
+
+
+def test_implied_bounds_hold_for_every_feasible_solution():
+    for seed in range(8):
+        instance = tiny_instance(seed, twins=seed % 2 == 0, metric=False)
+        implied = derive(instance.courier_capacity, instance.load_size, instance.distance)
+        size = np.asarray(instance.load_size)
+        for a in assignments(instance):
+            for courier, route in enumerate(routes_of(a, int(instance.num_couriers))):
+                length = tour(instance.distance, route)
+                assert implied.min_items[courier] <= len(route) <= implied.max_items[courier]
+                assert all(implied.eligible[courier, j] for j in route)
+                assert size[route].sum() >= implied.min_load[courier]
+                assert length >= implied.min_distance[courier]
+                assert all(length >= implied.round_trip[j] for j in route), f"seed {seed}"
+            assert all(a[j] == courier for j, courier in implied.forced.items())
+
+
+def test_round_trip_uses_shortest_paths():
+    # The direct arcs to item 0 are long, the detour through item 1 is short.
+    D = np.array([[0, 1, 9],
+                  [1, 0, 1],
+                  [9, 1, 0]])
+    implied = derive([5], [1, 1], D)
+    assert implied.round_trip[0] == 4
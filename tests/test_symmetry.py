@@ -0,0 +1,38 @@
+from cdmo.symmetry import courier_pairs, item_pairs
+
+from conftest import brute_force, tiny_instance
+
+
+def keeps(instance):
+    """The symmetry breaking of cdmo/symmetry.py as a predicate on an assignment."""
+    couriers = courier_pairs(instance.courier_capacity)
+    items = item_pairs(instance.load_size, instance.distance)
+
+    def keep(a):
+        smallest = {}
+        for j, c in enumerate(a):
+            smallest.setdefault(c, j)
+        return (all(smallest[c] < smallest[c2] for c, c2 in couriers)
+                and all(a[j] <= a[k] for j, k in items))
+    return keep
+
+
+def test_an_optimum_survives_symmetry_breaking():
+    broken = 0
+    for seed in range(12):
+        instance = tiny_instance(seed)
+        if courier_pairs(instance.courier_capacity) or item_pairs(instance.load_size, instance.distance):
+            broken += 1
+        assert brute_force(instance, keeps(instance)) == brute_force(instance), f"seed {seed}"
+    assert broken, "no instance had symmetry to break"
+
+
+def test_item_pairs_are_interchangeable():
+    for seed in range(12):
+        instance = tiny_instance(seed)
+        D = instance.distance
+        for j, k in item_pairs(instance.load_size, D):
+            assert instance.load_size[j] == instance.load_size[k]
+            swap = list(range(D.shape[0]))
+            swap[j], swap[k] = k, j
+            assert (D[swap][:, swap] == D).all()
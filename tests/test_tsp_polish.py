@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from cdmo.polish import polish_result, polish_routes, reoptimise_order, route_lengths
+from cdmo.tsp import held_karp, tour_length
+
+from conftest import assignments, routes_of, tiny_instance, tour
+
+
+def random_matrix(seed, k):
+    rng = np.random.default_rng(seed)
+    D = rng.integers(1, 30, size=(k + 1, k + 1))
+    np.fill_diagonal(D, 0)
+    return D
+
+
+@pytest.mark.parametrize("k", range(1, 8))
+def test_held_karp_is_optimal(k):
+    for seed in range(5):
+        D = random_matrix(seed, k)
+        order, length = held_karp(D)
+        assert sorted(order) == list(range(k))
+        assert length == tour_length(D, order) == tour(D, range(k))
+
+
+def test_reoptimise_order_finds_the_optimal_order():
+    for seed in range(5):
+        D = random_matrix(seed, 8)
+        depot = D.shape[0] - 1
+        p = np.array([depot] + list(range(8)) + [depot])
+        best = reoptimise_order(D, p)
+        assert sorted(best[1:-1]) == list(range(8))
+        assert tour_length(D, best[1:-1]) == tour(D, range(8))
+
+
+def test_polish_keeps_solutions_feasible_and_never_worse():
+    for seed in range(8):
+        instance = tiny_instance(seed, twins=False, metric=False)
+        m, n = int(instance.num_couriers), int(instance.num_load)
+        a = next(assignments(instance))
+        sol = [[j + 1 for j in route] for route in routes_of(a, m)]
+        routes, obj = polish_routes(sol, instance.distance, instance.load_size, instance.courier_capacity)
+        assert sorted(item for route in routes for item in route) == list(range(1, n + 1))
+        assert all(routes)
+        loads = [sum(instance.load_size[item - 1] for item in route) for route in routes]
+        assert all(load <= cap for load, cap in zip(loads, instance.courier_capacity))
+        assert obj == max(route_lengths(routes, instance.distance)) <= max(route_lengths(sol, instance.distance))
+
+
+def test_polish_leaves_optimal_results_alone():
+    instance = tiny_instance(0)
+    sol = [[j + 1 for j in route] for route in routes_of(next(assignments(instance)), 3)]
+    result = {"optimal": True, "obj": 1, "sol": sol}
+    assert polish_result(dict(result), instance.distance, instance.load_size, instance.courier_capacity) == result
+
+
+def test_tour_mip_matches_held_karp():
+    pytest.importorskip("pulp")
+    from cdmo.tsp import solve_tour_mip
+    for seed in range(3):
+        D = random_matrix(seed, 7)
+        order, length, exact = solve_tour_mip(D, time_limit=30)
+        assert exact
+        assert length == tour_length(D, order) == held_karp(D)[1]